@@ -1,20 +1,27 @@
+import tempfile
+
 from adminsortable2.admin import SortableAdminBase, SortableInlineAdminMixin
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.contrib.flatpages.admin import FlatPageAdmin
 from django.contrib.flatpages.models import FlatPage
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
-from . import models
+from . import forms, models
 from .models import Submission, ContestSubmission
+from .utils import bulk_import
 from .utils.actions import *
 
 User = get_user_model()
 
 
 class ProblemFileInline(admin.StackedInline):
-    fields = ["artifact"]
+    fields = ["artifact", "name"]
     model = models.ProblemFile
     extra = 0
 
@@ -30,6 +37,8 @@ class ProblemAdmin(admin.ModelAdmin):
         "summary",
         "points",
         "flag",
+        "extra_flags",
+        "flag_mode",
         "log_submission_content",
         "problem_group",
         "problem_type",
@@ -230,6 +239,58 @@ class ContestAdmin(SortableAdminBase, admin.ModelAdmin):
         "end_time",
     ]
     actions = [recalculate_score]
+    change_list_template = "admin/gameserver/contest/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="gameserver_contest_import",
+            ),
+        ] + super().get_urls()
+
+    def has_import_permission(self, request):
+        return request.user.has_perms(
+            ["gameserver.edit_all_problems", "gameserver.edit_all_contests"]
+        )
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = (extra_context or {}) | {
+            "has_import_permission": self.has_import_permission(request)
+        }
+        return super().changelist_view(request, extra_context)
+
+    def import_view(self, request):
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+        form = forms.BundleImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data["bundle"]
+            try:
+                with tempfile.NamedTemporaryFile() as f:
+                    for chunk in upload.chunks():
+                        f.write(chunk)
+                    f.flush()
+                    with bulk_import.opened(f.name) as root:
+                        result = bulk_import.import_bundle(bulk_import.Bundle.load(root))
+            except ValidationError as e:
+                for message in e.messages:
+                    form.add_error("bundle", message)
+            else:
+                self.message_user(
+                    request,
+                    f"Imported {result.problems} problems, {result.contests} contests and "
+                    f"{result.teams} teams.",
+                    messages.SUCCESS,
+                )
+                return redirect("admin:gameserver_contest_changelist")
+        return TemplateResponse(
+            request,
+            "admin/gameserver/contest/import.html",
+            self.admin_site.each_context(request)
+            | {"form": form, "opts": self.model._meta, "title": "Import contests"},
+        )
 
     def has_view_permission(self, request, obj=None):
         if request.user.has_perm("gameserver.view_contest"):
@@ -332,6 +393,7 @@ class ContestScoreAdmin(admin.ModelAdmin):
         "flag_count",
         "last_correct_submission",
         "last_correct_submission_obj",
+        "solved_by_type",
     )
     list_display = [
         "participation",
@@ -350,6 +412,7 @@ class ContestScoreAdmin(admin.ModelAdmin):
         "flag_count",
         "last_correct_submission",
         "last_correct_submission_obj",
+        "solved_by_type",
     ]
 
     def last_correct_submission_obj(self, obj):
@@ -365,6 +428,11 @@ class ContestScoreAdmin(admin.ModelAdmin):
     last_correct_submission_obj.short_description = "Last correct submission URL"
 
 
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ["url", "date_created", "attempts", "next_attempt", "date_delivered"]
+    readonly_fields = ["date_created", "date_delivered", "last_error"]
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(models.ContestScore, ContestScoreAdmin)
 admin.site.register(models.UserScore, UserScoreAdmin)
@@ -382,6 +450,7 @@ admin.site.register(models.Contest, ContestAdmin)
 admin.site.register(models.ContestTag)
 admin.site.register(models.ContestParticipation)
 admin.site.register(models.ContestSubmission)
+admin.site.register(models.WebhookDelivery, WebhookDeliveryAdmin)
 admin.site.site_header = "mCTF administration"
 admin.site.site_title = "mCTF admin"
 
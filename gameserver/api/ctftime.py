@@ -0,0 +1,112 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+from gameserver.models.cache import ContestScore
+from gameserver.models.contest import Contest, ContestParticipation, ContestProblem
+from gameserver.utils import cache as shared_cache
+from gameserver.utils.ranking import RankIndex
+
+# How long (in seconds) a contest name stays resolved to its id
+CONTEST_ID_TIMEOUT = 5 * 60
+# How long (in seconds) a worker may hold the lock to build a snapshot
+BUILD_LOCK_TIMEOUT = 30
+
+
+def unicode_safe(string):
+    return string.encode("unicode_escape").decode()
+
+
+def contest_id(contest_name: str):
+    """Resolves a contest name (case insensitively) to its id, or None."""
+    key = f"ctftime:contest:{contest_name.lower()}"
+    pk = cache.get(key)
+    if pk is None:
+        pk = Contest.objects.filter(name__iexact=contest_name).values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        cache.set(key, pk, CONTEST_ID_TIMEOUT)
+    return pk
+
+
+def build_standings(contest_id: int) -> dict:
+    """The CTFTime standings of a contest, in three queries."""
+    scores = list(
+        ContestScore.objects.filter(participation__contest_id=contest_id).values_list(
+            "participation_id", "points", "last_correct_submission", "participation__team__name"
+        )
+    )
+    solo_names = dict(
+        ContestParticipation.objects.filter(contest_id=contest_id, team=None).values_list(
+            "pk", "participants__username"
+        )
+    )
+    index = RankIndex((pk, points, last) for pk, points, last, _ in scores)
+    rows = {pk: (points, last, team) for pk, points, last, team in scores}
+
+    standings = []
+    for pos, pk in index.page(1, len(index)):
+        points, last, team = rows[pk]
+        if points <= 0:
+            continue
+        standings.append(
+            {
+                "pos": pos,
+                "team": unicode_safe(team if team is not None else solo_names.get(pk) or ""),
+                "score": points,
+                "lastAccept": int(last.timestamp()),
+            }
+        )
+    tasks = list(
+        ContestProblem.objects.filter(contest_id=contest_id).values_list("problem__name", flat=True)
+    )
+    return {"standings": standings, "tasks": tasks}
+
+
+def _snapshot_key(contest_id: int) -> str:
+    return f"ctftime:standings:{contest_id}"
+
+
+def standings_snapshot(contest_id: int) -> dict:
+    """
+    Returns the latest standings snapshot of a contest.
+
+    A snapshot holds the JSON body, its ETag and the time it last changed. It is rebuilt
+    (by one worker at a time) once the contest generation moves on, so polls between score
+    changes are answered from the cache without touching the database. A rebuild that gives
+    the same standings keeps the previous ETag and Last-Modified.
+    """
+    generation = shared_cache.contest_generation(contest_id)
+    local_key = f"{_snapshot_key(contest_id)}:{generation}"
+    snapshot = shared_cache.local.get(local_key)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = cache.get(_snapshot_key(contest_id))
+    if snapshot is None or snapshot["generation"] != generation:
+        lock_key = f"{_snapshot_key(contest_id)}:build:{generation}"
+        if snapshot is None or cache.add(lock_key, True, BUILD_LOCK_TIMEOUT):
+            snapshot = _build_snapshot(contest_id, generation, snapshot)
+        # else another worker is building it, serve the previous snapshot meanwhile
+
+    shared_cache.local.set(local_key, snapshot)
+    return snapshot
+
+
+def _build_snapshot(contest_id, generation, previous):
+    body = json.dumps(build_standings(contest_id), separators=(",", ":"))
+    etag = '"{}"'.format(hashlib.sha256(body.encode()).hexdigest()[:32])
+    if previous is not None and previous["etag"] == etag:
+        last_modified = previous["last_modified"]
+    else:
+        last_modified = int(time.time())
+    snapshot = {
+        "generation": generation,
+        "body": body,
+        "etag": etag,
+        "last_modified": last_modified,
+    }
+    cache.set(_snapshot_key(contest_id), snapshot, None)
+    return snapshot
@@ -1,17 +1,13 @@
 import datetime
-from typing import Any, List
+from typing import List
 
-from django.db.models import F, OuterRef, Max, Subquery, Case, When, Value, BooleanField, TextField
-from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from ninja import NinjaAPI, Schema
 
-from gameserver.models.cache import ContestScore
-from gameserver.models.profile import User
-from gameserver.models.contest import Contest, ContestProblem, ContestSubmission, ContestParticipation
-
-
-def unicode_safe(string):
-    return string.encode("unicode_escape").decode()
+from gameserver.api import ctftime
+from gameserver.models.contest import Contest
 
 
 api = NinjaAPI()
@@ -29,21 +25,9 @@ class ContestOutSchema(Schema):
 
 class CTFSchema(Schema):
     pos: int
-    team: Any = None
+    team: str
     score: int
-    lastAccept: Any = None
-
-    @staticmethod
-    def resolve_lastAccept(obj: dict) -> int:
-        """Turns a datetime object into a timestamp."""
-        print(obj, ' - DEBUG PRINT')
-        if obj['lastAccept'] is None:
-            return 0
-        return int(obj['lastAccept'].timestamp())
-
-    @staticmethod
-    def resolve_team(obj):
-        return unicode_safe(obj["team"])
+    lastAccept: int
 
 
 class CTFTimeSchema(Schema):
@@ -53,47 +37,21 @@ class CTFTimeSchema(Schema):
 
 @api.get("/ctftime/{contest_name}", response=CTFTimeSchema)
 def ctftime_standings(request, contest_name: str):
-    contest_id = get_object_or_404(Contest, name__iexact=contest_name).id
     """Get the standings for a contest in CTFTime format."""
-    last_sub_time = (
-        ContestSubmission.objects.filter(
-            participation_id=OuterRef("participation_id"), submission__is_correct=True
-        )
-        .prefetch_related("submission")
-        .order_by("-submission__date_created")
-        .values("submission__date_created")
-    )
-
-    standings = (
-        ContestScore.ranks(contest=contest_id)
-        .annotate(
-            pos=F("rank"),
-            score=F("points"),
-            is_solo=Case(
-                When(participation__team_id=None, then=Value(False)),
-                default=Value(True),
-                output_field=BooleanField(),
-            ),
-            team=Case(
-                When(participation__team_id=None, then=Subquery(     # If the team is None, use the username of the participant ( solo player )
-                    User.objects.filter(contest_participations=OuterRef("participation_id")).values(
-                        "username")[:1]
-                ),),
-                default=F("participation__team__name"),
-                output_field=TextField(),
-            ),
-            lastAccept=Max("participation__submission__submission__date_created"),
-        )
-        .filter(score__gt=0)
-        .values("pos", "score", "team", "lastAccept")
-    )
-    task_names = (
-        ContestProblem.objects.filter(contest_id=contest_id)
-        .prefetch_related("problem__name")
-        .values_list("problem__name", flat=True)
-    )
-
-    return {"standings": standings, "tasks": task_names}
+    contest_id = ctftime.contest_id(contest_name)
+    if contest_id is None:
+        raise Http404("No Contest matches the given query.")
+
+    # Served as is from the snapshot, answering conditional requests without a body
+    snapshot = ctftime.standings_snapshot(contest_id)
+    etag, last_modified = snapshot["etag"], snapshot["last_modified"]
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(snapshot["body"], content_type="application/json")
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @api.get("/contests", response=List[ContestOutSchema])
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GameserverConfig(AppConfig):
     name = "gameserver"
+
+    def ready(self):
+        from . import signals  # noqa: F401 connects the receivers
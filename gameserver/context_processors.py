@@ -7,4 +7,5 @@ def settings_context(request):
         "NAVBAR": settings.NAVBAR,
         "SCHEME": settings.SCHEME,
         "KEYWORDS": settings.KEYWORDS,
+        "LIVE_SCOREBOARD": settings.LIVE_SCOREBOARD,
     }
@@ -65,3 +65,9 @@ class ContestJoinForm(forms.Form):
                     )
 
         return team
+
+
+class BundleImportForm(forms.Form):
+    bundle = forms.FileField(
+        help_text="A zip or tar archive of problems, contests and teams (see bulk_import.Bundle)."
+    )
@@ -22,5 +22,6 @@ class FlagSubmissionForm(forms.Form):
             self.fields["flag"].widget.attrs["placeholder"] = flag_format
 
     def clean_flag(self):
-        if self.cleaned_data["flag"] != self.problem.flag:
+        if not self.problem.verify_flag(self.cleaned_data["flag"]):
             raise ValidationError("Incorrect Flag", code="incorrect")
+        return self.cleaned_data["flag"]
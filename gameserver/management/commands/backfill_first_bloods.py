@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min, Q
+
+from gameserver.models import Contest, ContestProblem
+
+
+class Command(BaseCommand):
+    help = "Record the first blood of contest problems from their existing submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "contests", nargs="*", metavar="SLUG", help="Only backfill these contests."
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Recompute first bloods that are already recorded.",
+        )
+
+    def handle(self, *args, **options):
+        problems = ContestProblem.objects.all()
+        if options["contests"]:
+            found = set(
+                Contest.objects.filter(slug__in=options["contests"]).values_list("slug", flat=True)
+            )
+            if missing := set(options["contests"]) - found:
+                raise CommandError(f"Contests {', '.join(sorted(missing))} do not exist")
+            problems = problems.filter(contest__slug__in=options["contests"])
+        if not options["overwrite"]:
+            problems = problems.filter(first_blood=None)
+
+        first_bloods = problems.annotate(
+            first_correct=Min("submission__pk", filter=Q(submission__submission__is_correct=True))
+        ).values_list("pk", "first_correct")
+
+        updated = []
+        for pk, first_correct in first_bloods:
+            updated.append(ContestProblem(pk=pk, first_blood_id=first_correct))
+        ContestProblem.objects.bulk_update(updated, ["first_blood"], batch_size=1000)
+
+        recorded = sum(problem.first_blood_id is not None for problem in updated)
+        self.stdout.write(
+            self.style.SUCCESS(f"Recorded first blood for {recorded} of {len(updated)} problems")
+        )
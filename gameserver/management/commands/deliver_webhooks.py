@@ -0,0 +1,17 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from gameserver.utils.webhooks import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Send queued webhook deliveries (first blood notifications), retrying failures."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Send what is due once instead of polling."
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(Dispatcher().run(once=options["once"]))
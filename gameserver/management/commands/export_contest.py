@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gameserver.models import Contest
+from gameserver.utils import export
+
+
+class Command(BaseCommand):
+    help = "Stream every submission or score of a contest as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("contest", metavar="SLUG")
+        parser.add_argument("table", choices=sorted(export.TABLES))
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="ndjson")
+        parser.add_argument(
+            "--output", metavar="PATH", default="-", help="File to write to (default: stdout)."
+        )
+        parser.add_argument("--chunk-size", type=int, default=export.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            contest = Contest.objects.get(slug=options["contest"])
+        except Contest.DoesNotExist:
+            raise CommandError(f"Contest {options['contest']} does not exist")
+
+        chunks = export.export(
+            contest, options["table"], options["format"], chunk_size=options["chunk_size"]
+        )
+        if options["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+        else:
+            with open(options["output"], "w", newline="") as f:
+                for chunk in chunks:
+                    f.write(chunk)
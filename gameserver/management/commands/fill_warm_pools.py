@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from gameserver.models import Problem
+
+
+class Command(BaseCommand):
+    help = "Create the idle challenge instances of every problem with a warm pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "problems", nargs="*", metavar="SLUG", help="Only fill the pools of these problems."
+        )
+
+    def handle(self, *args, **options):
+        problems = Problem.objects.filter(challenge_spec__warmPool__gt=0)
+        if options["problems"]:
+            problems = problems.filter(slug__in=options["problems"])
+
+        for problem in problems:
+            problem.fill_warm_pool()
+            self.stdout.write(f"{problem.slug}: {problem.challenge_spec['warmPool']} instances")
+
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from gameserver.models import QueuedSubmission
+from gameserver.utils.submissions import submission_queue
+
+
+class Command(BaseCommand):
+    help = "Write queued flag submissions, including those left behind by workers that died."
+
+    def handle(self, *args, **options):
+        queued = QueuedSubmission.objects.count()
+        submission_queue.flush()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {queued} queued submissions"))
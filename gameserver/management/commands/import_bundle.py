@@ -0,0 +1,40 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from gameserver.utils import bulk_import
+
+
+class Command(BaseCommand):
+    help = "Import problems, contests and teams from a directory, zip or tar archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="The bundle directory or archive (see bulk_import.Bundle)."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=bulk_import.HASH_WORKERS,
+            help="Threads hashing and uploading problem files.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        try:
+            with bulk_import.opened(options["path"]) as root:
+                result = bulk_import.import_bundle(
+                    bulk_import.Bundle.load(root), workers=options["workers"]
+                )
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.problems} problems ({result.files} new files), "
+                f"{result.contests} contests, {result.teams} teams and "
+                f"{result.participations} new participations "
+                f"in {time.monotonic() - start:.2f} seconds"
+            )
+        )
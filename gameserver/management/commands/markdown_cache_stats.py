@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from gameserver.templatetags.markdown_tags import cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hit rate of the markdown render cache across every process."
+
+    def handle(self, *args, **options):
+        stats = cache_stats()["all"]
+        total = sum(stats.values())
+        for name, count in stats.items():
+            self.stdout.write(f"{name}: {count}")
+        if total:
+            hits = stats["local_hits"] + stats["shared_hits"]
+            self.stdout.write(f"hit rate: {hits / total:.1%} of {total} renders")
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gameserver.models import Contest, ContestScore, UserScore
+from gameserver.models.cache import REBUILD_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user and/or contest score caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", action="store_true", help="Rebuild the score cache of every user."
+        )
+        parser.add_argument(
+            "--contest",
+            action="append",
+            default=[],
+            metavar="SLUG",
+            help="Rebuild the score cache of the contest with this slug. Can be repeated.",
+        )
+        parser.add_argument(
+            "--all-contests",
+            action="store_true",
+            help="Rebuild the score cache of every contest participation.",
+        )
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+        parser.add_argument(
+            "--resume-after",
+            type=int,
+            default=None,
+            metavar="PK",
+            help="Skip every user/participation with a pk up to and including this one.",
+        )
+
+    def report(self, label):
+        def progress(done, total, last_pk):
+            self.stdout.write(f"{label}: {done}/{total} (last pk {last_pk})")
+
+        return progress
+
+    def handle(self, *args, **options):
+        if not (options["users"] or options["contest"] or options["all_contests"]):
+            raise CommandError("Specify --users, --contest or --all-contests")
+
+        kwargs = {"batch_size": options["batch_size"], "resume_after": options["resume_after"]}
+        start = time.monotonic()
+
+        if options["users"]:
+            UserScore.reset_data(progress=self.report("users"), **kwargs)
+
+        if options["all_contests"]:
+            ContestScore.reset_data(all=True, progress=self.report("participations"), **kwargs)
+        else:
+            for slug in options["contest"]:
+                try:
+                    contest = Contest.objects.get(slug=slug)
+                except Contest.DoesNotExist:
+                    raise CommandError(f"Contest {slug} does not exist")
+                ContestScore.reset_data(contest=contest, progress=self.report(slug), **kwargs)
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - start:.2f} seconds"))
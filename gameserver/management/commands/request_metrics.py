@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from gameserver.utils import metrics
+
+
+class Command(BaseCommand):
+    help = "Show the average queries, cache lookups and times of every view across every process."
+
+    def handle(self, *args, **options):
+        totals = metrics.shared_totals()
+        rows = sorted(
+            totals.items(),
+            key=lambda item: item[1]["queries"] / max(item[1]["requests"], 1),
+            reverse=True,
+        )
+        self.stdout.write(
+            f"{'view':<48} {'requests':>9} {'queries':>8} {'db ms':>8} {'hits':>6} "
+            f"{'misses':>6} {'render ms':>9} {'total ms':>9} {'over':>5}"
+        )
+        for view, figures in rows:
+            n = max(figures["requests"], 1)
+            self.stdout.write(
+                f"{view:<48} {figures['requests']:>9} {figures['queries'] / n:>8.1f} "
+                f"{figures['db_us'] / n / 1000:>8.1f} {figures['cache_hits'] / n:>6.1f} "
+                f"{figures['cache_misses'] / n:>6.1f} {figures['render_us'] / n / 1000:>9.1f} "
+                f"{figures['duration_us'] / n / 1000:>9.1f} {figures['over_budget']:>5}"
+            )
@@ -6,6 +6,9 @@ from django.conf import settings
 from django.contrib.redirects.middleware import RedirectFallbackMiddleware
 from django.http import HttpResponseRedirect
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .utils import contest_session, metrics
 
 
 class TimezoneMiddleware:
@@ -25,10 +28,10 @@ class ContestMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            request.user.update_contest()
-            request.participation = request.user.current_contest
-            request.in_contest = request.participation is not None
+        if request.user.is_authenticated and contest_session.get(request.user) is not None:
+            request.in_contest = True
+            # only loaded by the views that use it
+            request.participation = SimpleLazyObject(lambda: request.user.current_contest)
         else:
             request.in_contest = False
             request.participation = None
@@ -39,6 +42,31 @@ class RedirectFallbackTemporaryMiddleware(RedirectFallbackMiddleware):
     response_redirect_class = HttpResponseRedirect
 
 
+class MetricsMiddleware:
+    """
+    Records the queries, database time, cache lookups and render time of every request, by
+    URL name (see utils/metrics.py), and checks them against the view's query_budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS["enabled"]:
+            return self.get_response(request)
+        request.query_budget = None
+        with metrics.record() as recorded:
+            response = self.get_response(request)
+        metrics.finish(request, recorded, request.query_budget, response.streaming)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = metrics.budget_of(view_func)
+
+    def process_template_response(self, request, response):
+        return metrics.time_render(response)
+
+
 l = logging.getLogger(__name__)
 
 
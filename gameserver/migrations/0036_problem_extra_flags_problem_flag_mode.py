@@ -0,0 +1,33 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0035_contest_first_blood_webhook_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="extra_flags",
+            field=models.JSONField(
+                blank=True, default=list, help_text="A list of other flags that are also accepted"
+            ),
+        ),
+        migrations.AddField(
+            model_name="problem",
+            name="flag_mode",
+            field=models.CharField(
+                choices=[
+                    ("exact", "Exact"),
+                    ("case_insensitive", "Case insensitive"),
+                    ("regex", "Regular expression"),
+                ],
+                default="exact",
+                help_text="How submissions are compared to the flags",
+                max_length=16,
+            ),
+        ),
+    ]
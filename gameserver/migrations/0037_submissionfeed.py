@@ -0,0 +1,112 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_submission_feed(apps, schema_editor):
+    Submission = apps.get_model("gameserver", "Submission")
+    SubmissionFeed = apps.get_model("gameserver", "SubmissionFeed")
+
+    rows = (
+        Submission.objects.order_by("pk")
+        .values_list(
+            "pk",
+            "user_id",
+            "problem_id",
+            "contest_submission__participation__contest_id",
+            "is_correct",
+            "problem__is_public",
+            "date_created",
+        )
+        .iterator(chunk_size=BACKFILL_BATCH_SIZE)
+    )
+    batch = []
+    for pk, user_id, problem_id, contest_id, is_correct, is_public, date_created in rows:
+        batch.append(
+            SubmissionFeed(
+                submission_id=pk,
+                user_id=user_id,
+                problem_id=problem_id,
+                contest_id=contest_id,
+                is_correct=is_correct,
+                visibility=0 if is_public else 1,
+                date_created=date_created,
+            )
+        )
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            SubmissionFeed.objects.bulk_create(batch)
+            batch = []
+    SubmissionFeed.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0036_problem_extra_flags_problem_flag_mode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubmissionFeed",
+            fields=[
+                (
+                    "submission",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="feed_entry",
+                        serialize=False,
+                        to="gameserver.submission",
+                    ),
+                ),
+                ("is_correct", models.BooleanField()),
+                (
+                    "visibility",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Public problem"), (1, "Private problem")]
+                    ),
+                ),
+                ("date_created", models.DateTimeField()),
+                (
+                    "contest",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="gameserver.contest",
+                    ),
+                ),
+                (
+                    "problem",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="gameserver.problem",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["visibility", "-submission"], name="feed_visibility_idx"),
+                    models.Index(fields=["user", "-submission"], name="feed_user_idx"),
+                    models.Index(fields=["problem", "-submission"], name="feed_problem_idx"),
+                    models.Index(fields=["contest", "-submission"], name="feed_contest_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_submission_feed, migrations.RunPython.noop),
+    ]
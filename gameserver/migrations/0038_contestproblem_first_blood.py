@@ -0,0 +1,25 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0037_submissionfeed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contestproblem",
+            name="first_blood",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="The first correct submission, claimed when it is written",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="gameserver.contestsubmission",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0038_contestproblem_first_blood"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookDelivery",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("url", models.URLField()),
+                (
+                    "payload",
+                    models.JSONField(help_text="The JSON body, or a string sent as text"),
+                ),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="When to try next, empty once finished",
+                        null=True,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("date_delivered", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["next_attempt"], name="webhook_next_attempt_idx")
+                ],
+            },
+        ),
+    ]
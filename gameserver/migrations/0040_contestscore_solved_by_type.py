@@ -0,0 +1,61 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+from collections import Counter
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_solved_by_type(apps, schema_editor):
+    ContestScore = apps.get_model("gameserver", "ContestScore")
+    ContestSubmission = apps.get_model("gameserver", "ContestSubmission")
+    Problem = apps.get_model("gameserver", "Problem")
+
+    problem_types = {}
+    for problem_id, problem_type_id in Problem.problem_type.through.objects.values_list(
+        "problem_id", "problemtype_id"
+    ):
+        problem_types.setdefault(problem_id, []).append(str(problem_type_id))
+
+    counts = {}
+    for participation_id, problem_id in (
+        ContestSubmission.objects.filter(submission__is_correct=True)
+        .order_by()
+        .values_list("participation_id", "problem__problem_id")
+        .distinct()
+        .iterator(chunk_size=BACKFILL_BATCH_SIZE)
+    ):
+        counts.setdefault(participation_id, Counter()).update(
+            problem_types.get(problem_id, ["other"])
+        )
+
+    ContestScore.objects.bulk_update(
+        [
+            ContestScore(pk=pk, solved_by_type=dict(counts[participation_id]))
+            for pk, participation_id in ContestScore.objects.values_list("pk", "participation_id")
+            if participation_id in counts
+        ],
+        ["solved_by_type"],
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0039_webhookdelivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contestscore",
+            name="solved_by_type",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="The amount of problems solved per problem type id (untyped ones as 'other').",
+            ),
+        ),
+        migrations.RunPython(backfill_solved_by_type, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import gameserver.models.problem
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0040_contestscore_solved_by_type"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="problemfile",
+            name="artifact",
+            field=models.FileField(
+                max_length=272, upload_to=gameserver.models.problem.artifact_path
+            ),
+        ),
+        migrations.AlterField(
+            model_name="problemfile",
+            name="checksum",
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0041_problemfile_content_addressed"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="submission",
+            name="date_created",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
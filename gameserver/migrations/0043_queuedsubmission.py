@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0042_alter_submission_date_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedSubmission",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("date_created", models.DateTimeField()),
+                (
+                    "submission",
+                    models.JSONField(help_text="The other fields of the PendingSubmission"),
+                ),
+            ],
+        ),
+    ]
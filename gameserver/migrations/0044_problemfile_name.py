@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def name_files(apps, schema_editor):
+    ProblemFile = apps.get_model("gameserver", "ProblemFile")
+    files = list(ProblemFile.objects.only("artifact"))
+    for problem_file in files:
+        problem_file.name = problem_file.artifact.name.split("/")[-1]
+    ProblemFile.objects.bulk_update(files, ["name"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameserver", "0043_queuedsubmission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problemfile",
+            name="name",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The name the file is downloaded as, the uploaded file's name if blank",
+                max_length=255,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(name_files, migrations.RunPython.noop),
+    ]
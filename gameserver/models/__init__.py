@@ -6,3 +6,4 @@ from .interface import *
 from .problem import *
 from .profile import *
 from .submission import *
+from .webhook import *
@@ -1,28 +1,39 @@
+from collections import Counter, defaultdict
 from datetime import datetime
-from typing import TYPE_CHECKING, Callable, Optional, Protocol, Self
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Protocol, Self
 
 from django.apps import apps
 from django.db import models, transaction
 from django.db.models import (
     BooleanField,
     Case,
-    Count,
     F,
+    Max,
+    Min,
     QuerySet,
-    Sum,
     Value,
     When,
     Window,
 )
-from django.db.models.functions import Coalesce, Rank
+from django.db.models.functions import Greatest, Rank
 from django.http import HttpRequest
 from django.utils import timezone
 
+from ..utils import cache as shared_cache
+from ..utils import ranking
+
 if TYPE_CHECKING:
     from .contest import Contest, ContestParticipation, ContestSubmission
     from .profile import User
 
 EPOCH_TIME = datetime(1971, 1, 1, 0, 0, 0)
+REBUILD_BATCH_SIZE = 1000
+# Bumped whenever user scores change, so every process rebuilds its user rank index
+USER_SCORES_GENERATION = "user-scores"
+# The ContestScore.solved_by_type key of problems without a problem type
+UNTYPED = "other"
+
+RebuildProgress = Callable[[int, int, Optional[int]], None]
 
 
 class ResetableCache(Protocol):
@@ -50,8 +61,115 @@ class CacheMeta(models.Model):
             ]
         )
 
+    @classmethod
+    def add_scores(cls, deltas: dict[int, tuple[int, int, datetime]]):
+        """
+        Adds ``(points, flags)`` to the cache row of every owner id in ``deltas`` and moves its
+        last correct submission up to the given time.
+
+        Missing rows are created first and all rows are then changed by a single UPDATE, so a
+        batch of solves costs the same number of queries as one solve. The rank indexes are
+        updated once the transaction commits.
+        """
+        if not deltas:
+            return
+        owner = cls.owner_field
+
+        def delta(index, output_field):
+            return Case(
+                *[
+                    When(**{f"{owner}_id": owner_id}, then=Value(change[index]))
+                    for owner_id, change in deltas.items()
+                ],
+                default=Value(0) if index < 2 else F("last_correct_submission"),
+                output_field=output_field,
+            )
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(**{f"{owner}_id": owner_id}) for owner_id in deltas], ignore_conflicts=True
+            )
+            cls.objects.filter(**{f"{owner}_id__in": deltas}).update(
+                points=F("points") + delta(0, models.PositiveIntegerField()),
+                flag_count=F("flag_count") + delta(1, models.PositiveIntegerField()),
+                last_correct_submission=Greatest(
+                    "last_correct_submission", delta(2, models.DateTimeField())
+                ),
+            )
+            owner_ids = list(deltas)
+            transaction.on_commit(lambda: cls._update_rank_indexes(owner_ids))
+
+    @classmethod
+    def _update_rank_indexes(cls, owner_ids):
+        raise NotImplementedError
+
+    @classmethod
+    def _rebuild(
+        cls,
+        owners: QuerySet,
+        solves: QuerySet,
+        points_field: str,
+        date_field: str,
+        batch_size: int,
+        resume_after: Optional[int],
+        progress: Optional[RebuildProgress],
+    ) -> int:
+        """
+        Recompute the cache rows of ``owners`` from their correct ``solves``.
+
+        The totals of every owner are computed with a single grouped query (one row per solved
+        problem) and the cache rows are then upserted ``batch_size`` at a time in pk order.
+        After each batch ``progress(done, total, last_pk)`` is called; passing that ``last_pk``
+        back in as ``resume_after`` continues an interrupted rebuild.
+        """
+        owner = cls.owner_field
+        if resume_after is not None:
+            owners = owners.filter(pk__gt=resume_after)
+            solves = solves.filter(**{f"{owner}__gt": resume_after})
+
+        totals = {}
+        for owner_id, points, last_solve in (
+            solves.order_by()
+            .values(owner, "problem")
+            .annotate(problem_points=Max(points_field), last_solve=Min(date_field))
+            .values_list(owner, "problem_points", "last_solve")
+            .iterator(chunk_size=batch_size)
+        ):
+            if owner_id in totals:
+                total_points, flags, last = totals[owner_id]
+                totals[owner_id] = (total_points + points, flags + 1, max(last, last_solve))
+            else:
+                totals[owner_id] = (points, 1, last_solve)
+
+        owner_ids = list(owners.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(owner_ids), batch_size):
+            batch = owner_ids[start : start + batch_size]
+            scores = []
+            for owner_id in batch:
+                points, flags, last_solve = totals.get(owner_id, (0, 0, EPOCH_TIME))
+                scores.append(
+                    cls(
+                        **{f"{owner}_id": owner_id},
+                        points=points,
+                        flag_count=flags,
+                        last_correct_submission=last_solve,
+                    )
+                )
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    scores,
+                    update_conflicts=True,
+                    unique_fields=[owner],
+                    update_fields=["points", "flag_count", "last_correct_submission"],
+                )
+            if progress is not None:
+                progress(start + len(batch), len(owner_ids), batch[-1])
+        return len(owner_ids)
+
 
 class UserScore(CacheMeta):
+    owner_field = "user"
+
     user = models.OneToOneField(
         "User", related_name="score_cache", on_delete=models.CASCADE, db_index=True
     )
@@ -92,83 +210,71 @@ class UserScore(CacheMeta):
     @classmethod
     def update_or_create(cls, change_in_score: int, user: "User", update_flags: bool = True):
         assert change_in_score > 0
-        queryset = cls.objects.filter(user=user)
-
-        if not queryset.exists():  # no user found matching that
-            cls.objects.create(
-                user=user,
-                flag_count=int(update_flags),
-                points=change_in_score,
-                last_correct_submission=timezone.now(),
-            )
-            return cls.update_or_create(
-                change_in_score=change_in_score, user=user, update_flags=update_flags
-            )
+        cls.add_scores({user.pk: (change_in_score, int(update_flags), timezone.now())})
 
-        if update_flags:
-            queryset.update(
-                points=F("points") + change_in_score,
-                flag_count=F("flag_count") + 1,
-                last_correct_submission=timezone.now(),
-            )
-        else:
-            queryset.update(
-                points=F("points") + change_in_score, last_correct_submission=timezone.now()
-            )
+    @classmethod
+    def _update_rank_indexes(cls, owner_ids):
+        for user_id, points, last_correct_submission in cls.objects.filter(
+            user_id__in=owner_ids
+        ).values_list("user_id", "points", "last_correct_submission"):
+            ranking.update(cls.rank_index_name(), user_id, points, last_correct_submission)
+        ranking.advance(cls.rank_index_name(), shared_cache.bump_generation(USER_SCORES_GENERATION))
 
     @classmethod
-    def get_rank(cls, user: "User") -> int:
+    def rank_index_name(cls) -> str:
+        return "users"
+
+    @classmethod
+    def rank_index(cls) -> ranking.RankIndex:
+        return ranking.get_index(
+            cls.rank_index_name(),
+            lambda: cls.objects.values_list("user_id", "points", "last_correct_submission"),
+            shared_cache.get_generation(USER_SCORES_GENERATION),
+        )
+
+    @classmethod
+    def get_rank(cls, user: "User") -> Optional[int]:
         """
-        Get the rank of a user
+        Get the rank of a user, or None if the user has no score yet.
 
-        There are a couple issues with implementing this function as
-        cls.ranks().get(user=user).rank
-        - The biggest is django is lazy and the user's rank will always be 1
-        The only way I see to implement this would be to use raw SQL (see cls.ranks().query)
+        Same ordering as cls.ranks(), answered from the in-memory rank index.
         """
-        raise NotImplementedError
+        return cls.rank_index().rank(user.pk)
 
     @classmethod
-    def reset_data(cls, users: Optional[QuerySet["User"]] = None):
+    def reset_data(
+        cls,
+        users: Optional[QuerySet["User"]] = None,
+        batch_size: int = REBUILD_BATCH_SIZE,
+        resume_after: Optional[int] = None,
+        progress: Optional[RebuildProgress] = None,
+    ) -> int:
         from django.contrib.auth import get_user_model
         from gameserver.models import Submission
 
+        solves = Submission.objects.filter(is_correct=True, problem__is_public=True)
         if users is None:
             users = get_user_model().objects.all()
-            cls.objects.all().delete()  # clear past objs
         else:
-            cls.objects.filter(user__in=users).delete()  # clear past objs
-
-        scores_to_create = []
-
-        for user in users:
-            queryset = user._get_unique_correct_submissions()
-            queryset = queryset.aggregate(
-                points=Coalesce(Sum("problem__points"), 0),
-                flags=Count("problem"),
-            )
-            try:
-                last_correct_submission = (
-                    Submission.objects.filter(user=user, problem__is_public=True, is_correct=True)
-                    .latest("date_created")
-                    .date_created
-                )
-            except Submission.DoesNotExist:  # user have never submitted to a public problem
-                last_correct_submission = EPOCH_TIME
-
-            scores_to_create.append(
-                UserScore(
-                    user=user,
-                    flag_count=queryset["flags"],
-                    points=queryset["points"],
-                    last_correct_submission=last_correct_submission,
-                )
-            )
-        # Use bulk_create to create all objects in a single query
-        cls.objects.bulk_create(scores_to_create)
+            solves = solves.filter(user__in=users)
+
+        ranking.discard(cls.rank_index_name())
+        rows = cls._rebuild(
+            owners=users,
+            solves=solves,
+            points_field="problem__points",
+            date_field="date_created",
+            batch_size=batch_size,
+            resume_after=resume_after,
+            progress=progress,
+        )
+        shared_cache.bump_generation(USER_SCORES_GENERATION)
+        return rows
 
 
 class ContestScore(CacheMeta):
+    owner_field = "participation"
+
     participation = models.OneToOneField(
         "ContestParticipation", related_name="score_cache", on_delete=models.CASCADE, db_index=True
     )
@@ -184,6 +290,12 @@ class ContestScore(CacheMeta):
         blank=True,
         default=EPOCH_TIME,  # only used for migration (overwritten by reset_score)
     )
+    solved_by_type = models.JSONField(
+        help_text="The amount of problems solved per problem type id (untyped ones as 'other').",
+        editable=False,
+        blank=True,
+        default=dict,
+    )
 
     # contest_id = models.IntegerField(
     #     help_text="The id for which contest this applies to. Do not change this value manually.",
@@ -267,75 +379,161 @@ class ContestScore(CacheMeta):
         cls, change_in_score: int, participant: "ContestParticipation", update_flags: bool = True
     ):
         assert change_in_score > 0, "change_in_score must be greater than 0"
-        queryset = cls.objects.filter(participation=participant)
-
-        if not queryset.exists():  # no user/team found matching that
-            cls.objects.create(
-                participation=participant,
-                flag_count=int(update_flags),
-                points=change_in_score,
-                last_correct_submission=timezone.now(),
-            )
+        cls.add_scores({participant.pk: (change_in_score, int(update_flags), timezone.now())})
+
+    @staticmethod
+    def problem_type_keys(problem_ids: Iterable[int]) -> dict[int, list[str]]:
+        """The solved_by_type keys each of the given problems counts towards, in one query."""
+        Problem = apps.get_model("gameserver", "Problem")
+        keys = {problem_id: [] for problem_id in problem_ids}
+        for problem_id, problem_type_id in Problem.problem_type.through.objects.filter(
+            problem_id__in=keys
+        ).values_list("problem_id", "problemtype_id"):
+            keys[problem_id].append(str(problem_type_id))
+        for problem_type_keys in keys.values():
+            if not problem_type_keys:
+                problem_type_keys.append(UNTYPED)
+        return keys
+
+    @classmethod
+    def count_solved_types(cls, solves: Iterable[tuple[int, int]]) -> dict[int, Counter]:
+        """Counts ``(participation id, problem id)`` solves per participation and problem type."""
+        solves = list(solves)
+        keys = cls.problem_type_keys({problem_id for _, problem_id in solves})
+        counts = defaultdict(Counter)
+        for participation_id, problem_id in solves:
+            counts[participation_id].update(keys[problem_id])
+        return counts
+
+    @classmethod
+    def add_solved_types(cls, solves: list[tuple[int, int]]):
+        """
+        Adds new ``(participation id, problem id)`` solves to solved_by_type.
 
+        The rows must already exist (add_scores creates them) and are locked while they are
+        changed. Problems are counted under the types they have when they are solved; changing
+        the types of a problem afterwards needs a rebuild (reset_data) to be reflected.
+        """
+        if not solves:
+            return
+        counts = cls.count_solved_types(solves)
         with transaction.atomic():
-            queryset.select_for_update()  # prevent race conditions with other team members
+            scores = list(
+                cls.objects.select_for_update().filter(participation_id__in=counts).order_by("pk")
+            )
+            for score in scores:
+                solved = Counter(score.solved_by_type)
+                solved.update(counts[score.participation_id])
+                score.solved_by_type = dict(solved)
+            cls.objects.bulk_update(scores, ["solved_by_type"])
 
-            if update_flags:
-                queryset.update(
-                    points=F("points") + change_in_score,
-                    flag_count=F("flag_count") + 1,
-                    last_correct_submission=timezone.now(),
-                )
-            else:
-                queryset.update(
-                    points=F("points") + change_in_score, last_correct_submission=timezone.now()
-                )
+    @classmethod
+    def _rebuild_solved_types(
+        cls,
+        participations: QuerySet,
+        solves: QuerySet,
+        batch_size: int,
+        resume_after: Optional[int],
+    ):
+        if resume_after is not None:
+            participations = participations.filter(pk__gt=resume_after)
+            solves = solves.filter(participation__gt=resume_after)
+        counts = cls.count_solved_types(
+            solves.order_by().values_list("participation_id", "problem__problem_id").distinct()
+        )
+        scores = [
+            cls(pk=pk, solved_by_type=dict(counts.get(participation_id, {})))
+            for pk, participation_id in cls.objects.filter(
+                participation__in=participations
+            ).values_list("pk", "participation_id")
+        ]
+        cls.objects.bulk_update(scores, ["solved_by_type"], batch_size=batch_size)
 
     @classmethod
-    def reset_data(cls, contest: Optional["Contest"] = None, all: bool = False):
+    def _update_rank_indexes(cls, owner_ids):
+        contest_ids = set()
+        for participation_id, contest_id, points, last_correct_submission in cls.objects.filter(
+            participation_id__in=owner_ids
+        ).values_list(
+            "participation_id", "participation__contest_id", "points", "last_correct_submission"
+        ):
+            ranking.update(
+                cls.rank_index_name(contest_id), participation_id, points, last_correct_submission
+            )
+            contest_ids.add(contest_id)
+        # the scores changed, so do the cached scoreboard and participation fragments
+        for contest_id in contest_ids:
+            ranking.advance(
+                cls.rank_index_name(contest_id), shared_cache.bump_contest_generation(contest_id)
+            )
+
+    @classmethod
+    def rank_index_name(cls, contest_id: int) -> str:
+        return f"contest-{contest_id}"
+
+    @classmethod
+    def rank_index(cls, contest_id: int) -> ranking.RankIndex:
+        return ranking.get_index(
+            cls.rank_index_name(contest_id),
+            lambda: cls.objects.filter(participation__contest_id=contest_id).values_list(
+                "participation_id", "points", "last_correct_submission"
+            ),
+            shared_cache.contest_generation(contest_id),
+        )
+
+    @classmethod
+    def ranks_page(cls, contest: "Contest", number: int = 1, per_page: int = 50) -> list[Self]:
+        """A page of cls.ranks(contest) answered from the rank index."""
+        page = cls.rank_index(contest.pk).page(number, per_page)
+        scores = cls.objects.filter(participation_id__in=[pk for _, pk in page]).select_related(
+            "participation__team"
+        )
+        scores = {score.participation_id: score for score in scores}
+        ranked = []
+        for rank, pk in page:
+            if pk in scores:
+                scores[pk].rank = rank
+                scores[pk].is_solo = scores[pk].participation.team_id is not None
+                ranked.append(scores[pk])
+        return ranked
+
+    @classmethod
+    def reset_data(
+        cls,
+        contest: Optional["Contest"] = None,
+        all: bool = False,
+        batch_size: int = REBUILD_BATCH_SIZE,
+        resume_after: Optional[int] = None,
+        progress: Optional[RebuildProgress] = None,
+    ) -> int:
         assert contest is not None or all, "Either contest or all must be set to True"
-        ContestModel = apps.get_model("gameserver", "Contest")
+        ContestParticipationModel = apps.get_model("gameserver", "ContestParticipation")
         ContestSubmissionModel: ContestSubmission = apps.get_model(
             "gameserver", "ContestSubmission"
         )
-        if all:
-            contests = ContestModel.objects.all()
-            for contest in contests:
-                cls.reset_data(contest=contest)
-            return
 
-        cls.objects.filter(participation__contest=contest).delete()  # clear past objs
-        participants = contest.participations.all()
-        scores_to_create = []
-        for participant in participants:
-            queryset = participant._get_unique_correct_submissions()
-            queryset = queryset.aggregate(
-                points=Coalesce(Sum("problem__points"), 0),
-                flags=Count("problem"),
-            )
-            try:
-                last_correct_submission = (
-                    ContestSubmissionModel.objects.filter(
-                        problem__contest=contest,
-                        participation=participant,
-                        problem__problem__is_public=True,
-                        submission__is_correct=True,
-                    )
-                    .prefetch_related("submission")
-                    .latest("submission__date_created")
-                    .submission.date_created
-                )
-            except (
-                ContestSubmissionModel.DoesNotExist
-            ):  # user have never submitted to a public problem
-                last_correct_submission = EPOCH_TIME
-            scores_to_create.append(
-                ContestScore(
-                    participation=participant,
-                    flag_count=queryset["flags"],
-                    points=queryset["points"],
-                    last_correct_submission=last_correct_submission,
-                )
-            )
-        # Use bulk_create to create all objects in a single query
-        cls.objects.bulk_create(scores_to_create)
+        solves = ContestSubmissionModel.objects.filter(submission__is_correct=True)
+        if all:
+            participations = ContestParticipationModel.objects.all()
+            ranking.discard_prefix("contest-")
+        else:
+            participations = contest.participations.all()
+            solves = solves.filter(participation__contest=contest)
+            ranking.discard(cls.rank_index_name(contest.pk))
+
+        rows = cls._rebuild(
+            owners=participations,
+            solves=solves,
+            points_field="problem__points",
+            date_field="submission__date_created",
+            batch_size=batch_size,
+            resume_after=resume_after,
+            progress=progress,
+        )
+        cls._rebuild_solved_types(participations, solves, batch_size, resume_after)
+        contest_ids = (
+            participations.values_list("contest_id", flat=True).distinct() if all else [contest.pk]
+        )
+        for contest_id in contest_ids:
+            shared_cache.bump_contest_generation(contest_id)
+        return rows
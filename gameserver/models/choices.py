@@ -8,5 +8,11 @@ organization_request_status_choices = [
     ("r", "Rejected"),
 ]
 
+flag_mode_choices = [
+    ("exact", "Exact"),
+    ("case_insensitive", "Case insensitive"),
+    ("regex", "Regular expression"),
+]
+
 timezone_choices = [(i, i) for i in zoneinfo.available_timezones()]
 timezone_choices.sort(key=lambda x: x[0])
@@ -1,10 +1,8 @@
 from datetime import timedelta
 
 from django.apps import apps
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Min, Q
 from django.urls import reverse
 from django.utils import timezone
@@ -14,7 +12,11 @@ from django.utils.html import format_html
 from gameserver.models.cache import ContestScore
 
 from ..templatetags.common_tags import strfdelta
+from ..utils import access
+from ..utils import cache as shared_cache
+from ..utils.status import ProblemStatusMap
 from . import abstract
+from .submission import SubmissionFeed
 
 
 class ContestTag(abstract.Category):
@@ -101,6 +103,7 @@ class Contest(models.Model):
     def ranks(self):
         return self.ContestScore.ranks(self)
 
+    @access.memoize
     def is_visible_by(self, user):
         if self.is_public:
             return True
@@ -108,11 +111,12 @@ class Contest(models.Model):
         if not user.is_authenticated:
             return False
 
-        if self.organizations.filter(pk__in=user.organizations.all()).exists():
+        if self.pk in access.profile(user).organization_contest_ids:
             return True
 
         return self.is_editable_by(user)
 
+    @access.memoize
     def is_accessible_by(self, user):
         if not user.is_authenticated:
             return False
@@ -120,7 +124,7 @@ class Contest(models.Model):
         if not self.is_ongoing:
             return False
 
-        if self.organizations.filter(pk__in=user.organizations.all()).exists():
+        if self.pk in access.profile(user).organization_contest_ids:
             return True
 
         if self.is_editable_by(user):
@@ -128,6 +132,7 @@ class Contest(models.Model):
 
         return self.is_public
 
+    @access.memoize
     def is_editable_by(self, user):
         if not user.is_authenticated:
             return False
@@ -135,9 +140,7 @@ class Contest(models.Model):
         if user.is_superuser or user.has_perm("gameserver.edit_all_contests"):
             return True
 
-        return (
-            self.organizers.filter(pk=user.pk).exists() or self.curators.filter(pk=user.pk).exists()
-        )
+        return self.pk in access.profile(user).editable_contest_ids
 
     @classmethod
     def get_visible_contests(cls, user):
@@ -228,7 +231,7 @@ class ContestParticipation(models.Model):
         )
 
     def get_rank(self):
-        return self.ContestScore.ranks(participation=self)
+        return self.ContestScore.rank_index(self.contest_id).rank(self.pk)
 
     @cached_property
     def last_solve(self):
@@ -263,7 +266,7 @@ class ContestParticipation(models.Model):
         )
 
     def rank(self):
-        return self.contest.ranks().filter(Q(points__gte=self.points())).count()
+        return self.get_rank()
 
     def has_attempted(self, problem):
         return problem.is_attempted_by(self)
@@ -274,6 +277,15 @@ class ContestParticipation(models.Model):
     def has_firstblooded(self, problem):
         return problem.is_firstblooded_by(self)
 
+    def problem_status_map(self) -> ProblemStatusMap:
+        """The statuses of this participation's submissions, keyed by ContestProblem id."""
+        status_map = ProblemStatusMap()
+        for problem_id, is_correct, pk, first_blood_id in self.submissions.values_list(
+            "problem_id", "submission__is_correct", "pk", "problem__first_blood_id"
+        ):
+            status_map.add(problem_id, solved=is_correct, firstblood=pk == first_blood_id)
+        return status_map
+
 
 class ContestProblem(models.Model):
     contest = models.ForeignKey(
@@ -290,6 +302,15 @@ class ContestProblem(models.Model):
 
     order = models.PositiveIntegerField(default=0)
 
+    first_blood = models.ForeignKey(
+        "ContestSubmission",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="The first correct submission, claimed when it is written",
+    )
+
     class Meta:
         ordering = ["order"]
         unique_together = ("contest", "problem")
@@ -309,24 +330,24 @@ class ContestProblem(models.Model):
         ).exists()
 
     def is_firstblooded_by(self, participation):
-        if not self.is_solved_by(participation):
-            return False
-
-        participation_first_correct_submission = (
-            self.submissions.filter(participation=participation, submission__is_correct=True)
-            .order_by("pk")
-            .first()
-        )
-
-        prev_correct_submissions = self.submissions.filter(
-            submission__is_correct=True, pk__lte=participation_first_correct_submission.pk
-        )
-
         return (
-            prev_correct_submissions.count() == 1
-            and prev_correct_submissions.first() == participation_first_correct_submission
+            participation is not None
+            and self.first_blood_id is not None
+            and self.first_blood.participation_id == participation.pk
         )
 
+    @classmethod
+    def claim_first_blood(cls, problem_id: int, contest_submission_id: int) -> bool:
+        """
+        Records a correct contest submission as the first blood of its problem, unless one
+        already is. Returns whether the submission is the problem's first blood.
+        """
+        if cls.objects.filter(pk=problem_id, first_blood=None).update(
+            first_blood_id=contest_submission_id
+        ):
+            return True
+        return cls.objects.filter(pk=problem_id, first_blood_id=contest_submission_id).exists()
+
 
 class ContestSubmission(models.Model):
     participation = models.ForeignKey(
@@ -364,28 +385,19 @@ class ContestSubmission(models.Model):
 
     @cached_property
     def is_firstblood(self):
-        prev_correct_submissions = ContestSubmission.objects.filter(
-            problem=self.problem, submission__is_correct=True, pk__lte=self.pk
-        )
-
-        return prev_correct_submissions.count() == 1 and prev_correct_submissions.first() == self
+        return self.problem.first_blood_id == self.pk
 
-    @property
-    async def ais_firstblooded(self):
-        prev_correct_submissions = ContestSubmission.objects.filter(
-            problem=self.problem, submission__is_correct=True, pk__lte=self.pk
-        )
-
-        return (
-            await prev_correct_submissions.acount() == 1
-            and await prev_correct_submissions.afirst() == self
-        )
+    def claim_first_blood(self) -> bool:
+        """Claims first blood if this submission is correct; returns whether it is first blood."""
+        return self.is_correct and ContestProblem.claim_first_blood(self.problem_id, self.pk)
 
     def save(self, *args, **kwargs):
-        cache.delete(
-            make_template_fragment_key("participant_data", [self.participation])
-        )  # see participation.html
-        cache.delete(
-            make_template_fragment_key("user_participation", [self.participation])
-        )  # see scoreboard.html
         super().save(*args, **kwargs)
+        SubmissionFeed.objects.filter(pk=self.submission_id).update(
+            contest_id=self.participation.contest_id
+        )
+        if self.is_correct:
+            # invalidates the participant_data (participation.html) and user_participation
+            # (scoreboard.html) fragments of every participation in the contest
+            contest_id = self.participation.contest_id
+            transaction.on_commit(lambda: shared_cache.bump_contest_generation(contest_id))
@@ -1,15 +1,17 @@
 import hashlib
-import re
 import secrets
+from typing import Iterable
 
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 
-from ..utils import challenge
+from ..utils import access, challenge, flags
 from . import abstract
+from .choices import flag_mode_choices
 from .contest import ContestProblem
 
 # Create your models here.
@@ -43,6 +45,15 @@ class Problem(models.Model):
     problem_type = models.ManyToManyField(ProblemType, related_name="problems", blank=True)
 
     flag = models.CharField(max_length=256)
+    extra_flags = models.JSONField(
+        default=list, blank=True, help_text="A list of other flags that are also accepted"
+    )
+    flag_mode = models.CharField(
+        max_length=16,
+        choices=flag_mode_choices,
+        default="exact",
+        help_text="How submissions are compared to the flags",
+    )
     points = models.PositiveSmallIntegerField()
     challenge_spec = models.JSONField(null=True, blank=True)
     log_submission_content = models.BooleanField(default=False)
@@ -67,18 +78,33 @@ class Problem(models.Model):
     def get_absolute_url(self):
         return reverse("problem_detail", args=[self.slug])
 
+    def clean(self):
+        super().clean()
+        if not isinstance(self.extra_flags, list) or not all(
+            isinstance(flag, str) for flag in self.extra_flags
+        ):
+            raise ValidationError({"extra_flags": "Must be a list of strings."})
+        if self.flag_mode == flags.REGEX:
+            errors = {}
+            for name, patterns in (("flag", [self.flag]), ("extra_flags", self.extra_flags)):
+                for pattern in patterns:
+                    if (error := flags.pattern_error(pattern)) is not None:
+                        errors.setdefault(name, []).append(
+                            f"{pattern} is not a valid regular expression: {error}"
+                        )
+            if errors:
+                raise ValidationError(errors)
+
     @cached_property
     def is_private(self):
         return not self.is_public
 
     @property
     def flag_format(self):
-        flag_format_match = re.match(r"(.*)\{.*\}", self.flag)
+        return flags.get_verifier(self).flag_format
 
-        if flag_format_match is not None:
-            return f"{flag_format_match.group(1)}{{}}"
-        else:
-            return None
+    def verify_flag(self, flag):
+        return flags.get_verifier(self).verify(flag)
 
     def contest_problem(self, contest):
         try:
@@ -97,10 +123,14 @@ class Problem(models.Model):
 
     def create_challenge_instance(self, instance_owner):
         if self.challenge_spec is not None:
-            return challenge.create_challenge_instance(
+            return challenge.launch_challenge_instance(
                 self.challenge_spec, self.slug, self.flag, instance_owner
             )
 
+    def fill_warm_pool(self):
+        if self.challenge_spec is not None:
+            challenge.ensure_warm_pool(self.challenge_spec, self.slug, self.flag)
+
     def fetch_challenge_instance(self, instance_owner):
         if self.challenge_spec is not None:
             return challenge.fetch_challenge_instance(
@@ -122,6 +152,7 @@ class Problem(models.Model):
     def is_firstblooded_by(self, user):
         return self.firstblood.user == user if self.firstblood else False
 
+    @access.memoize
     def is_accessible_by(self, user):
         if self.is_public:
             return True
@@ -129,7 +160,7 @@ class Problem(models.Model):
         if not user.is_authenticated:
             return False
 
-        if self.organizations.filter(pk__in=user.organizations.all()).exists():
+        if self.pk in access.profile(user).organization_problem_ids:
             return True
 
         if user.current_contest is not None and user.current_contest.contest.has_problem(self):
@@ -137,12 +168,13 @@ class Problem(models.Model):
 
         return self.is_editable_by(user)
 
+    @access.memoize
     def is_editable_by(self, user):
         if user.is_superuser or user.has_perm("gameserver.edit_all_problems"):
             return True
 
         if user.is_authenticated:
-            if self.author.filter(id=user.id).exists() or self.testers.filter(id=user.id).exists():
+            if self.pk in access.profile(user).editable_problem_ids:
                 return True
 
         return False
@@ -175,24 +207,66 @@ class Problem(models.Model):
 
 
 def problem_file_path(instance, filename):
+    # where files were stored before they were content addressed, kept for old migrations
     return f"problem/{instance.problem.opaque_id}/{filename}"
 
 
+def artifact_path(instance, filename):
+    # the name a file is downloaded as is ProblemFile.name, the stored file is its content alone
+    return f"artifact/{instance.checksum}"
+
+
+def file_checksum(file) -> str:
+    """The SHA-256 of a file, as computed by the upload handlers or else by reading it once."""
+    checksum = getattr(file, "sha256", None)
+    if checksum is None:
+        hash_sha256 = hashlib.sha256()
+        for chunk in file.chunks():
+            hash_sha256.update(chunk)
+        checksum = hash_sha256.hexdigest()
+    return checksum
+
+
 class ProblemFile(models.Model):
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name="files")
-    artifact = models.FileField(max_length=100 + 172, upload_to=problem_file_path, unique=True)
-    checksum = models.CharField(max_length=64)
+    # stored by checksum, so identical files are stored once whatever they are named
+    artifact = models.FileField(max_length=100 + 172, upload_to=artifact_path)
+    checksum = models.CharField(max_length=64, db_index=True)
+    name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The name the file is downloaded as, the uploaded file's name if blank",
+    )
 
     def __str__(self):
         return self.file_name
 
     @property
     def file_name(self):
-        return self.artifact.name.split("/")[-1]
+        return self.name or self.artifact.name.split("/")[-1]
+
+    def get_absolute_url(self):
+        return reverse("problem_file", args=[self.problem.slug, self.pk])
 
     def save(self, *args, **kwargs):
-        hash_sha256 = hashlib.sha256()
-        for chunk in self.artifact.chunks():
-            hash_sha256.update(chunk)
-        self.checksum = hash_sha256.hexdigest()
+        if not self.artifact._committed:
+            # only new uploads are hashed, and only uploaded if nothing stored has their content
+            self.name = self.name or self.artifact.name.split("/")[-1]
+            self.checksum = file_checksum(self.artifact.file)
+            stored = (
+                ProblemFile.objects.filter(checksum=self.checksum)
+                .values_list("artifact", flat=True)
+                .first()
+            )
+            if stored is not None:
+                self.artifact = stored
         super().save(*args, **kwargs)
+
+    @classmethod
+    def discard_artifacts(cls, names: Iterable[str]):
+        """Deletes the stored files of ``names`` that no problem file uses anymore."""
+        names = set(names)
+        used = set(cls.objects.filter(artifact__in=names).values_list("artifact", flat=True))
+        storage = cls._meta.get_field("artifact").storage
+        for name in names - used:
+            storage.delete(name)
@@ -8,6 +8,7 @@ from django.db.models.functions import Coalesce, Rank
 from django.urls import reverse
 
 from .cache import UserScore
+from ..utils.status import ProblemStatusMap
 from .choices import organization_request_status_choices, timezone_choices
 from .contest import ContestParticipation, ContestProblem
 from .problem import Problem
@@ -151,6 +152,39 @@ class User(AbstractUser):
         else:
             raise TypeError("problem must be a Problem or ContestProblem")
 
+    def problem_status_map(self, problems=None) -> ProblemStatusMap:
+        """
+        The statuses of this user's problems, limited to ``problems`` if given.
+
+        Like has_solved and friends, the problems of the user's current contest take the
+        statuses of its participation and the others those of the practice submissions.
+        """
+        status_map = ProblemStatusMap()
+        participation = self.current_contest
+        if participation is not None:
+            contest_problems = participation.contest.problems.all()
+            if problems is not None:
+                contest_problems = contest_problems.filter(problem__in=problems)
+            problem_ids = dict(contest_problems.values_list("pk", "problem_id"))
+            status_map.contest_problems = set(problem_ids.values())
+            contest_statuses = participation.problem_status_map()
+            for contest_problem_id, problem_id in problem_ids.items():
+                if contest_statuses.has_attempted(contest_problem_id):
+                    status_map.add(
+                        problem_id,
+                        solved=contest_statuses.has_solved(contest_problem_id),
+                        firstblood=contest_statuses.has_firstblooded(contest_problem_id),
+                    )
+
+        submissions = self.submissions.exclude(problem__in=status_map.contest_problems)
+        if problems is not None:
+            submissions = submissions.filter(problem__in=problems)
+        for problem_id, is_correct, firstblooded in submissions.values_list(
+            "problem_id", "is_correct", "firstblooded"
+        ).distinct():
+            status_map.add(problem_id, solved=is_correct, firstblood=firstblooded is not None)
+        return status_map
+
     def participation_for_contest(self, contest):
         return ContestParticipation.objects.filter(participants=self, contest=contest).first()
 
@@ -1,9 +1,11 @@
 from django.db import models
 from django.db.models import Q
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.html import format_html
 
+from ..utils import access
 from .cache import UserScore
 
 
@@ -25,7 +27,8 @@ class Submission(models.Model):
         related_query_name="submission",
     )
     is_correct = models.BooleanField(default=False, db_index=True)
-    date_created = models.DateTimeField(auto_now_add=True)
+    # set by the submission queue to when the flag was submitted, which may be before the write
+    date_created = models.DateTimeField(default=timezone.now, editable=False)
     content = models.CharField(max_length=256, null=True, default=None)
 
     def get_absolute_admin_url(self):
@@ -38,11 +41,14 @@ class Submission(models.Model):
         return f"{self.user.username}'s submission for {self.problem.name}"
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         if self.is_correct and self.problem.is_public:
             UserScore.update_or_create(
                 user=self.user, change_in_score=self.problem.points, update_flags=True
             )
-        return super().save(*args, **kwargs)
+        super().save(*args, **kwargs)
+        if adding:
+            SubmissionFeed.entry_for(self, self.problem.is_public).save()
 
     @cached_property
     def is_firstblood(self):
@@ -75,3 +81,110 @@ class Submission(models.Model):
             models.Index(fields=["problem"]),
             models.Index(fields=["is_correct"]),
         ]
+
+
+class QueuedSubmission(models.Model):
+    """
+    A judged flag submission waiting to be written, stored before its verdict is shown so it
+    outlives the worker that accepted it (see gameserver/utils/submissions.py).
+    """
+
+    date_created = models.DateTimeField()
+    submission = models.JSONField(help_text="The other fields of the PendingSubmission")
+
+    def __str__(self):
+        return f"Queued submission {self.pk}"
+
+
+class SubmissionFeed(models.Model):
+    """
+    One narrow row per submission, written with it, that submission lists are served from.
+
+    The visibility class of each row says who may list it without looking at the problem's
+    authors, testers and organizations, so visible pages need neither joins nor distinct().
+    Rows are only updated when a problem changes visibility (see signals.py) or a submission
+    is attributed to a contest.
+    """
+
+    PUBLIC = 0
+    PRIVATE = 1
+    VISIBILITY_CHOICES = [(PUBLIC, "Public problem"), (PRIVATE, "Private problem")]
+
+    submission = models.OneToOneField(
+        Submission, on_delete=models.CASCADE, primary_key=True, related_name="feed_entry"
+    )
+    user = models.ForeignKey(
+        "User", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    problem = models.ForeignKey("Problem", on_delete=models.CASCADE, related_name="+")
+    contest = models.ForeignKey(
+        "Contest", on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    is_correct = models.BooleanField()
+    visibility = models.PositiveSmallIntegerField(choices=VISIBILITY_CHOICES)
+    date_created = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["visibility", "-submission"], name="feed_visibility_idx"),
+            models.Index(fields=["user", "-submission"], name="feed_user_idx"),
+            models.Index(fields=["problem", "-submission"], name="feed_problem_idx"),
+            models.Index(fields=["contest", "-submission"], name="feed_contest_idx"),
+        ]
+
+    def __str__(self):
+        return f"Feed entry of submission {self.pk}"
+
+    @property
+    def is_firstblood(self):
+        return self.problem.firstblood_id == self.pk
+
+    @classmethod
+    def visibility_of(cls, problem_is_public: bool) -> int:
+        return cls.PUBLIC if problem_is_public else cls.PRIVATE
+
+    @classmethod
+    def entry_for(cls, submission, problem_is_public: bool, contest_id=None):
+        return cls(
+            submission_id=submission.pk,
+            user_id=submission.user_id,
+            problem_id=submission.problem_id,
+            contest_id=contest_id,
+            is_correct=submission.is_correct,
+            visibility=cls.visibility_of(problem_is_public),
+            date_created=submission.date_created,
+        )
+
+    @classmethod
+    def listing(cls, queryset):
+        """Loads just what the submission list rows show."""
+        return queryset.select_related("user", "problem").only(
+            "submission",
+            "is_correct",
+            "date_created",
+            "user",
+            "user__username",
+            "problem",
+            "problem__name",
+            "problem__slug",
+            "problem__firstblood",
+        )
+
+    @classmethod
+    def get_visible_entries(cls, user):
+        """The feed rows of the submissions in Submission.get_visible_submissions(user)."""
+        if not user.is_authenticated:
+            return cls.objects.filter(visibility=cls.PUBLIC)
+
+        if user.is_superuser or user.has_perm("gameserver.edit_all_problems"):
+            return cls.objects.all()
+
+        if user.current_contest_id is not None:
+            return cls.objects.filter(contest_id=user.current_contest.contest_id)
+
+        profile = access.profile(user)
+        return cls.objects.filter(
+            Q(visibility=cls.PUBLIC)
+            | Q(user=user)
+            | Q(problem_id__in=profile.editable_problem_ids | profile.organization_problem_ids)
+        )
@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+
+class WebhookDelivery(models.Model):
+    """
+    An outgoing webhook request, written in the same transaction as the event it reports.
+
+    Deliveries are sent by the deliver_webhooks command (see gameserver/utils/webhooks.py)
+    and kept once delivered or given up on.
+    """
+
+    url = models.URLField()
+    payload = models.JSONField(help_text="The JSON body, or a string sent as text")
+    date_created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(
+        default=timezone.now, null=True, help_text="When to try next, empty once finished"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    date_delivered = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["next_attempt"], name="webhook_next_attempt_idx")]
+
+    def __str__(self):
+        return f"Webhook delivery to {self.url}"
+
+    @property
+    def is_pending(self):
+        return self.next_attempt is not None
@@ -1,48 +1,138 @@
 import logging
 
-import aiohttp
-from asgiref.sync import sync_to_async
-from django.contrib.sites.models import Site
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from gameserver.models import ContestSubmission
+from gameserver.models import (
+    Contest,
+    ContestProblem,
+    ContestSubmission,
+    Problem,
+    ProblemFile,
+    ProblemGroup,
+    ProblemType,
+    SubmissionFeed,
+    User,
+)
+from gameserver.utils import access, catalogue, contest_session, flags, scoreboard, webhooks
 
 logger = logging.getLogger(__name__)
 
 
-def is_discord(webhook: str):
-    return webhook.startswith("https://discord.com/api")
+@receiver(post_save, sender=ContestSubmission, dispatch_uid="notify_contest_firstblood")
+def firstblood_notification_handler(sender, instance, created, raw, **kwargs):
+    # the submission queue claims first bloods and queues their webhooks itself; this covers
+    # contest submissions saved any other way
+    if not created or raw:
+        return
+    if instance.claim_first_blood():
+        webhooks.enqueue_first_bloods([instance.pk])
 
 
-def construct_discord_payload(submission: ContestSubmission) -> dict:
-    BASE_URL = "https://" + Site.objects.get_current().domain
+@receiver(post_save, sender=Problem, dispatch_uid="invalidate_problem_flag_verifier")
+@receiver(post_delete, sender=Problem, dispatch_uid="delete_problem_flag_verifier")
+def flag_verifier_invalidation_handler(sender, instance, **kwargs):
+    flags.invalidate(instance.pk)
 
-    return {
-        "username": f"{submission.participation.contest.name} First Blood Notifier",
-        "avatar_url": BASE_URL + "/static/favicon.png",
-        "content": f"First blood on [{submission.problem.problem}]({BASE_URL + submission.problem.get_absolute_url()}) by [{submission.participation.participant}]({BASE_URL + submission.participation.participant.get_absolute_url()})!",
-    }
 
+@receiver(post_save, sender=Contest, dispatch_uid="invalidate_contest_sessions")
+def contest_session_invalidation_handler(sender, instance, **kwargs):
+    contest_session.invalidate_contests([instance.pk])
 
-@receiver(post_save, sender=ContestSubmission, dispatch_uid="notify_contest_firstblood")
-async def firstblood_notification_handler(sender, instance, created, raw, using, update_fields, **kwargs):
-    if not created:  # only for new submissions
+
+@receiver(m2m_changed, sender=Contest.organizers.through, dispatch_uid="contest_organizers_changed")
+@receiver(m2m_changed, sender=Contest.curators.through, dispatch_uid="contest_curators_changed")
+def contest_editors_changed_handler(sender, instance, action, reverse, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        access.bump_generation()
+    if action not in ("post_add", "post_remove", "pre_clear"):
         return
-    if not await instance.ais_firstblooded:
+    if reverse:  # instance is the user
+        contest_session.invalidate([instance.pk])
+    else:
+        contest_session.invalidate_contests([instance.pk])
+
+
+@receiver(
+    m2m_changed, sender=Contest.organizations.through, dispatch_uid="contest_organizations_changed"
+)
+def contest_organizations_changed_handler(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        access.bump_generation()
+    if action not in ("post_add", "post_remove", "pre_clear"):
         return
+    if not reverse:
+        contest_session.invalidate_contests([instance.pk])
+    elif pk_set is not None:
+        contest_session.invalidate_contests(pk_set)
+    else:  # clearing the contests of an organization
+        contest_session.invalidate_contests(instance.contests.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=User.organizations.through, dispatch_uid="user_organizations_changed")
+def user_organizations_changed_handler(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        access.bump_generation()
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        contest_session.invalidate([instance.pk])
+    elif pk_set is not None:
+        contest_session.invalidate(pk_set)
+    else:  # clearing the members of an organization
+        contest_session.invalidate(instance.members.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Problem.author.through, dispatch_uid="problem_authors_changed")
+@receiver(m2m_changed, sender=Problem.testers.through, dispatch_uid="problem_testers_changed")
+@receiver(
+    m2m_changed, sender=Problem.organizations.through, dispatch_uid="problem_organizations_changed"
+)
+def problem_access_changed_handler(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        access.bump_generation()
+
+
+@receiver(post_save, sender=Problem, dispatch_uid="problem_saved_catalogue")
+@receiver(post_delete, sender=Problem, dispatch_uid="problem_deleted_catalogue")
+@receiver(post_save, sender=ProblemType, dispatch_uid="problem_type_saved_catalogue")
+@receiver(post_delete, sender=ProblemType, dispatch_uid="problem_type_deleted_catalogue")
+@receiver(post_save, sender=ProblemGroup, dispatch_uid="problem_group_saved_catalogue")
+@receiver(post_delete, sender=ProblemGroup, dispatch_uid="problem_group_deleted_catalogue")
+def problem_catalogue_invalidation_handler(sender, **kwargs):
+    catalogue.bump_generation()
+
+
+@receiver(m2m_changed, sender=Problem.problem_type.through, dispatch_uid="problem_types_changed")
+@receiver(m2m_changed, sender=Problem.problem_group.through, dispatch_uid="problem_groups_changed")
+def problem_categories_changed_handler(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        catalogue.bump_generation()
+        if sender is Problem.problem_type.through:
+            scoreboard.bump_problem_types_generation()
+
+
+@receiver(post_save, sender=ContestProblem, dispatch_uid="contest_problem_saved_types")
+@receiver(post_delete, sender=ContestProblem, dispatch_uid="contest_problem_deleted_types")
+@receiver(post_save, sender=ProblemType, dispatch_uid="problem_type_saved_totals")
+@receiver(post_delete, sender=ProblemType, dispatch_uid="problem_type_deleted_totals")
+def problem_type_totals_invalidation_handler(sender, **kwargs):
+    scoreboard.bump_problem_types_generation()
+
+
+@receiver(post_save, sender=Problem, dispatch_uid="problem_saved_submission_feed")
+def submission_feed_visibility_handler(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    visibility = SubmissionFeed.visibility_of(instance.is_public)
+    SubmissionFeed.objects.filter(problem=instance).exclude(visibility=visibility).update(
+        visibility=visibility
+    )
+
 
-    if webhook := instance.participation.contest.first_blood_webhook:
-        payload: dict = await sync_to_async(construct_discord_payload)(submission=instance)
-        if not is_discord(webhook):
-            payload = payload["content"]  # only send the content to non-discord webhooks
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                webhook,
-                json=payload,
-            ) as resp:
-                if resp.status != 200:
-                    text = await resp.text()
-                    logger.error(
-                        f"Failed to send webhook: {text} - {resp.status} - {webhook} - {payload}"
-                    )
+@receiver(post_delete, sender=ProblemFile, dispatch_uid="problem_file_deleted_artifact")
+def problem_file_artifact_handler(sender, instance, **kwargs):
+    # artifacts are shared by every problem file with the same content
+    name = instance.artifact.name
+    transaction.on_commit(lambda: ProblemFile.discard_artifacts([name]))
@@ -1,6 +1,7 @@
 from django import template
 
 from ..models import Problem
+from ..utils.status import ProblemStatusMap
 
 register = template.Library()
 
@@ -17,7 +18,22 @@ def contest_color(contest):
 
 @register.filter
 def problem_status(problem, user):
-    if (
+    """
+    The status of ``problem`` for ``user``.
+
+    ``user`` may instead be a ProblemStatusMap preloaded by the view (see
+    User.problem_status_map and ContestParticipation.problem_status_map), in which case no
+    queries are made.
+    """
+    if isinstance(user, ProblemStatusMap):
+        if (
+            isinstance(problem, Problem)
+            and not problem.is_public
+            and not user.in_contest(problem.pk)
+        ):
+            return "private"
+        return user.status(problem.pk)
+    elif (
         isinstance(problem, Problem)
         and not problem.is_public
         and not (user.current_contest and user.current_contest.contest.has_problem(problem))
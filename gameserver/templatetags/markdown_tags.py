@@ -1,4 +1,6 @@
+import hashlib
 import re
+import threading
 
 import bleach.sanitizer as sanitizer
 import bleach_allowlist
@@ -6,9 +8,12 @@ import mistune
 from bleach.css_sanitizer import CSSSanitizer
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 
+from ..utils.cache import LRUCache
+
 
 render = mistune.create_markdown(
     renderer=mistune.HTMLRenderer(escape=False),
@@ -56,8 +61,81 @@ cleaner = sanitizer.Cleaner(
 )
 
 
+# Bump when the cleaner configuration above changes, so previously rendered HTML is not reused
+RENDER_VERSION = 1
+render_config = f"{RENDER_VERSION}:{settings.MISTUNE_PLUGINS!r}:{settings.ROOT}"
+
+rendered = LRUCache(settings.MARKDOWN_CACHE["size"])
+
+# Renders between flushes of this process's hit counters to the shared cache
+STATS_FLUSH_INTERVAL = 100
+STATS = ("local_hits", "shared_hits", "misses")
+_stats_lock = threading.Lock()
+_stats = dict.fromkeys(STATS, 0)
+_unflushed = dict.fromkeys(STATS, 0)
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+        _unflushed[stat] += 1
+        if sum(_unflushed.values()) < STATS_FLUSH_INTERVAL:
+            return
+        counts = dict(_unflushed)
+        _unflushed.update(dict.fromkeys(STATS, 0))
+    for name, count in counts.items():
+        key = f"markdown-stats:{name}"
+        cache.add(key, 0, None)
+        cache.incr(key, count)
+
+
+def cache_stats() -> dict:
+    """Hit counts of the render cache, for this process and (flushed) for every process."""
+    shared = cache.get_many([f"markdown-stats:{name}" for name in STATS])
+    shared = {name: shared.get(f"markdown-stats:{name}", 0) for name in STATS}
+    with _stats_lock:
+        local = dict(_stats)
+    return {
+        "process": local,
+        "all": shared,
+        "process_hit_rate": _hit_rate(local),
+        "hit_rate": _hit_rate(shared),
+        "entries": len(rendered),
+    }
+
+
+def _hit_rate(counts):
+    total = sum(counts.values())
+    return (counts["local_hits"] + counts["shared_hits"]) / total if total else None
+
+
+def render_markdown(source: str) -> str:
+    """
+    The sanitized HTML of ``source``.
+
+    Renders are cached by a hash of the source and the render configuration, in an
+    in-process LRU and then in the shared cache, so the same text is only sanitized again
+    once it has been evicted from both.
+    """
+    digest = hashlib.sha256(f"{render_config}\0{source}".encode()).hexdigest()
+    html = rendered.get(digest)
+    if html is not None:
+        _count("local_hits")
+        return html
+
+    key = f"markdown:{digest}"
+    html = cache.get(key)
+    if html is not None:
+        _count("shared_hits")
+    else:
+        _count("misses")
+        html = cleaner.clean(render(re.sub(bodge_pattern, bodge_replace, source)))
+        cache.set(key, html, settings.MARKDOWN_CACHE["timeout"])
+    rendered.set(digest, html)
+    return html
+
+
 @register.filter
 @stringfilter
 def markdown(field_name):
-    raw = render(re.sub(bodge_pattern, bodge_replace, field_name))
-    return mark_safe(cleaner.clean(raw))
+    return mark_safe(render_markdown(field_name))
@@ -24,6 +24,8 @@ def get_search_page(request):
 def format_GET(GET: QueryDict):
     GET = GET.copy()
     GET.pop("page", None)
+    GET.pop("before", None)
+    GET.pop("after", None)
     if GET.get("nfts", None) == "":
         del GET["nfts"]
     return GET.urlencode()
@@ -1 +1,900 @@
-# Create your tests here.
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, unused_port
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import models
+from .templatetags import color_tags
+from .utils import bulk_import
+from .utils import cache as shared_cache
+from .utils import flags, metrics, ranking, submissions, webhooks
+
+# the tests run without Redis
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(
+    METRICS={
+        "enabled": True,
+        "flush_interval": 1000,
+        "token": "",
+        "log": False,
+        "enforce_budgets": True,
+    },
+    CACHES=LOCAL_CACHES,
+)
+class QueryBudgetTests(TestCase):
+    """Requests every view with a query_budget; MetricsMiddleware fails those over budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = models.User.objects.create_user("player", password="password")
+        cls.problem = models.Problem.objects.create(
+            name="Problem",
+            slug="problem",
+            description="A problem.",
+            summary="A problem.",
+            flag="ctf{flag}",
+            points=100,
+            is_public=True,
+        )
+        cls.contest = models.Contest.objects.create(
+            name="Contest",
+            slug="contest",
+            description="A contest.",
+            summary="A contest.",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+        )
+        models.ContestProblem.objects.create(contest=cls.contest, problem=cls.problem, points=100)
+        cls.participation = models.ContestParticipation.objects.create(contest=cls.contest)
+        cls.participation.participants.add(cls.user)
+        for is_correct in (False, True):
+            models.Submission.objects.create(
+                user=cls.user, problem=cls.problem, is_correct=is_correct
+            )
+
+    def assert_within_budget(self, url):
+        try:
+            response = self.client.get(url)
+        except metrics.QueryBudgetExceeded as e:
+            self.fail(str(e))
+        self.assertEqual(response.status_code, 200, url)
+
+    def test_budgets(self):
+        urls = [
+            reverse("problem_list"),
+            reverse("problem_detail", args=[self.problem.slug]),
+            reverse("submission_list"),
+            reverse("contest_detail", args=[self.contest.slug]),
+            reverse("contest_scoreboard", args=[self.contest.slug]),
+            reverse("contest_participation_detail", args=[self.participation.pk]),
+        ]
+        for logged_in in (False, True):
+            if logged_in:
+                self.client.force_login(self.user)
+            for url in urls:
+                with self.subTest(url=url, logged_in=logged_in):
+                    self.assert_within_budget(url)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CacheMetricsTests(TestCase):
+    def test_counts_lookups(self):
+        cache.set("hit", 1)
+        with metrics.record() as recorded:
+            cache.get("hit")
+            cache.get("miss")
+            # LocMemCache's get_many calls its get, which must not be counted again
+            cache.get_many(["hit", "miss", "other"])
+        self.assertEqual((recorded.cache_hits, recorded.cache_misses), (2, 3))
+
+    def test_counts_only_while_recording(self):
+        with metrics.record() as recorded:
+            pass
+        cache.get("miss")
+        self.assertEqual((recorded.cache_hits, recorded.cache_misses), (0, 0))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SubmissionQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [models.User.objects.create_user(f"player{i}") for i in range(3)]
+        cls.problems = [
+            models.Problem.objects.create(
+                name=f"Problem {i}",
+                slug=f"problem-{i}",
+                description="A problem.",
+                summary="A problem.",
+                flag="ctf{flag}",
+                points=100 * (i + 1),
+                is_public=True,
+            )
+            for i in range(2)
+        ]
+
+    def pending(self, user, problem, is_correct=True, **kwargs):
+        return submissions.PendingSubmission(
+            user_id=user.pk,
+            problem_id=problem.pk,
+            problem_points=problem.points,
+            problem_is_public=problem.is_public,
+            is_correct=is_correct,
+            **kwargs,
+        )
+
+    def queue(self, *pending):
+        for p in pending:
+            submissions._queued(p).save()
+
+    def assert_scores(self, expected):
+        self.assertEqual(
+            {
+                score.user_id: (score.points, score.flag_count)
+                for score in models.UserScore.objects.filter(user__in=self.users)
+            },
+            expected,
+        )
+
+    def test_batches(self):
+        queue = submissions.SubmissionQueue(batch_size=2, flush_interval=0)
+        self.queue(
+            *[self.pending(user, problem) for user in self.users for problem in self.problems]
+        )
+        self.assertEqual(queue._write_batch(), 2)
+        self.assertEqual(models.QueuedSubmission.objects.count(), 4)
+        queue.flush()
+        self.assertFalse(models.QueuedSubmission.objects.exists())
+        self.assertEqual(models.Submission.objects.count(), 6)
+        self.assert_scores({user.pk: (300, 2) for user in self.users})
+
+    def test_duplicates_are_recorded_without_points(self):
+        user, problem = self.users[0], self.problems[0]
+        submissions.write_submissions([self.pending(user, problem)])
+        submissions.write_submissions(
+            [self.pending(user, problem), self.pending(user, problem, is_correct=False)]
+        )
+        submissions.write_submissions([self.pending(user, problem)])
+        self.assertEqual(
+            models.Submission.objects.filter(user=user, problem=problem, is_correct=True).count(),
+            3,
+        )
+        self.assert_scores({user.pk: (100, 1)})
+        self.assertEqual(
+            models.Problem.objects.get(pk=problem.pk).firstblood,
+            models.Submission.objects.filter(is_correct=True).earliest("pk"),
+        )
+
+    def test_rows_left_behind_are_written(self):
+        # queued by a worker that died before writing them
+        self.queue(self.pending(self.users[0], self.problems[1]))
+        call_command("flush_submissions", stdout=StringIO())
+        self.assertFalse(models.QueuedSubmission.objects.exists())
+        self.assert_scores({self.users[0].pk: (200, 1)})
+
+    def test_submit_writes_during_the_request_without_skip_locked(self):
+        with override_settings(SUBMISSION_QUEUE={"enabled": True}):
+            submissions.submit(self.pending(self.users[0], self.problems[0]))
+        self.assertFalse(models.QueuedSubmission.objects.exists())
+        self.assertTrue(models.Submission.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class BulkImportTests(TestCase):
+    def problem_bundle(self, flag):
+        return bulk_import.Bundle(
+            problems={
+                "imported": {
+                    "name": "Imported",
+                    "description": "An imported problem.",
+                    "summary": "An imported problem.",
+                    "flag": flag,
+                    "points": 100,
+                    "is_public": True,
+                }
+            }
+        )
+
+    def test_changed_flags_are_accepted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_import.import_bundle(self.problem_bundle("ctf{old}"))
+        problem = models.Problem.objects.get(slug="imported")
+        self.assertTrue(flags.get_verifier(problem).verify("ctf{old}"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_import.import_bundle(self.problem_bundle("ctf{new}"))
+        self.assertNotIn(problem.pk, flags._verifiers)
+        verifier = flags.get_verifier(models.Problem.objects.get(slug="imported"))
+        self.assertTrue(verifier.verify("ctf{new}"))
+        self.assertFalse(verifier.verify("ctf{old}"))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ProblemStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.player = models.User.objects.create_user("player")
+        cls.other = models.User.objects.create_user("other")
+        cls.problems = {
+            name: models.Problem.objects.create(
+                name=name,
+                slug=name,
+                description="A problem.",
+                summary="A problem.",
+                flag="ctf{flag}",
+                points=100,
+                is_public=is_public,
+            )
+            for name, is_public in (
+                ("firstblood", True),
+                ("solved", True),
+                ("attempted", True),
+                ("unsolved", True),
+                ("private", False),
+                ("contest-private", False),
+                ("contest-practice-solved", True),
+            )
+        }
+        contest = models.Contest.objects.create(
+            name="Contest",
+            slug="contest",
+            description="A contest.",
+            summary="A contest.",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+        )
+        contest_problems = {
+            name: models.ContestProblem.objects.create(
+                contest=contest, problem=cls.problems[name], points=100
+            )
+            for name in ("contest-private", "contest-practice-solved", "unsolved")
+        }
+        cls.participation = models.ContestParticipation.objects.create(contest=contest)
+        cls.participation.participants.add(cls.player)
+
+        def submit(user, name, is_correct=True):
+            return models.Submission.objects.create(
+                user=user, problem=cls.problems[name], is_correct=is_correct
+            )
+
+        problem = cls.problems["firstblood"]
+        problem.firstblood = submit(cls.player, "firstblood")
+        problem.save()
+        problem = cls.problems["solved"]
+        problem.firstblood = submit(cls.other, "solved")
+        problem.save()
+        submit(cls.player, "solved")
+        submit(cls.player, "attempted", is_correct=False)
+        submit(cls.player, "private")
+        submit(cls.player, "contest-practice-solved")
+        models.ContestSubmission.objects.create(
+            participation=cls.participation,
+            problem=contest_problems["contest-private"],
+            submission=submit(cls.player, "contest-private"),
+        )
+
+    def assert_statuses_match(self, user, expected):
+        problems = list(models.Problem.objects.all())
+        status_map = user.problem_status_map([problem.pk for problem in problems])
+        for problem in problems:
+            with self.subTest(problem=problem.slug):
+                status = color_tags.problem_status(problem, user)
+                self.assertEqual(status, expected[problem.slug])
+                self.assertEqual(color_tags.problem_status(problem, status_map), status)
+
+    def test_practice(self):
+        self.assert_statuses_match(
+            self.player,
+            {
+                "firstblood": "firstblood",
+                "solved": "solved",
+                "attempted": "attempted",
+                "unsolved": "unsolved",
+                "private": "private",
+                "contest-private": "private",
+                "contest-practice-solved": "solved",
+            },
+        )
+
+    def test_in_contest(self):
+        self.player.current_contest = self.participation
+        self.player.save()
+        self.assert_statuses_match(
+            self.player,
+            {
+                "firstblood": "firstblood",
+                "solved": "solved",
+                "attempted": "attempted",
+                "unsolved": "unsolved",
+                "private": "private",
+                "contest-private": "firstblood",
+                "contest-practice-solved": "unsolved",
+            },
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ContestSubmissionTestCase(TestCase):
+    """A running contest with one problem and two participations, and ways to submit to it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        problem = models.Problem.objects.create(
+            name="Problem",
+            slug="problem",
+            description="A problem.",
+            summary="A problem.",
+            flag="ctf{flag}",
+            points=100,
+            is_public=True,
+        )
+        cls.contest = models.Contest.objects.create(
+            name="Contest",
+            slug="contest",
+            description="A contest.",
+            summary="A contest.",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+            first_blood_webhook="https://example.com/webhook",
+        )
+        cls.contest_problem = models.ContestProblem.objects.create(
+            contest=cls.contest, problem=problem, points=100
+        )
+        cls.participations = []
+        for name in ("player", "other"):
+            participation = models.ContestParticipation.objects.create(contest=cls.contest)
+            participation.participants.add(models.User.objects.create_user(name))
+            cls.participations.append(participation)
+
+    def submit(self, is_correct, participation=0):
+        """Writes a submission the way the submission queue does."""
+        participation = self.participations[participation]
+        submissions.write_submissions(
+            [
+                submissions.PendingSubmission(
+                    user_id=participation.participant.pk,
+                    problem_id=self.contest_problem.problem_id,
+                    problem_points=100,
+                    problem_is_public=True,
+                    is_correct=is_correct,
+                    participation_id=participation.pk,
+                    contest_id=self.contest.pk,
+                    contest_problem_id=self.contest_problem.pk,
+                    contest_problem_points=100,
+                )
+            ]
+        )
+
+    def save(self, is_correct, participation=0):
+        """Saves a submission the way the admin does."""
+        participation = self.participations[participation]
+        models.ContestSubmission.objects.create(
+            participation=participation,
+            problem=self.contest_problem,
+            submission=models.Submission.objects.create(
+                user=participation.participant,
+                problem=self.contest_problem.problem,
+                is_correct=is_correct,
+            ),
+        )
+
+
+class ContestGenerationTests(ContestSubmissionTestCase):
+
+    def assert_bumped(self, write, bumped):
+        generation = shared_cache.contest_generation(self.contest.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+            self.assertEqual(shared_cache.contest_generation(self.contest.pk), generation)
+        self.assertEqual(shared_cache.contest_generation(self.contest.pk) != generation, bumped)
+
+    def test_only_solves_bump_the_generation(self):
+        self.assert_bumped(lambda: self.submit(is_correct=False), bumped=False)
+        self.assert_bumped(lambda: self.submit(is_correct=True), bumped=True)
+        # already solved, so the scores stay the same
+        self.assert_bumped(lambda: self.submit(is_correct=True), bumped=False)
+
+    def test_only_saved_correct_submissions_bump_the_generation(self):
+        self.assert_bumped(lambda: self.save(is_correct=False), bumped=False)
+        self.assert_bumped(lambda: self.save(is_correct=True), bumped=True)
+
+
+class FirstBloodTests(ContestSubmissionTestCase):
+    def assert_one_webhook(self, first, second):
+        first(is_correct=True, participation=0)
+        second(is_correct=True, participation=1)
+        first_blood = models.ContestProblem.objects.get(pk=self.contest_problem.pk).first_blood
+        self.assertEqual(first_blood.participation, self.participations[0])
+        self.assertEqual(models.WebhookDelivery.objects.count(), 1)
+
+    def test_queue_then_save(self):
+        self.assert_one_webhook(self.submit, self.save)
+
+    def test_save_then_queue(self):
+        self.assert_one_webhook(self.save, self.submit)
+
+    def test_wrong_submissions_are_not_first_bloods(self):
+        self.save(is_correct=False)
+        self.submit(is_correct=False, participation=1)
+        self.assertIsNone(models.ContestProblem.objects.get(pk=self.contest_problem.pk).first_blood)
+        self.assertFalse(models.WebhookDelivery.objects.exists())
+
+
+class StubEndpoint:
+    """A webhook endpoint answering with the given (status, headers, body)s, then 204s."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.received = []
+        self.port = unused_port()
+        self.url = f"http://127.0.0.1:{self.port}/webhook"
+
+    async def handle(self, request):
+        self.received.append(await request.json())
+        status, headers, body = self.responses.pop(0) if self.responses else (204, {}, None)
+        if isinstance(body, dict):
+            return web.json_response(body, status=status, headers=headers)
+        return web.Response(status=status, headers=headers, text=body)
+
+    def dispatch(self, dispatcher, rounds=1):
+        app = web.Application()
+        app.router.add_post("/webhook", self.handle)
+
+        async def run():
+            async with TestServer(app, host="127.0.0.1", port=self.port):
+                for _ in range(rounds):
+                    await dispatcher.run(once=True)
+
+        async_to_sync(run)()
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class DispatcherTests(TestCase):
+    def deliver(self, endpoint, *payloads):
+        return [
+            models.WebhookDelivery.objects.create(url=endpoint.url, payload=payload)
+            for payload in payloads
+        ]
+
+    def reloaded(self, deliveries):
+        return list(models.WebhookDelivery.objects.filter(pk__in=[d.pk for d in deliveries]))
+
+    def test_delivers(self):
+        endpoint = StubEndpoint()
+        deliveries = self.deliver(endpoint, "First blood!")
+        endpoint.dispatch(webhooks.Dispatcher())
+        self.assertEqual(endpoint.received, ["First blood!"])
+        for delivery in self.reloaded(deliveries):
+            self.assertIsNotNone(delivery.date_delivered)
+            self.assertIsNone(delivery.next_attempt)
+            self.assertEqual(delivery.attempts, 0)
+
+    def test_merges_bursts(self):
+        endpoint = StubEndpoint()
+        deliveries = self.deliver(endpoint, "First", "Second")
+        endpoint.dispatch(webhooks.Dispatcher())
+        self.assertEqual(endpoint.received, ["First\nSecond"])
+        self.assertTrue(all(d.date_delivered for d in self.reloaded(deliveries)))
+
+    def test_rate_limited(self):
+        endpoint = StubEndpoint((429, {"Retry-After": "30"}, "slow down"))
+        deliveries = self.deliver(endpoint, "First blood!")
+        dispatcher = webhooks.Dispatcher()
+        before = timezone.now()
+        endpoint.dispatch(dispatcher, rounds=2)
+        self.assertEqual(len(endpoint.received), 1)
+        self.assertIn(endpoint.url, dispatcher.blocked_until)
+        (delivery,) = self.reloaded(deliveries)
+        self.assertIsNone(delivery.date_delivered)
+        self.assertEqual(delivery.attempts, 0)
+        self.assertGreaterEqual(delivery.next_attempt, before + timedelta(seconds=30))
+
+    def test_rate_limited_by_discord(self):
+        endpoint = StubEndpoint((429, {"Retry-After": "1"}, {"retry_after": 60}))
+        deliveries = self.deliver(endpoint, "First blood!")
+        before = timezone.now()
+        endpoint.dispatch(webhooks.Dispatcher())
+        (delivery,) = self.reloaded(deliveries)
+        self.assertGreaterEqual(delivery.next_attempt, before + timedelta(seconds=60))
+
+    def test_backs_off_after_errors(self):
+        endpoint = StubEndpoint((500, {}, "oops"))
+        deliveries = self.deliver(endpoint, "First blood!")
+        before = timezone.now()
+        with self.assertLogs(webhooks.logger, "WARNING"):
+            endpoint.dispatch(webhooks.Dispatcher({"backoff": 60}), rounds=2)
+        self.assertEqual(len(endpoint.received), 1)
+        (delivery,) = self.reloaded(deliveries)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_error, "500: oops")
+        self.assertGreaterEqual(delivery.next_attempt, before + timedelta(seconds=60))
+
+    def test_retries_until_delivered(self):
+        endpoint = StubEndpoint((502, {}, "bad gateway"), (503, {}, "unavailable"))
+        deliveries = self.deliver(endpoint, "First blood!")
+        with self.assertLogs(webhooks.logger, "WARNING"):
+            endpoint.dispatch(webhooks.Dispatcher({"backoff": 0}), rounds=3)
+        self.assertEqual(endpoint.received, ["First blood!"] * 3)
+        (delivery,) = self.reloaded(deliveries)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertIsNotNone(delivery.date_delivered)
+        self.assertEqual(delivery.last_error, "")
+
+    def test_gives_up(self):
+        endpoint = StubEndpoint(*[(500, {}, "oops")] * 2)
+        deliveries = self.deliver(endpoint, "First blood!")
+        with self.assertLogs(webhooks.logger, "WARNING"):
+            endpoint.dispatch(webhooks.Dispatcher({"backoff": 0, "max_attempts": 2}), rounds=3)
+        self.assertEqual(len(endpoint.received), 2)
+        (delivery,) = self.reloaded(deliveries)
+        self.assertIsNone(delivery.next_attempt)
+        self.assertIsNone(delivery.date_delivered)
+
+    def test_leases_expire(self):
+        endpoint = StubEndpoint()
+        deliveries = self.deliver(endpoint, "First blood!")
+        # claimed by a dispatcher that died before sending them
+        webhooks.Dispatcher()._due([])
+        endpoint.dispatch(webhooks.Dispatcher())
+        self.assertEqual(endpoint.received, [])
+
+        models.WebhookDelivery.objects.update(next_attempt=timezone.now())
+        endpoint.dispatch(webhooks.Dispatcher())
+        self.assertEqual(endpoint.received, ["First blood!"])
+        (delivery,) = self.reloaded(deliveries)
+        self.assertIsNotNone(delivery.date_delivered)
+
+
+class MergeTests(TestCase):
+    def merged(self, *payloads):
+        deliveries = [models.WebhookDelivery(pk=i, payload=p) for i, p in enumerate(payloads)]
+        return [
+            (payload, [delivery.pk for delivery in merged])
+            for payload, merged in webhooks.merge(deliveries)
+        ]
+
+    def test_text(self):
+        self.assertEqual(self.merged("a", "b", "c"), [("a\nb\nc", [0, 1, 2])])
+
+    def test_discord(self):
+        notifier = {"username": "Contest First Blood Notifier", "avatar_url": "/favicon.png"}
+        other = notifier | {"username": "Other First Blood Notifier"}
+        self.assertEqual(
+            self.merged(
+                notifier | {"content": "a"},
+                notifier | {"content": "b"},
+                other | {"content": "c"},
+                "d",
+            ),
+            [
+                (notifier | {"content": "a\nb"}, [0, 1]),
+                (other | {"content": "c"}, [2]),
+                ("d", [3]),
+            ],
+        )
+
+    def test_length_limit(self):
+        long = "x" * (webhooks.DISCORD_MAX_CONTENT - 1)
+        self.assertEqual(self.merged(long, "y", "z"), [(long, [0]), ("y\nz", [1, 2])])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RankIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.contest = models.Contest.objects.create(
+            name="Contest",
+            slug="contest",
+            description="A contest.",
+            summary="A contest.",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+        )
+        earlier, later = now - timedelta(minutes=30), now - timedelta(minutes=10)
+        cls.participations = []
+        # (points, last correct submission), with ties on both and participations without solves
+        for points, last_correct_submission in (
+            (300, later),
+            (300, earlier),
+            (300, earlier),
+            (100, later),
+            (100, later),
+            (0, timezone.make_aware(models.cache.EPOCH_TIME)),
+            (0, timezone.make_aware(models.cache.EPOCH_TIME)),
+        ):
+            participation = models.ContestParticipation.objects.create(contest=cls.contest)
+            models.ContestScore.objects.create(
+                participation=participation,
+                points=points,
+                last_correct_submission=last_correct_submission,
+            )
+            cls.participations.append(participation)
+
+    def setUp(self):
+        # pks are reused between tests, so nothing may be left from the previous ones
+        cache.clear()
+        shared_cache.local.clear()
+        ranking.discard_prefix("")
+
+    def assert_ranks_match(self):
+        index = models.ContestScore.rank_index(self.contest.pk)
+        expected = {
+            score.participation_id: score.rank for score in models.ContestScore.ranks(self.contest)
+        }
+        self.assertEqual({pk: index.rank(pk) for pk in expected}, expected)
+        self.assertEqual(
+            [rank for rank, _ in index.page(1, len(expected))], sorted(expected.values())
+        )
+        return index
+
+    def test_ranks(self):
+        index = self.assert_ranks_match()
+        self.assertEqual(
+            [index.rank(participation.pk) for participation in self.participations],
+            [1, 2, 2, 4, 4, 6, 6],
+        )
+
+    def test_scores_changed_here(self):
+        index = self.assert_ranks_match()
+        with self.captureOnCommitCallbacks(execute=True):
+            models.ContestScore.add_scores({self.participations[-1].pk: (300, 1, timezone.now())})
+        self.assertIs(self.assert_ranks_match(), index)
+        self.assertEqual(index.rank(self.participations[-1].pk), 1)
+
+    def test_scores_changed_by_another_process(self):
+        index = self.assert_ranks_match()
+        models.ContestScore.objects.filter(participation=self.participations[-1]).update(
+            points=1000
+        )
+        shared_cache.bump_contest_generation(self.contest.pk)
+        self.assertIsNot(self.assert_ranks_match(), index)
+
+
+class Interrupted(Exception):
+    pass
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ScoreRebuildTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.users = [models.User.objects.create_user(f"player{i}") for i in range(5)]
+        problems = [
+            models.Problem.objects.create(
+                name=f"Problem {i}",
+                slug=f"problem-{i}",
+                description="A problem.",
+                summary="A problem.",
+                flag="ctf{flag}",
+                points=points,
+                is_public=is_public,
+            )
+            for i, (points, is_public) in enumerate(((100, True), (200, True), (300, False)))
+        ]
+        cls.contest = models.Contest.objects.create(
+            name="Contest",
+            slug="contest",
+            description="A contest.",
+            summary="A contest.",
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+        )
+        contest_problems = [
+            models.ContestProblem.objects.create(contest=cls.contest, problem=problem, points=50)
+            for problem in problems
+        ]
+        participations = {}
+        for user in cls.users[:3]:
+            participations[user] = models.ContestParticipation.objects.create(contest=cls.contest)
+            participations[user].participants.add(user)
+
+        # the players with points come last, so a resumed rebuild has some to recount
+        c, d, _, a, b = cls.users  # the third one never submits
+
+        def at(minute):
+            return now - timedelta(minutes=60 - minute)
+
+        solves = [
+            # a and b tie on points and on the time of their last solve
+            (a, 0, True, at(1)),
+            (a, 1, True, at(5)),
+            (b, 1, True, at(2)),
+            (b, 0, True, at(5)),
+            # solved again later, which changes neither the score nor the last solve
+            (a, 0, True, at(9)),
+            # wrong answers only
+            (c, 0, False, at(3)),
+            # a private problem, which only counts in the contest
+            (c, 2, True, at(4)),
+            (d, 2, True, at(4)),
+        ]
+        pending = []
+        for user, problem, is_correct, date_created in solves:
+            participation = participations.get(user)
+            pending.append(
+                submissions.PendingSubmission(
+                    user_id=user.pk,
+                    problem_id=problems[problem].pk,
+                    problem_points=problems[problem].points,
+                    problem_is_public=problems[problem].is_public,
+                    is_correct=is_correct,
+                    participation_id=participation and participation.pk,
+                    contest_id=participation and cls.contest.pk,
+                    contest_problem_id=participation and contest_problems[problem].pk,
+                    contest_problem_points=participation and contest_problems[problem].points,
+                    date_created=date_created,
+                )
+            )
+        # in a few batches, as the submission queue writes them
+        for batch in (pending[:3], pending[3:5], pending[5:]):
+            submissions.write_submissions(batch)
+
+    def recount(self, solves, owner, date_field):
+        """The (points, flags, last solve) of every owner, counted from their solves."""
+        first_solves = {}
+        for owner_id, problem_id, points, date_created in solves.order_by("pk").values_list(
+            owner, "problem_id", "problem__points", date_field
+        ):
+            first_solves.setdefault((owner_id, problem_id), (points, date_created))
+        totals = {}
+        for (owner_id, _), (points, date_created) in first_solves.items():
+            total, flags, last = totals.get(owner_id, (0, 0, date_created))
+            totals[owner_id] = (total + points, flags + 1, max(last, date_created))
+        return totals
+
+    def user_scores(self):
+        return {
+            score.user_id: (score.points, score.flag_count, score.last_correct_submission)
+            for score in models.UserScore.objects.all()
+        }
+
+    def expected_user_scores(self):
+        return self.recount(
+            models.Submission.objects.filter(is_correct=True, problem__is_public=True),
+            "user_id",
+            "date_created",
+        )
+
+    def test_added_scores_match_a_recount(self):
+        self.assertEqual(self.user_scores(), self.expected_user_scores())
+        a, b = self.users[3:]
+        ranks = {score.user_id: score.rank for score in models.UserScore.ranks()}
+        self.assertEqual(ranks[a.pk], ranks[b.pk])
+
+    def test_rebuilt_scores_match_a_recount(self):
+        models.UserScore.objects.all().delete()
+        self.assertEqual(models.UserScore.reset_data(), len(self.users))
+        expected = self.expected_user_scores()
+        epoch = timezone.make_aware(models.cache.EPOCH_TIME)
+        for user in self.users:
+            expected.setdefault(user.pk, (0, 0, epoch))
+        self.assertEqual(self.user_scores(), expected)
+
+    def test_resumed_rebuild_matches_a_recount(self):
+        models.UserScore.objects.update(points=0, flag_count=0)
+        batches = []
+
+        def interrupt(done, total, last_pk):
+            batches.append(last_pk)
+            raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            models.UserScore.reset_data(batch_size=2, progress=interrupt)
+        self.assertEqual(models.UserScore.objects.get(user=self.users[3]).points, 0)
+        models.UserScore.reset_data(batch_size=2, resume_after=batches[-1])
+        scores = self.user_scores()
+        for user_id, expected in self.expected_user_scores().items():
+            self.assertEqual(scores[user_id], expected)
+
+    def test_rebuilt_contest_scores_match_the_added_ones(self):
+        def contest_scores():
+            return {
+                score.participation_id: (
+                    score.points,
+                    score.flag_count,
+                    score.last_correct_submission,
+                    score.solved_by_type,
+                )
+                for score in models.ContestScore.objects.filter(participation__contest=self.contest)
+            }
+
+        added = contest_scores()
+        models.ContestScore.objects.update(points=0, flag_count=0, solved_by_type={})
+        models.ContestScore.reset_data(contest=self.contest)
+        rebuilt = contest_scores()
+        self.assertEqual({pk: rebuilt.pop(pk) for pk in added}, added)
+        # the participation without solves
+        epoch = timezone.make_aware(models.cache.EPOCH_TIME)
+        self.assertEqual(list(rebuilt.values()), [(0, 0, epoch, {})])
+        self.assertEqual(
+            {pk: score[:3] for pk, score in added.items() if score[1]},
+            self.recount(
+                models.ContestSubmission.objects.filter(
+                    submission__is_correct=True, participation__contest=self.contest
+                ),
+                "participation_id",
+                "submission__date_created",
+            ),
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ProblemFileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.problems = [
+            models.Problem.objects.create(
+                name=f"Problem {i}",
+                slug=f"problem-{i}",
+                description="A problem.",
+                summary="A problem.",
+                flag="ctf{flag}",
+                points=100,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(
+                STORAGES={
+                    "default": {
+                        "BACKEND": "django.core.files.storage.FileSystemStorage",
+                        "OPTIONS": {"location": location},
+                    },
+                    "staticfiles": {
+                        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+                    },
+                }
+            )
+        )
+        self.storage = models.ProblemFile._meta.get_field("artifact").storage
+
+    def upload(self, problem, name, content=b"the same bytes"):
+        problem_file = models.ProblemFile(problem=problem, artifact=ContentFile(content, name))
+        problem_file.save()
+        return problem_file
+
+    def stored(self):
+        return self.storage.listdir("artifact")[1]
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload(self.problems[0], "first.txt")
+        second = self.upload(self.problems[1], "second.txt")
+        again = self.upload(self.problems[0], "first.txt")
+        self.assertEqual(first.artifact.name, second.artifact.name)
+        self.assertEqual(again.artifact.name, first.artifact.name)
+        self.assertEqual(self.stored(), [first.checksum])
+        self.assertEqual([first.file_name, second.file_name], ["first.txt", "second.txt"])
+
+        different = self.upload(self.problems[0], "first.txt", b"other bytes")
+        self.assertEqual(sorted(self.stored()), sorted([first.checksum, different.checksum]))
+
+    def test_shared_artifacts_outlive_their_first_file(self):
+        first = self.upload(self.problems[0], "first.txt")
+        second = self.upload(self.problems[1], "second.txt")
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.storage.exists(second.artifact.name))
+        with second.artifact.open() as f:
+            self.assertEqual(f.read(), b"the same bytes")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.stored(), [])
@@ -21,6 +21,11 @@ urlpatterns = [
     path(
         "problem/<slug:slug>/challenge", views.ProblemChallenge.as_view(), name="problem_challenge"
     ),
+    path(
+        "problem/<slug:slug>/file/<int:pk>",
+        views.ProblemFileDownload.as_view(),
+        name="problem_file",
+    ),
     path(
         "problem/<slug:slug>/submissions",
         views.ProblemSubmissionList.as_view(),
@@ -89,6 +94,16 @@ urlpatterns = [
         views.ContestScoreboard.as_view(),  # cache for 5m
         name="contest_scoreboard",
     ),
+    path(
+        "contest/<str:slug>/scoreboard/stream",
+        views.ContestScoreboardStream.as_view(),
+        name="contest_scoreboard_stream",
+    ),
+    path(
+        "contest/<str:slug>/export/<str:table>",
+        views.ContestExport.as_view(),
+        name="contest_export",
+    ),
     path(
         "contest/<str:contest_slug>/scoreboard/organization/<str:org_slug>",
         views.ContestOrganizationScoreboard.as_view(),
@@ -113,4 +128,5 @@ urlpatterns = [
         name="add_comment",
     ),
     path("api/", api.urls),
+    path("metrics", views.Metrics.as_view(), name="metrics"),
 ]
@@ -0,0 +1,129 @@
+import functools
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import cache as shared_cache
+
+# Namespace of the generation bumped (see signals.py) whenever a relation the access checks
+# depend on changes; cached access profiles of older generations are never read again
+ACCESS_GENERATION = "access"
+
+
+class AccessProfile:
+    """
+    The ids a user's access checks need, each loaded with one query the first time it is used.
+
+    The profile lives on the user object, which is loaded once per request, so every check in
+    a request shares it. If settings.ACCESS_CACHE is enabled, the loaded ids are also kept in
+    the shared cache across requests until the access generation is bumped.
+    """
+
+    fields = (
+        "organization_ids",
+        "organization_contest_ids",
+        "editable_contest_ids",
+        "organization_problem_ids",
+        "editable_problem_ids",
+    )
+
+    def __init__(self, user):
+        self.user = user
+        self.decisions = {}
+        self._cache_key = None
+        if settings.ACCESS_CACHE["enabled"]:
+            generation = shared_cache.get_generation(ACCESS_GENERATION)
+            self._cache_key = f"access:{user.pk}:{generation}"
+            self.__dict__.update(cache.get(self._cache_key) or {})
+
+    def _loaded(self, name, ids):
+        ids = frozenset(ids)
+        if self._cache_key is not None:
+            cache.set(
+                self._cache_key,
+                {field: self.__dict__[field] for field in self.fields if field in self.__dict__}
+                | {name: ids},
+                settings.ACCESS_CACHE["timeout"],
+            )
+        return ids
+
+    @cached_property
+    def organization_ids(self) -> frozenset[int]:
+        return self._loaded(
+            "organization_ids", self.user.organizations.values_list("pk", flat=True)
+        )
+
+    @cached_property
+    def organization_contest_ids(self) -> frozenset[int]:
+        from ..models import Contest
+
+        return self._loaded(
+            "organization_contest_ids",
+            Contest.objects.filter(organizations__in=self.organization_ids).values_list(
+                "pk", flat=True
+            ),
+        )
+
+    @cached_property
+    def editable_contest_ids(self) -> frozenset[int]:
+        from ..models import Contest
+
+        return self._loaded(
+            "editable_contest_ids",
+            Contest.objects.filter(Q(organizers=self.user) | Q(curators=self.user)).values_list(
+                "pk", flat=True
+            ),
+        )
+
+    @cached_property
+    def organization_problem_ids(self) -> frozenset[int]:
+        from ..models import Problem
+
+        return self._loaded(
+            "organization_problem_ids",
+            Problem.objects.filter(organizations__in=self.organization_ids).values_list(
+                "pk", flat=True
+            ),
+        )
+
+    @cached_property
+    def editable_problem_ids(self) -> frozenset[int]:
+        from ..models import Problem
+
+        return self._loaded(
+            "editable_problem_ids",
+            Problem.objects.filter(Q(author=self.user) | Q(testers=self.user)).values_list(
+                "pk", flat=True
+            ),
+        )
+
+
+def profile(user) -> AccessProfile:
+    """The access profile of an authenticated user, created once per user object."""
+    access_profile = getattr(user, "_access_profile", None)
+    if access_profile is None:
+        access_profile = AccessProfile(user)
+        user._access_profile = access_profile
+    return access_profile
+
+
+def memoize(check):
+    """Remembers the result of an ``obj.check(user)`` access method for the user object."""
+
+    @functools.wraps(check)
+    def wrapper(self, user):
+        if not user.is_authenticated:
+            return check(self, user)
+        decisions = profile(user).decisions
+        key = (check.__qualname__, self.pk)
+        if key not in decisions:
+            decisions[key] = check(self, user)
+        return decisions[key]
+
+    return wrapper
+
+
+def bump_generation():
+    shared_cache.bump_generation(ACCESS_GENERATION)
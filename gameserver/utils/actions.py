@@ -7,11 +7,12 @@ from gameserver.models import ContestScore, UserScore
 
 def recalculate_score(self, request, queryset):
     start = time.monotonic_ns()
+    rows = 0
     for contest in queryset:
-        ContestScore.reset_data(contest)
+        rows += ContestScore.reset_data(contest)
 
     end = time.monotonic_ns()
-    messages.success(request, f"Time taken: {(end - start) / 1e9} seconds")
+    messages.success(request, f"Rebuilt {rows} scores. Time taken: {(end - start) / 1e9} seconds")
 
 
 recalculate_score.short_description = "Recalculate scores for selected contests."
@@ -19,9 +20,9 @@ recalculate_score.short_description = "Recalculate scores for selected contests.
 
 def recalculate_user_scores(self, request, queryset):
     start = time.monotonic_ns()
-    UserScore.reset_data(users=queryset)
+    rows = UserScore.reset_data(users=queryset)
     end = time.monotonic_ns()
-    messages.success(request, f"Time taken: {(end - start) / 1e9} seconds")
+    messages.success(request, f"Rebuilt {rows} scores. Time taken: {(end - start) / 1e9} seconds")
 
 
 recalculate_user_scores.short_description = "Recalculate scores for selected users."
@@ -29,9 +30,9 @@ recalculate_user_scores.short_description = "Recalculate scores for selected use
 
 def recalculate_all_user_scores(self, request, queryset):
     start = time.monotonic_ns()
-    UserScore.reset_data()
+    rows = UserScore.reset_data()
     end = time.monotonic_ns()
-    messages.success(request, f"Time taken: {(end - start) / 1e9} seconds")
+    messages.success(request, f"Rebuilt {rows} scores. Time taken: {(end - start) / 1e9} seconds")
 
 
 recalculate_all_user_scores.short_description = "Recalculate scores for all users. NOTE: You must select at least one user to run this action due to Django admin limitations."
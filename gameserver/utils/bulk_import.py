@@ -0,0 +1,678 @@
+import contextlib
+import hashlib
+import json
+import tarfile
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import (
+    Contest,
+    ContestParticipation,
+    ContestProblem,
+    ContestTag,
+    Organization,
+    Problem,
+    ProblemFile,
+    ProblemGroup,
+    ProblemType,
+    SubmissionFeed,
+    Team,
+    User,
+)
+from . import access, catalogue, contest_session, flags, scoreboard
+
+# Threads hashing and uploading problem files
+HASH_WORKERS = 8
+# Bytes read from a problem file at a time while hashing it
+HASH_CHUNK_SIZE = 1024 * 1024
+
+PROBLEM_FIELDS = (
+    "name",
+    "description",
+    "summary",
+    "flag",
+    "extra_flags",
+    "flag_mode",
+    "points",
+    "challenge_spec",
+    "log_submission_content",
+    "is_public",
+)
+CONTEST_FIELDS = (
+    "name",
+    "description",
+    "summary",
+    "start_time",
+    "end_time",
+    "is_public",
+    "max_team_size",
+    "first_blood_webhook",
+)
+TEAM_FIELDS = ("description",)
+
+# spec key -> (model the values are looked up in, field they are looked up by)
+REFERENCES = {
+    "author": (User, "username"),
+    "testers": (User, "username"),
+    "organizers": (User, "username"),
+    "curators": (User, "username"),
+    "members": (User, "username"),
+    "users": (User, "username"),
+    "owner": (User, "username"),
+    "organizations": (Organization, "slug"),
+    "problem_type": (ProblemType, "slug"),
+    "problem_group": (ProblemGroup, "slug"),
+    "tags": (ContestTag, "slug"),
+}
+
+
+@dataclass
+class Bundle:
+    """
+    The specs of an import, read from a directory laid out as::
+
+        problems/<slug>/problem.json    the fields of Problem, plus author, testers,
+                                        organizations (usernames/slugs), problem_type and
+                                        problem_group (slugs)
+        problems/<slug>/files/*         the problem's files
+        contests/<slug>.json            the fields of Contest, plus organizers, curators,
+                                        organizations, tags, problems ([{"problem": slug,
+                                        "points": n}, ...] in order) and participants
+                                        ({"teams": [names], "users": [usernames]})
+        teams.json                      [{"name", "owner", "description", "members"}, ...]
+
+    Problems, contests and teams are created or updated by slug (name for teams). Many to many
+    fields are replaced when their key is present, and left alone otherwise.
+    """
+
+    problems: dict[str, dict] = field(default_factory=dict)
+    files: dict[str, list[Path]] = field(default_factory=dict)
+    contests: dict[str, dict] = field(default_factory=dict)
+    teams: dict[str, dict] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, root: Path) -> "Bundle":
+        bundle = cls()
+        errors = []
+
+        def read(path: Path):
+            try:
+                return json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                errors.append(f"{path.relative_to(root)}: {e}")
+                return _UNREADABLE
+
+        for spec_path in sorted(root.glob("problems/*/problem.json")):
+            slug = spec_path.parent.name
+            spec = read(spec_path)
+            if _check_spec(spec, f"problem {slug}", errors):
+                bundle.problems[slug] = spec
+            files = spec_path.parent / "files"
+            bundle.files[slug] = sorted(path for path in files.glob("*") if path.is_file())
+        for spec_path in sorted(root.glob("contests/*.json")):
+            slug = spec_path.stem
+            spec = read(spec_path)
+            if _check_spec(spec, f"contest {slug}", errors) and _check_contest(spec, slug, errors):
+                bundle.contests[slug] = spec
+        if (root / "teams.json").exists():
+            teams = read(root / "teams.json")
+            if teams is not _UNREADABLE and not isinstance(teams, list):
+                errors.append("teams.json: must be a list of teams")
+            for i, team in enumerate(teams if isinstance(teams, list) else []):
+                if not _check_spec(team, f"teams.json: team {i + 1}", errors):
+                    continue
+                if not isinstance(team.get("name"), str):
+                    errors.append(f"teams.json: team {i + 1}: name must be a string")
+                    continue
+                bundle.teams[team["name"]] = team
+
+        if errors:
+            raise ValidationError(errors)
+        if not (bundle.problems or bundle.contests or bundle.teams):
+            raise ValidationError("Nothing to import: no problems, contests or teams.json found")
+        return bundle
+
+
+# What Bundle.load reads from a spec file it could not read or parse
+_UNREADABLE = object()
+
+
+def _is_names(value) -> bool:
+    return isinstance(value, list) and all(isinstance(name, str) for name in value)
+
+
+def _check_spec(spec, label: str, errors: list) -> bool:
+    """Checks that a spec is an object whose references are names, adding what is wrong."""
+    if spec is _UNREADABLE:
+        return False  # read() already reported why
+    if not isinstance(spec, dict):
+        errors.append(f"{label}: must be an object")
+        return False
+    valid = True
+    for key in REFERENCES:
+        if key in spec and not (isinstance(spec[key], str) or _is_names(spec[key])):
+            errors.append(f"{label}: {key}: must be a name or a list of names")
+            valid = False
+    return valid
+
+
+def _check_contest(spec: dict, slug: str, errors: list) -> bool:
+    valid = True
+    problems = spec.get("problems", [])
+    if not isinstance(problems, list) or not all(
+        isinstance(entry, dict)
+        and isinstance(entry.get("problem"), str)
+        and isinstance(entry.get("points", 1), int)
+        for entry in problems
+    ):
+        errors.append(
+            f'contest {slug}: problems: must be a list of {{"problem": slug, "points": n}}'
+        )
+        valid = False
+    participants = spec.get("participants") or {}
+    if not isinstance(participants, dict) or not all(
+        _is_names(participants.get(key, [])) for key in ("teams", "users")
+    ):
+        errors.append(
+            f'contest {slug}: participants: must be {{"teams": [names], "users": [usernames]}}'
+        )
+        valid = False
+    return valid
+
+
+def _root(path: Path) -> Path:
+    # archives often wrap everything in a single directory
+    entries = list(path.iterdir())
+    if len(entries) == 1 and entries[0].is_dir():
+        return entries[0]
+    return path
+
+
+@contextlib.contextmanager
+def opened(path) -> Iterator[Path]:
+    """The root directory of a bundle directory or of a zip or tar archive of one."""
+    path = Path(path)
+    if path.is_dir():
+        yield path
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                archive.extractall(tmp)
+        elif tarfile.is_tarfile(path):
+            with tarfile.open(path) as archive:
+                archive.extractall(tmp, filter="data")
+        else:
+            raise ValidationError(f"{path.name} is not a directory, zip or tar archive")
+        yield _root(Path(tmp))
+
+
+class _Resolver:
+    """Looks up every referenced user, organization and category with one query per model."""
+
+    def __init__(self, bundle: Bundle):
+        wanted = {}
+        for spec in [*bundle.problems.values(), *bundle.contests.values(), *bundle.teams.values()]:
+            for key, (model, lookup) in REFERENCES.items():
+                values = spec.get(key) or []
+                if isinstance(values, str):
+                    values = [values]
+                wanted.setdefault((model, lookup), set()).update(values)
+            wanted.setdefault((User, "username"), set()).update(
+                (spec.get("participants") or {}).get("users", [])
+            )
+        self.ids = {
+            (model, lookup): dict(
+                model.objects.filter(**{f"{lookup}__in": values}).values_list(lookup, "pk")
+            )
+            for (model, lookup), values in wanted.items()
+            if values
+        }
+        self.errors = [
+            f"{model._meta.verbose_name} {value} does not exist"
+            for (model, lookup), values in wanted.items()
+            for value in sorted(values - self.ids.get((model, lookup), {}).keys())
+        ]
+
+    def __call__(self, key: str, values) -> list[int]:
+        model, lookup = REFERENCES[key]
+        if isinstance(values, str):
+            values = [values]
+        ids = self.ids.get((model, lookup), {})
+        return [ids[value] for value in values if value in ids]
+
+
+def _build(model, spec: dict, fields: tuple, errors: list, label: str, **extra):
+    values = {name: spec[name] for name in fields if name in spec}
+    invalid = set()
+    for name, value in values.items():
+        if isinstance(model._meta.get_field(name), models.DateTimeField) and value is not None:
+            try:
+                parsed = parse_datetime(value)
+            except (TypeError, ValueError):
+                parsed = None
+            if parsed is None:
+                errors.append(f"{label}: {name}: {value!r} is not a valid date and time")
+                invalid.add(name)
+            elif timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            values[name] = parsed
+    obj = model(**values, **extra)
+    try:
+        obj.full_clean(validate_unique=False, validate_constraints=False)
+    except ValidationError as e:
+        errors.extend(
+            f"{label}: {name}: {' '.join(messages)}"
+            for name, messages in e.message_dict.items()
+            if name not in invalid
+        )
+    return obj
+
+
+def _set_m2m(model, name: str, targets: dict[int, list[int]]):
+    """Replaces the ``name`` relations of every object in ``targets`` with one delete and insert."""
+    if not targets:
+        return
+    m2m = model._meta.get_field(name)
+    through = m2m.remote_field.through
+    source, target = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+    through.objects.filter(**{f"{source}_id__in": targets}).delete()
+    through.objects.bulk_create(
+        [
+            through(**{f"{source}_id": pk, f"{target}_id": target_id})
+            for pk, target_ids in targets.items()
+            for target_id in set(target_ids)
+        ]
+    )
+
+
+def _hash(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _upload(path: Path, name: str) -> str:
+    storage = ProblemFile._meta.get_field("artifact").storage
+    with path.open("rb") as f:
+        return storage.save(name, File(f, name=path.name))
+
+
+def _store_files(bundle: Bundle, workers: int) -> tuple[list[tuple], list[str]]:
+    """
+    Hashes the files of every problem and uploads the new ones, in a thread pool.
+
+    Files matching the problem's stored file of the same name are skipped, and files whose
+    content is already stored (by any problem, under any name) are not uploaded again. Returns
+    (problem slug, (pk, artifact, checksum) of the file it replaces or None, checksum, artifact,
+    file name) for every file to write, and the artifacts that were uploaded. If any upload
+    fails, the others are deleted again.
+    """
+    existing_files = {
+        (slug, name): (pk, artifact, checksum)
+        for pk, slug, name, artifact, checksum in ProblemFile.objects.filter(
+            problem__slug__in=bundle.files
+        ).values_list("pk", "problem__slug", "name", "artifact", "checksum")
+    }
+    paths = [(slug, path) for slug, paths in bundle.files.items() for path in paths]
+    artifact = ProblemFile._meta.get_field("artifact")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files = []
+        for (slug, path), checksum in zip(paths, executor.map(_hash, [path for _, path in paths])):
+            existing = existing_files.get((slug, path.name))
+            if existing is None or existing[2] != checksum:
+                files.append((slug, existing, checksum, path))
+
+        stored_as = dict(
+            ProblemFile.objects.filter(
+                checksum__in={checksum for _, _, checksum, _ in files}
+            ).values_list("checksum", "artifact")
+        )
+        # files with the same content are uploaded once, even within the bundle
+        to_upload = {checksum: path for _, _, checksum, path in files if checksum not in stored_as}
+        uploads = {
+            checksum: executor.submit(
+                _upload, path, artifact.generate_filename(ProblemFile(checksum=checksum), path.name)
+            )
+            for checksum, path in to_upload.items()
+        }
+        uploaded, error = [], None
+        for checksum, future in uploads.items():
+            try:
+                stored_as[checksum] = future.result()
+                uploaded.append(stored_as[checksum])
+            except Exception as e:
+                error = error or e
+        stored = [
+            (slug, existing, checksum, stored_as.get(checksum), path.name)
+            for slug, existing, checksum, path in files
+        ]
+
+    if error is not None:
+        ProblemFile.discard_artifacts(uploaded)
+        raise error
+    return stored, uploaded
+
+
+@dataclass
+class ImportResult:
+    problems: int = 0
+    files: int = 0
+    contests: int = 0
+    teams: int = 0
+    participations: int = 0
+
+
+def import_bundle(bundle: Bundle, workers: int = HASH_WORKERS) -> ImportResult:
+    """
+    Imports a bundle in a single transaction; nothing is written if any spec is invalid.
+
+    Objects and their relations are written with a few bulk queries per model. Problem files
+    are hashed and uploaded by ``workers`` threads before the transaction starts (see
+    _store_files); uploads of a failed import are deleted again.
+    """
+    resolve = _Resolver(bundle)
+    errors = list(resolve.errors)
+
+    existing_problems = dict(
+        Problem.objects.filter(slug__in=bundle.problems).values_list("slug", "opaque_id")
+    )
+    problems = []
+    for slug, spec in bundle.problems.items():
+        problem = _build(Problem, spec, PROBLEM_FIELDS, errors, f"problem {slug}", slug=slug)
+        problem.opaque_id = existing_problems.get(slug, problem.opaque_id)
+        problems.append(problem)
+
+    contests = [
+        _build(Contest, spec, CONTEST_FIELDS, errors, f"contest {slug}", slug=slug)
+        for slug, spec in bundle.contests.items()
+    ]
+    teams = [
+        _build(
+            Team,
+            spec,
+            TEAM_FIELDS,
+            errors,
+            f"team {name}",
+            name=name,
+            owner_id=next(iter(resolve("owner", spec.get("owner") or [])), None),
+            access_code=uuid.uuid4().hex,
+        )
+        for name, spec in bundle.teams.items()
+    ]
+
+    problem_slugs = set(bundle.problems) | set(
+        Problem.objects.filter(
+            slug__in={
+                entry.get("problem")
+                for spec in bundle.contests.values()
+                for entry in spec.get("problems", [])
+            }
+        ).values_list("slug", flat=True)
+    )
+    team_names = set(bundle.teams) | set(
+        Team.objects.filter(
+            name__in={
+                name
+                for spec in bundle.contests.values()
+                for name in (spec.get("participants") or {}).get("teams", [])
+            }
+        ).values_list("name", flat=True)
+    )
+    for slug, spec in bundle.contests.items():
+        for entry in spec.get("problems", []):
+            if entry.get("problem") not in problem_slugs:
+                errors.append(f"contest {slug}: problem {entry.get('problem')} does not exist")
+        for name in (spec.get("participants") or {}).get("teams", []):
+            if name not in team_names:
+                errors.append(f"contest {slug}: team {name} does not exist")
+    errors.extend(_roster_errors(bundle, resolve))
+    if errors:
+        raise ValidationError(errors)
+
+    stored, uploaded = _store_files(bundle, workers)
+
+    try:
+        with transaction.atomic():
+            return _write(bundle, resolve, problems, contests, teams, stored)
+    except Exception:
+        ProblemFile.discard_artifacts(uploaded)
+        raise
+
+
+def _roster_errors(bundle: Bundle, resolve: _Resolver) -> list[str]:
+    """
+    The users on a contest's roster who also take part in it through a team, as the join form
+    only lets a user take part in a contest once.
+
+    A user takes part through a team if they are a participant of one of the contest's team
+    participations, or a member of a team that is registered or on the bundle's roster, with
+    the bundle's members for the teams it imports.
+    """
+    rosters = {
+        slug: spec["participants"]
+        for slug, spec in bundle.contests.items()
+        if (spec.get("participants") or {}).get("users")
+    }
+    if not rosters:
+        return []
+
+    contest_teams = {slug: set(roster.get("teams", [])) for slug, roster in rosters.items()}
+    # user -> the team they take part through, per contest
+    team_of = {slug: {} for slug in rosters}
+    for slug, name, user_id in ContestParticipation.participants.through.objects.filter(
+        contestparticipation__contest__slug__in=rosters,
+        contestparticipation__team__isnull=False,
+    ).values_list(
+        "contestparticipation__contest__slug", "contestparticipation__team__name", "user_id"
+    ):
+        team_of[slug].setdefault(user_id, name)
+    for slug, name in ContestParticipation.objects.filter(
+        contest__slug__in=rosters, team__isnull=False
+    ).values_list("contest__slug", "team__name"):
+        contest_teams[slug].add(name)
+
+    imported_members = {
+        name: set(resolve("members", spec["members"]))
+        for name, spec in bundle.teams.items()
+        if "members" in spec
+    }
+    members = {}
+    for name, user_id in Team.members.through.objects.filter(
+        team__name__in=set().union(*contest_teams.values()) - imported_members.keys()
+    ).values_list("team__name", "user_id"):
+        members.setdefault(name, set()).add(user_id)
+    members |= imported_members
+
+    errors = []
+    for slug, roster in rosters.items():
+        for name in sorted(contest_teams[slug]):
+            for user_id in members.get(name, ()):
+                team_of[slug].setdefault(user_id, name)
+        for username in roster["users"]:
+            for user_id in resolve("users", username):
+                if user_id in team_of[slug]:
+                    errors.append(
+                        f"contest {slug}: user {username} already takes part through team"
+                        f" {team_of[slug][user_id]}"
+                    )
+    return errors
+
+
+def _write(bundle, resolve, problems, contests, teams, stored) -> ImportResult:
+    result = ImportResult()
+
+    Problem.objects.bulk_create(
+        problems, update_conflicts=True, unique_fields=["slug"], update_fields=PROBLEM_FIELDS
+    )
+    problem_ids = dict(Problem.objects.filter(slug__in=bundle.problems).values_list("slug", "pk"))
+    written_problem_ids = list(problem_ids.values())
+    for name in ("author", "testers", "organizations", "problem_type", "problem_group"):
+        _set_m2m(
+            Problem,
+            name,
+            {
+                problem_ids[slug]: resolve(name, spec[name])
+                for slug, spec in bundle.problems.items()
+                if name in spec
+            },
+        )
+    for visibility, is_public in ((SubmissionFeed.PUBLIC, True), (SubmissionFeed.PRIVATE, False)):
+        SubmissionFeed.objects.filter(
+            problem_id__in=[problem_ids[p.slug] for p in problems if p.is_public == is_public]
+        ).exclude(visibility=visibility).update(visibility=visibility)
+    result.problems = len(problems)
+
+    replaced = [existing for _, existing, *_ in stored if existing is not None]
+    ProblemFile.objects.filter(pk__in=[pk for pk, _, _ in replaced]).delete()
+    ProblemFile.objects.bulk_create(
+        [
+            ProblemFile(
+                problem_id=problem_ids[slug], artifact=artifact, checksum=checksum, name=name
+            )
+            for slug, _, checksum, artifact, name in stored
+        ]
+    )
+    transaction.on_commit(lambda: ProblemFile.discard_artifacts(name for _, name, _ in replaced))
+    result.files = len(stored)
+
+    Team.objects.bulk_create(
+        teams, update_conflicts=True, unique_fields=["name"], update_fields=[*TEAM_FIELDS, "owner"]
+    )
+    team_ids = dict(
+        Team.objects.filter(
+            name__in={
+                *bundle.teams,
+                *(
+                    name
+                    for spec in bundle.contests.values()
+                    for name in (spec.get("participants") or {}).get("teams", [])
+                ),
+            }
+        ).values_list("name", "pk")
+    )
+    _set_m2m(
+        Team,
+        "members",
+        {
+            team_ids[name]: resolve("members", spec["members"])
+            for name, spec in bundle.teams.items()
+            if "members" in spec
+        },
+    )
+    result.teams = len(teams)
+
+    Contest.objects.bulk_create(
+        contests, update_conflicts=True, unique_fields=["slug"], update_fields=CONTEST_FIELDS
+    )
+    contest_ids = dict(Contest.objects.filter(slug__in=bundle.contests).values_list("slug", "pk"))
+    for name in ("organizers", "curators", "organizations", "tags"):
+        _set_m2m(
+            Contest,
+            name,
+            {
+                contest_ids[slug]: resolve(name, spec[name])
+                for slug, spec in bundle.contests.items()
+                if name in spec
+            },
+        )
+    problem_ids |= dict(
+        Problem.objects.filter(
+            slug__in={
+                entry["problem"]
+                for spec in bundle.contests.values()
+                for entry in spec.get("problems", [])
+            }
+            - problem_ids.keys()
+        ).values_list("slug", "pk")
+    )
+    ContestProblem.objects.bulk_create(
+        [
+            ContestProblem(
+                contest_id=contest_ids[slug],
+                problem_id=problem_ids[entry["problem"]],
+                points=entry.get("points", 1),
+                order=order,
+            )
+            for slug, spec in bundle.contests.items()
+            for order, entry in enumerate(spec.get("problems", []))
+        ],
+        update_conflicts=True,
+        unique_fields=["contest", "problem"],
+        update_fields=["points", "order"],
+    )
+    result.contests = len(contests)
+    result.participations = _register(bundle, resolve, contest_ids, team_ids)
+
+    transaction.on_commit(lambda: _imported(written_problem_ids, contest_ids.values()))
+    return result
+
+
+def _register(bundle, resolve, contest_ids, team_ids) -> int:
+    """
+    Creates the participations of the contests' rosters that do not exist yet.
+
+    Users on a roster take part on their own; _roster_errors already turned away those taking
+    part through a team, so a user with a participation in the contest is already registered.
+    """
+    registered_teams = set(
+        ContestParticipation.objects.filter(
+            contest_id__in=contest_ids.values(), team__isnull=False
+        ).values_list("contest_id", "team_id")
+    )
+    registered_users = set(
+        ContestParticipation.participants.through.objects.filter(
+            contestparticipation__contest_id__in=contest_ids.values()
+        ).values_list("contestparticipation__contest_id", "user_id")
+    )
+    participations = []
+    solo_users = []
+    for slug, spec in bundle.contests.items():
+        contest_id = contest_ids[slug]
+        participants = spec.get("participants") or {}
+        for name in participants.get("teams", []):
+            if (contest_id, team_ids[name]) not in registered_teams:
+                registered_teams.add((contest_id, team_ids[name]))
+                participations.append(
+                    ContestParticipation(contest_id=contest_id, team_id=team_ids[name])
+                )
+        for user_id in resolve("users", participants.get("users", [])):
+            if (contest_id, user_id) not in registered_users:
+                registered_users.add((contest_id, user_id))
+                participation = ContestParticipation(contest_id=contest_id)
+                participations.append(participation)
+                solo_users.append((participation, user_id))
+    ContestParticipation.objects.bulk_create(participations)
+    ContestParticipation.participants.through.objects.bulk_create(
+        [
+            ContestParticipation.participants.through(
+                contestparticipation_id=participation.pk, user_id=user_id
+            )
+            for participation, user_id in solo_users
+        ]
+    )
+    return len(participations)
+
+
+def _imported(problem_ids, contest_ids):
+    # the bulk writes above send no signals, so drop what signals.py would have
+    for problem_id in problem_ids:
+        flags.invalidate(problem_id)
+    access.bump_generation()
+    catalogue.bump_generation()
+    scoreboard.bump_problem_types_generation()
+    contest_session.invalidate_contests(contest_ids)
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+# How long (in seconds) values stay in the in-process L1 before the shared cache is asked again.
+L1_TTL = 2
+
+
+class LocalCache:
+    """A small thread-safe in-process cache whose entries expire after a few seconds."""
+
+    def __init__(self, ttl: float = L1_TTL):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local = LocalCache()
+
+
+class LRUCache:
+    """A thread-safe in-process cache holding the ``size`` most recently used entries."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _generation_key(namespace: str) -> str:
+    return f"generation:{namespace}"
+
+
+def _initial_generation() -> int:
+    # Start from the clock rather than 1 so an evicted counter never reuses an old generation
+    return time.time_ns() // 1_000_000
+
+
+def get_generation(namespace: str) -> int:
+    """
+    Returns the current generation of ``namespace``.
+
+    Keys built with the generation are invalidated on every worker at once by
+    bump_generation(), without deleting or scanning for them. Workers may see the previous
+    generation for up to L1_TTL seconds.
+    """
+    key = _generation_key(namespace)
+    generation = local.get(key)
+    if generation is None:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, _initial_generation(), None)
+            generation = cache.get(key)
+        local.set(key, generation)
+    return generation
+
+
+def bump_generation(namespace: str) -> int:
+    key = _generation_key(namespace)
+    try:
+        generation = cache.incr(key)
+    except ValueError:  # the counter does not exist (yet or anymore)
+        cache.add(key, _initial_generation(), None)
+        generation = cache.incr(key)
+    local.set(key, generation)
+    return generation
+
+
+def contest_generation(contest_id: int) -> int:
+    return get_generation(f"contest:{contest_id}")
+
+
+def bump_contest_generation(contest_id: int) -> int:
+    return bump_generation(f"contest:{contest_id}")
@@ -0,0 +1,152 @@
+import threading
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+
+from . import access
+from . import cache as shared_cache
+
+# Namespace of the generation bumped (see signals.py) whenever a public problem, its types or
+# groups change; every process rebuilds its catalogue once it sees a new generation
+CATALOGUE_GENERATION = "problem-catalogue"
+# How long (in seconds) a user's solved problems are cached; writes invalidate them sooner
+SOLVED_TIMEOUT = 10 * 60
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _bits(mask: int):
+    """The positions of the set bits of ``mask``, in increasing order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ProblemCatalogue:
+    """
+    The public problems in list order (points, then name), indexed for filtering.
+
+    Each problem is a bit in the masks of its types, its groups and the trigrams of its
+    lowercased name, so facet filters and name searches are answered with a few integer ANDs.
+    Name searches are checked against the candidates afterwards, like ``name__icontains``.
+    """
+
+    def __init__(self, problems: list, types: list, groups: list):
+        self.problems = problems
+        self.types = types
+        self.groups = groups
+        self.all = (1 << len(problems)) - 1
+        self.positions = {problem.pk: i for i, problem in enumerate(problems)}
+        self.by_type = defaultdict(int)
+        self.by_group = defaultdict(int)
+        self.by_trigram = defaultdict(int)
+        self._names = [problem.name.lower() for problem in problems]
+        for i, problem in enumerate(problems):
+            bit = 1 << i
+            for problem_type in problem.problem_type.all():
+                self.by_type[problem_type.pk] |= bit
+            for problem_group in problem.problem_group.all():
+                self.by_group[problem_group.pk] |= bit
+            for trigram in _trigrams(self._names[i]):
+                self.by_trigram[trigram] |= bit
+
+    @classmethod
+    def load(cls):
+        from ..models import Problem, ProblemGroup, ProblemType
+
+        problems = list(
+            Problem.objects.filter(is_public=True)
+            .prefetch_related("problem_type", "problem_group")
+            .order_by("points", "name")
+        )
+        return cls(problems, list(ProblemType.objects.all()), list(ProblemGroup.objects.all()))
+
+    def mask(self, problem_ids: Iterable[int]) -> int:
+        mask = 0
+        for pk in problem_ids:
+            if pk in self.positions:
+                mask |= 1 << self.positions[pk]
+        return mask
+
+    def search(
+        self,
+        types: Optional[list[int]] = None,
+        groups: Optional[list[int]] = None,
+        text: Optional[str] = None,
+        exclude: Iterable[int] = (),
+    ) -> list:
+        """
+        The problems with any of ``types`` and any of ``groups`` whose name contains ``text``
+        (case insensitively), leaving out the ids in ``exclude``.
+        """
+        mask = self.all & ~self.mask(exclude)
+        if types is not None:
+            mask &= self._union(self.by_type, types)
+        if groups is not None:
+            mask &= self._union(self.by_group, groups)
+        if text:
+            text = text.lower()
+            for trigram in _trigrams(text):
+                mask &= self.by_trigram.get(trigram, 0)
+            return [self.problems[i] for i in _bits(mask) if text in self._names[i]]
+        return [self.problems[i] for i in _bits(mask)]
+
+    @staticmethod
+    def _union(index, keys):
+        mask = 0
+        for key in keys:
+            mask |= index.get(key, 0)
+        return mask
+
+
+_lock = threading.Lock()
+_catalogue: Optional[ProblemCatalogue] = None
+_catalogue_generation = None
+
+
+def get_catalogue() -> ProblemCatalogue:
+    global _catalogue, _catalogue_generation
+    generation = shared_cache.get_generation(CATALOGUE_GENERATION)
+    with _lock:
+        if _catalogue is None or _catalogue_generation != generation:
+            _catalogue = ProblemCatalogue.load()
+            _catalogue_generation = generation
+        return _catalogue
+
+
+def bump_generation():
+    shared_cache.bump_generation(CATALOGUE_GENERATION)
+
+
+def covers(user) -> bool:
+    """Whether the catalogue holds every problem ``user`` can see."""
+    if not user.is_authenticated:
+        return True
+    if user.is_superuser or user.has_perm("gameserver.edit_all_problems"):
+        return False
+    profile = access.profile(user)
+    extra = profile.editable_problem_ids | profile.organization_problem_ids
+    return extra <= get_catalogue().positions.keys()
+
+
+def _solved_key(user_id: int) -> str:
+    return f"solved-problems:{user_id}"
+
+
+def solved_problem_ids(user) -> frozenset[int]:
+    """The ids of the problems ``user`` has solved, cached until they solve another."""
+    solved = cache.get(_solved_key(user.pk))
+    if solved is None:
+        solved = frozenset(
+            user.submissions.filter(is_correct=True).values_list("problem_id", flat=True)
+        )
+        cache.set(_solved_key(user.pk), solved, SOLVED_TIMEOUT)
+    return solved
+
+
+def invalidate_solved(user_ids: Iterable[int]):
+    cache.delete_many([_solved_key(user_id) for user_id in user_ids])
@@ -1,11 +1,15 @@
 import logging
+import os
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import kubernetes
 from dateutil.parser import isoparse
 from django.conf import settings
+from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
@@ -27,23 +31,383 @@ if api_client is None and not settings.DEBUG:
     logger.error("failed to connect to challenge cluster")
     raise Exception("failed to connect to challenge cluster")
 
+job_v1 = service_v1 = ingress_v1 = pod_v1 = None
+if api_client is not None:
+    # API discovery is slow, resolve the resources once
+    job_v1 = api_client.resources.get(api_version="batch/v1", kind="Job")
+    service_v1 = api_client.resources.get(api_version="v1", kind="Service")
+    ingress_v1 = api_client.resources.get(api_version="networking.k8s.io/v1", kind="Ingress")
+    pod_v1 = api_client.resources.get(api_version="v1", kind="Pod")
 
-def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance_owner, wait=False):
-    def generate_identifier():
-        return uuid.uuid4().hex[-7:]
+MANAGED_LABEL_SELECTOR = "app.kubernetes.io/managed-by=mCTF"
+WATCH_TIMEOUT = 300  # seconds before a watch is restarted
+WATCH_RETRY_DELAY = 5  # seconds to wait before relisting after an error
+
+
+class ResourceWatcher:
+    """
+    An in-memory mirror of the mCTF managed objects of one kind in the challenge namespace.
+
+    A background thread lists the objects and then watches them for changes, relisting after
+    errors. Until the first list has completed (see ``synced``) callers should ask the API.
+    """
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.synced = threading.Event()
+        self._objects = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name=f"watch-{resource.kind}", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._list_and_watch()
+            except Exception:
+                logger.exception(f"watch on {self.resource.kind} failed, relisting")
+            self.synced.clear()
+            time.sleep(WATCH_RETRY_DELAY)
+
+    def _list_and_watch(self):
+        listing = self.resource.get(
+            namespace=challenge_cluster["namespace"], label_selector=MANAGED_LABEL_SELECTOR
+        )
+        with self._lock:
+            self._objects = {obj.metadata.name: obj for obj in listing.items}
+        self.synced.set()
+
+        resource_version = listing.metadata.resourceVersion
+        while True:
+            for event in api_client.watch(
+                self.resource,
+                namespace=challenge_cluster["namespace"],
+                label_selector=MANAGED_LABEL_SELECTOR,
+                resource_version=resource_version,
+                timeout=WATCH_TIMEOUT,
+            ):
+                if event["type"] == "ERROR":  # most likely an expired resource version
+                    return
+                obj = event["object"]
+                resource_version = obj.metadata.resourceVersion
+                if event["type"] == "DELETED":
+                    self.discard(obj.metadata.name)
+                else:
+                    self.put(obj)
+
+    def put(self, obj):
+        with self._lock:
+            self._objects[obj.metadata.name] = obj
+
+    def discard(self, name):
+        with self._lock:
+            self._objects.pop(name, None)
+
+    def get(self, name):
+        with self._lock:
+            return self._objects.get(name)
+
+    def filter(self, **labels):
+        with self._lock:
+            objects = list(self._objects.values())
+        return [
+            obj
+            for obj in objects
+            if all(obj.metadata.labels[label] == value for label, value in labels.items())
+        ]
+
+
+class InstanceState:
+    """Watchers for the Jobs, Services, Ingresses and Pods that make up challenge instances."""
+
+    def __init__(self):
+        self.jobs = ResourceWatcher(job_v1)
+        self.services = ResourceWatcher(service_v1)
+        self.ingresses = ResourceWatcher(ingress_v1)
+        self.pods = ResourceWatcher(pod_v1)
+        self.pid = os.getpid()
+        for watcher in (self.jobs, self.services, self.ingresses, self.pods):
+            watcher.start()
+
+
+_instance_state = None
+_instance_state_lock = threading.Lock()
+
+
+def instance_state() -> InstanceState:
+    # started lazily as threads do not survive the fork into worker processes
+    global _instance_state
+    with _instance_state_lock:
+        if _instance_state is None or _instance_state.pid != os.getpid():
+            _instance_state = InstanceState()
+        return _instance_state
+
+
+# Instance states, in order: a launch is queued for the executor, its objects are being
+# created, its pod is not running yet, it is ready to use, and its duration is over.
+QUEUED = "queued"
+CREATING = "creating"
+PENDING = "pending"
+READY = "ready"
+EXPIRED = "expired"
+FAILED = "failed"
+
+LAUNCH_TIMEOUT = 5 * 60  # seconds a launch record is kept while the objects are created
+
+_executor = None
+_executor_lock = threading.Lock()
+_executor_pid = None
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=challenge_cluster.get("launchWorkers", 4),
+                thread_name_prefix="challenge-launch",
+            )
+            _executor_pid = os.getpid()
+        return _executor
 
-    instance_id = generate_identifier()
-    instance_name = f"{problem_id}-{instance_id}"
 
+def _launch_key(problem_id, instance_owner):
+    return f"challenge_launch:{problem_id}:{instance_owner}"
+
+
+def _launch_status(problem_id, instance_owner, instance_id, status):
+    return {
+        "instance": {
+            "name": f"{problem_id}-{instance_id}",
+            "problem": problem_id,
+            "id": instance_id,
+            "owner": instance_owner,
+        },
+        "status": status,
+    }
+
+
+# Owner of the idle instances kept in a problem's warm pool (challenge_spec["warmPool"])
+POOL_OWNER = "pool"
+CLAIMED_AT_ANNOTATION = "ctf-claimed-at"
+
+
+POOL_REFILL_TIMEOUT = 5 * 60  # seconds a refill may hold the pool lock of its problem
+
+
+def _pool_keys(problem_id):
+    return f"challenge_pool_refill:{problem_id}", f"challenge_pool_refill_again:{problem_id}"
+
+
+def ensure_warm_pool(challenge_spec, problem_id, problem_flag):
+    """
+    Creates or deletes idle instances until the warm pool of the problem has
+    challenge_spec["warmPool"].
+
+    Refills of a problem hold a lock in the shared cache, so only one worker refills it at a
+    time, and count the pool from the API as the watchers may not have seen the instances the
+    last refill created yet. A refill that finds the lock taken asks its holder to go again.
+    """
+    lock, again = _pool_keys(problem_id)
+    if not cache.add(lock, True, POOL_REFILL_TIMEOUT):
+        cache.set(again, True, POOL_REFILL_TIMEOUT)
+        return
+    try:
+        cache.delete(again)
+        while True:
+            _refill_warm_pool(challenge_spec, problem_id, problem_flag)
+            if not cache.delete(again):
+                break
+    finally:
+        cache.delete(lock)
+
+
+def _refill_warm_pool(challenge_spec, problem_id, problem_flag):
+    size = challenge_spec.get("warmPool", 0)
+    pooled = sorted(
+        job_v1.get(
+            namespace=challenge_cluster["namespace"],
+            label_selector=f"ctf-problem={problem_id},ctf-instance-owner={POOL_OWNER}",
+        ).items,
+        key=lambda job: job.metadata.creationTimestamp,
+    )
+    for _ in range(size - len(pooled)):
+        create_challenge_instance(challenge_spec, problem_id, problem_flag, POOL_OWNER)
+    # the pool was shrunk in the spec; the precondition keeps instances claimed meanwhile
+    for job in pooled[size:]:
+        try:
+            job_v1.delete(
+                namespace=challenge_cluster["namespace"],
+                name=job.metadata.name,
+                body={"preconditions": {"resourceVersion": job.metadata.resourceVersion}},
+                propagation_policy="Background",
+            )
+        except (
+            kubernetes.dynamic.exceptions.ConflictError,
+            kubernetes.dynamic.exceptions.NotFoundError,
+        ):
+            continue
+        instance_state().jobs.discard(job.metadata.name)
+
+
+def claim_pooled_instance(challenge_spec, problem_id, instance_owner):
+    """
+    Hands an idle instance of the warm pool to ``instance_owner``.
+
+    The Job is relabelled with a merge patch that carries its resourceVersion, so if another
+    worker claims the same instance first the patch fails and the next one is tried. Its
+    deadline is moved so the owner gets the full duration from now on.
+    """
+    # prefer instances whose pods are already running
+    pooled = sorted(
+        _find_jobs(problem_id, POOL_OWNER),
+        key=lambda job: _pod_status(job.metadata.labels["ctf-instance"]) != READY,
+    )
+    now = datetime.utcnow()
+    for job in pooled:
+        started = isoparse(job.status.startTime or job.metadata.creationTimestamp)
+        elapsed = int(now.timestamp() - started.timestamp())
+        try:
+            job = job_v1.patch(
+                body={
+                    "metadata": {
+                        "resourceVersion": job.metadata.resourceVersion,
+                        "labels": {"ctf-instance-owner": instance_owner},
+                        "annotations": {CLAIMED_AT_ANNOTATION: now.isoformat() + "Z"},
+                    },
+                    "spec": {"activeDeadlineSeconds": elapsed + challenge_spec["duration"]},
+                },
+                name=job.metadata.name,
+                namespace=challenge_cluster["namespace"],
+                content_type="application/merge-patch+json",
+            )
+        except (
+            kubernetes.dynamic.exceptions.ConflictError,
+            kubernetes.dynamic.exceptions.NotFoundError,
+        ):
+            continue
+        instance_state().jobs.put(job)
+        return job
+    return None
+
+
+def launch_challenge_instance(challenge_spec, problem_id, problem_flag, instance_owner):
+    """
+    Starts creating a challenge instance in the background and returns its status.
+
+    The launch is recorded in the shared cache so that status requests on any worker report
+    it as queued/creating until its objects exist, after which the state is derived from the
+    instance itself (see fetch_challenge_instance).
+    """
     existing_challenge_instance = fetch_challenge_instance(
         challenge_spec, problem_id, instance_owner
     )
-    if existing_challenge_instance is not None:
+    if existing_challenge_instance is not None and existing_challenge_instance["status"] in (
+        QUEUED,
+        CREATING,
+        PENDING,
+        READY,
+    ):
+        return existing_challenge_instance
+
+    if challenge_spec.get("warmPool", 0) > 0:
+        claimed = claim_pooled_instance(challenge_spec, problem_id, instance_owner)
+        executor().submit(ensure_warm_pool, challenge_spec, problem_id, problem_flag)
+        if claimed is not None:
+            return fetch_challenge_instance(challenge_spec, problem_id, instance_owner)
+
+    instance_id = uuid.uuid4().hex[-7:]
+    key = _launch_key(problem_id, instance_owner)
+    if existing_challenge_instance is not None and existing_challenge_instance["status"] == FAILED:
+        cache.delete(key)  # retry a failed launch
+    if not cache.add(key, {"id": instance_id, "status": QUEUED}, LAUNCH_TIMEOUT):
+        # launched concurrently by another request
+        return fetch_challenge_instance(challenge_spec, problem_id, instance_owner)
+
+    def launch():
+        cache.set(key, {"id": instance_id, "status": CREATING}, LAUNCH_TIMEOUT)
+        try:
+            create_challenge_instance(
+                challenge_spec, problem_id, problem_flag, instance_owner, instance_id=instance_id
+            )
+        except Exception:
+            logger.exception(f"failed to launch {problem_id} for {instance_owner}")
+            cache.set(key, {"id": instance_id, "status": FAILED}, 30)
+        else:
+            cache.delete(key)
+
+    executor().submit(launch)
+    return _launch_status(problem_id, instance_owner, instance_id, QUEUED)
+
+
+def _pod_status(instance_id):
+    pods = instance_state().pods
+    if pods.synced.is_set():
+        pod_list = pods.filter(**{"ctf-instance": instance_id})
+    else:
+        pod_list = pod_v1.get(
+            namespace=challenge_cluster["namespace"], label_selector=f"ctf-instance={instance_id}"
+        ).items
+    for pod in pod_list:
+        conditions = pod.status.conditions or []
+        if pod.status.phase == "Running" and any(
+            condition.type == "Ready" and condition.status == "True" for condition in conditions
+        ):
+            return READY
+    return PENDING
+
+
+def _find_jobs(problem_id, instance_owner):
+    jobs = instance_state().jobs
+    if jobs.synced.is_set():
+        return jobs.filter(**{"ctf-problem": problem_id, "ctf-instance-owner": instance_owner})
+    return job_v1.get(
+        namespace=challenge_cluster["namespace"],
+        label_selector=f"ctf-problem={problem_id},ctf-instance-owner={instance_owner}",
+    ).items
+
+
+def _find_job(problem_id, instance_owner):
+    job_list = _find_jobs(problem_id, instance_owner)
+    return job_list[0] if len(job_list) > 0 else None
+
+
+def _job_started_at(job):
+    """When the instance was created, or claimed from the warm pool."""
+    annotations = job.metadata.annotations
+    if annotations and annotations[CLAIMED_AT_ANNOTATION]:
+        return annotations[CLAIMED_AT_ANNOTATION]
+    return job.metadata.creationTimestamp
+
+
+def _get_object(watcher: ResourceWatcher, name):
+    if watcher.synced.is_set():
+        return watcher.get(name)
+    try:
+        return watcher.resource.get(namespace=challenge_cluster["namespace"], name=name)
+    except kubernetes.dynamic.exceptions.NotFoundError:
         return None
 
-    job_v1 = api_client.resources.get(api_version="batch/v1", kind="Job")
-    service_v1 = api_client.resources.get(api_version="v1", kind="Service")
-    ingress_v1 = api_client.resources.get(api_version="networking.k8s.io/v1", kind="Ingress")
+
+def create_challenge_instance(
+    challenge_spec, problem_id, problem_flag, instance_owner, instance_id=None
+):
+    def generate_identifier():
+        return uuid.uuid4().hex[-7:]
+
+    if instance_id is None:
+        instance_id = generate_identifier()
+    instance_name = f"{problem_id}-{instance_id}"
+
+    # the warm pool is the only owner with several instances of a problem
+    if instance_owner != POOL_OWNER and _find_job(problem_id, instance_owner) is not None:
+        return None
+
+    state = instance_state()
 
     labels = {
         "ctf-problem": problem_id,
@@ -62,7 +426,10 @@ def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance
         },
         "spec": {
             "backoffLimit": 4,
-            "activeDeadlineSeconds": challenge_spec["duration"],
+            # pooled instances get their deadline when they are claimed
+            "activeDeadlineSeconds": (
+                challenge_spec["duration"] if instance_owner != POOL_OWNER else None
+            ),
             "ttlSecondsAfterFinished": 0,
             "template": {
                 "metadata": {
@@ -165,6 +532,7 @@ def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance
     }
 
     job = job_v1.create(body=job_manifest, namespace=challenge_cluster["namespace"])
+    state.jobs.put(job)  # don't wait for the watch to report it
 
     ports_expose = []
     for container in challenge_spec["containers"]:
@@ -218,10 +586,12 @@ def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance
             },
         }
 
-        return service_v1.create(body=service_manifest, namespace=challenge_cluster["namespace"])
+        service = service_v1.create(body=service_manifest, namespace=challenge_cluster["namespace"])
+        state.services.put(service)
+        return service
 
     if len(nodeport_ports) > 0:
-        nodeport_svc = create_service("NodePort", nodeport_ports)
+        create_service("NodePort", nodeport_ports)
 
     if len(ingress_ports) > 0:
         clusterip_svc = create_service("ClusterIP", ingress_ports)
@@ -268,17 +638,7 @@ def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance
         }
 
         ingress = ingress_v1.create(body=ingress_manifest, namespace=challenge_cluster["namespace"])
-
-    if wait:
-        pod_v1 = api_client.resources.get(api_version="v1", kind="Pod")
-        while True:
-            time.sleep(1)
-            pod_list = pod_v1.get(
-                namespace=challenge_cluster["namespace"],
-                label_selector=f"ctf-instance={instance_id}",
-            ).items
-            if len(pod_list) > 0 and pod_list[0].phase != "Pending":
-                break
+        state.ingresses.put(ingress)
 
     return fetch_challenge_instance(
         challenge_spec, problem_id=problem_id, instance_owner=instance_owner
@@ -286,30 +646,31 @@ def create_challenge_instance(challenge_spec, problem_id, problem_flag, instance
 
 
 def fetch_challenge_instance(challenge_spec, problem_id, instance_owner, ignore_age=False):
-    job_v1 = api_client.resources.get(api_version="batch/v1", kind="Job")
-    service_v1 = api_client.resources.get(api_version="v1", kind="Service")
-    ingress_v1 = api_client.resources.get(api_version="networking.k8s.io/v1", kind="Ingress")
+    """
+    Returns the status of an instance, or None if there is none.
 
-    job_list = job_v1.get(
-        namespace=challenge_cluster["namespace"],
-        label_selector=f"ctf-problem={problem_id},ctf-instance-owner={instance_owner}",
-    )
+    The "status" is one of QUEUED, CREATING, PENDING, READY or EXPIRED (FAILED if the last
+    launch failed). Served from the watch caches once they are synced, without any API calls.
+    """
+    job = _find_job(problem_id, instance_owner)
 
-    if len(job_list.items) == 0:
-        return None
+    if job is None:
+        launch = cache.get(_launch_key(problem_id, instance_owner))
+        if launch is None:
+            return None
+        return _launch_status(problem_id, instance_owner, launch["id"], launch["status"])
 
-    job = job_list.items[0]
+    instance_name = job.metadata.name
+    problem_id = job.metadata.labels["ctf-problem"]
+    instance_id = job.metadata.labels["ctf-instance"]
 
     if not ignore_age:
-        job_deadline = isoparse(job.metadata.creationTimestamp) + timedelta(
+        job_deadline = isoparse(_job_started_at(job)) + timedelta(
             seconds=challenge_spec["duration"]
         )
         if job_deadline.timestamp() < datetime.utcnow().timestamp():
-            return delete_challenge_instance(challenge_spec, problem_id, instance_owner)
-
-    instance_name = job.metadata.name
-    problem_id = job.metadata.labels["ctf-problem"]
-    instance_id = job.metadata.labels["ctf-instance"]
+            delete_challenge_instance(challenge_spec, problem_id, instance_owner)
+            return _launch_status(problem_id, instance_owner, instance_id, EXPIRED)
 
     endpoints = []
 
@@ -327,11 +688,10 @@ def fetch_challenge_instance(challenge_spec, problem_id, instance_owner, ignore_
 
                 endpoints_name_connection_tmpl[port["name"]] = connection_tmpl
 
-    try:
-        nodeport_svc = service_v1.get(
-            namespace=challenge_cluster["namespace"], name=f"{job.metadata.name}-tcp"
-        )
+    state = instance_state()
 
+    nodeport_svc = _get_object(state.services, f"{job.metadata.name}-tcp")
+    if nodeport_svc is not None:
         for port in nodeport_svc.spec.ports:
             host = challenge_cluster["domain"].format(instance_id)
 
@@ -346,33 +706,27 @@ def fetch_challenge_instance(challenge_spec, problem_id, instance_owner, ignore_
                     ),
                 }
             )
-    except kubernetes.dynamic.exceptions.NotFoundError:
-        pass
-
-    try:
-        clusterip_svc = service_v1.get(
-            namespace=challenge_cluster["namespace"], name=f"{job.metadata.name}-http"
-        )
-        ingress = ingress_v1.get(namespace=challenge_cluster["namespace"], name=job.metadata.name)
 
+    clusterip_svc = _get_object(state.services, f"{job.metadata.name}-http")
+    ingress = _get_object(state.ingresses, job.metadata.name)
+    if clusterip_svc is not None and ingress is not None:
         clusterip_svc_port_name = {}
         for port in clusterip_svc.spec.ports:
             clusterip_svc_port_name[port.port] = port.name
 
         for rule in ingress.spec.rules:
+            port_name = clusterip_svc_port_name[rule.http.paths[0].backend.service.port.number]
             endpoints.append(
                 {
-                    "name": clusterip_svc_port_name[rule.http.paths[0].backend.service.port.number],
+                    "name": port_name,
                     "protocol": "HTTP",
                     "host": rule.host,
                     "port": 80,
-                    "connection": endpoints_name_connection_tmpl[port.name].format(
+                    "connection": endpoints_name_connection_tmpl[port_name].format(
                         host=rule.host, port=80
                     ),
                 }
             )
-    except kubernetes.dynamic.exceptions.NotFoundError:
-        pass
 
     return {
         "instance": {
@@ -382,16 +736,15 @@ def fetch_challenge_instance(challenge_spec, problem_id, instance_owner, ignore_
             "owner": instance_owner,
         },
         "time": {
-            "created_at": job.metadata.creationTimestamp,
+            "created_at": _job_started_at(job),
             "duration": challenge_spec["duration"],
         },
         "endpoints": endpoints,
+        "status": _pod_status(instance_id),
     }
 
 
 def delete_challenge_instance(challenge_spec, problem_id, instance_owner):
-    job_v1 = api_client.resources.get(api_version="batch/v1", kind="Job")
-
     challenge_instance_status = fetch_challenge_instance(
         challenge_spec, problem_id=problem_id, instance_owner=instance_owner, ignore_age=True
     )
@@ -404,3 +757,4 @@ def delete_challenge_instance(challenge_spec, problem_id, instance_owner):
         name=challenge_instance_status["instance"]["name"],
         propagation_policy="Background",
     )
+    instance_state().jobs.discard(challenge_instance_status["instance"]["name"])
@@ -0,0 +1,58 @@
+import time
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+
+# Longest time (in seconds) an entry is trusted, for access changes that are not signalled
+# (e.g. permissions granted through groups)
+CONTEST_SESSION_TIMEOUT = 60 * 60
+
+
+def _key(user_id: int) -> str:
+    return f"contest-session:{user_id}"
+
+
+def get(user) -> Optional[int]:
+    """
+    Returns the id of the participation the user is currently in, or None.
+
+    The participation and the contest's end time are cached per user until the contest ends,
+    so steady-state requests need no queries. Joining or leaving changes current_contest_id,
+    which misses the cache, and changes to the organizations, organizers or curators of the
+    user or contest invalidate it (see signals.py). Only a miss checks whether the contest is
+    still accessible, through User.update_contest().
+    """
+    session = cache.get(_key(user.pk))
+    if (
+        session is not None
+        and session["participation_id"] == user.current_contest_id
+        and (session["end_time"] is None or session["end_time"] > time.time())
+    ):
+        return session["participation_id"]
+
+    user.update_contest()
+    participation = user.current_contest
+    if participation is None:
+        session = {"participation_id": None, "end_time": None}
+        timeout = CONTEST_SESSION_TIMEOUT
+    else:
+        end_time = participation.contest.end_time.timestamp()
+        session = {"participation_id": participation.pk, "end_time": end_time}
+        timeout = max(1, min(int(end_time - time.time()), CONTEST_SESSION_TIMEOUT))
+    cache.set(_key(user.pk), session, timeout)
+    return session["participation_id"]
+
+
+def invalidate(user_ids: Iterable[int]):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def invalidate_contests(contest_ids: Iterable[int]):
+    """Invalidates every user currently in one of the contests."""
+    from ..models import User
+
+    invalidate(
+        User.objects.filter(current_contest__contest_id__in=contest_ids).values_list(
+            "pk", flat=True
+        )
+    )
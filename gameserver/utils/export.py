@@ -0,0 +1,123 @@
+import csv
+import json
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from ..models import Contest, ContestParticipation, ContestScore, ContestSubmission
+
+# Rows fetched per round trip of the server-side cursor, and per chunk of the output
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, lookup) of every exported contest submission, joined with its submission
+SUBMISSION_COLUMNS = (
+    ("id", "pk"),
+    ("submission_id", "submission_id"),
+    ("participation_id", "participation_id"),
+    ("user_id", "submission__user_id"),
+    ("username", "submission__user__username"),
+    ("team", "participation__team__name"),
+    ("problem", "problem__problem__slug"),
+    ("points", "problem__points"),
+    ("is_correct", "submission__is_correct"),
+    ("date_created", "submission__date_created"),
+    ("content", "submission__content"),
+)
+SCORE_COLUMNS = (
+    ("participation_id", "participation_id"),
+    ("team", "participation__team__name"),
+    ("points", "points"),
+    ("flags", "flag_count"),
+    ("last_correct_submission", "last_correct_submission"),
+)
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def submission_rows(contest: Contest, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """The header and then every submission of ``contest`` in pk order."""
+    yield tuple(column for column, _ in SUBMISSION_COLUMNS)
+    yield from (
+        ContestSubmission.objects.filter(participation__contest=contest)
+        .order_by("pk")
+        .values_list(*(lookup for _, lookup in SUBMISSION_COLUMNS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def score_rows(contest: Contest, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    The header and then the score of every participation of ``contest``, with its rank and
+    name, in participation order.
+
+    Solo participations are named after their participant, looked up one chunk at a time.
+    """
+    yield tuple(column for column, _ in SCORE_COLUMNS) + ("name", "rank")
+    index = ContestScore.rank_index(contest.pk)
+    scores = (
+        ContestScore.objects.filter(participation__contest=contest)
+        .order_by("participation_id")
+        .values_list(*(lookup for _, lookup in SCORE_COLUMNS))
+        .iterator(chunk_size=chunk_size)
+    )
+    for batch in _batches(scores, chunk_size):
+        solo_names = dict(
+            ContestParticipation.objects.filter(
+                pk__in=[row[0] for row in batch if row[1] is None]
+            ).values_list("pk", "participants__username")
+        )
+        for row in batch:
+            participation_id, team = row[0], row[1]
+            name = team if team is not None else solo_names.get(participation_id, "")
+            yield row + (name, index.rank(participation_id))
+
+
+TABLES: dict[str, Callable[..., Iterator[tuple]]] = {
+    "submissions": submission_rows,
+    "scores": score_rows,
+}
+
+
+def ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    """One JSON object per row, keyed by the header."""
+    header = next(rows)
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+class _Echo:
+    """A file-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows: Iterator[tuple]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+FORMATS = {
+    "ndjson": (ndjson, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def export(
+    contest: Contest, table: str, format: str, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Streams a table of ``contest`` in ``format``, ``chunk_size`` rows per yielded string.
+
+    Rows are read through a server-side cursor and written out as they arrive, so memory use
+    does not grow with the size of the contest.
+    """
+    write, _ = FORMATS[format]
+    for lines in _batches(write(TABLES[table](contest, chunk_size)), chunk_size):
+        yield "".join(lines)
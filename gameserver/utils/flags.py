@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+import re
+import threading
+from typing import Optional
+
+EXACT = "exact"
+CASE_INSENSITIVE = "case_insensitive"
+REGEX = "regex"
+
+
+class FlagVerifier:
+    """
+    Checks submitted flags against the accepted flags of a problem.
+
+    Exact and case insensitive flags are stored as SHA-256 digests and compared in constant
+    time; regex flags are compiled once and must match the whole submission.
+    """
+
+    def __init__(self, flags: list[str], mode: str = EXACT):
+        self.mode = mode
+        if mode == REGEX:
+            self._patterns = [re.compile(flag) for flag in flags]
+        else:
+            self._digests = [self._digest(flag) for flag in flags]
+        self.flag_format = self._flag_format(flags[0]) if mode != REGEX else None
+
+    def _digest(self, flag: str) -> bytes:
+        if self.mode == CASE_INSENSITIVE:
+            flag = flag.casefold()
+        return hashlib.sha256(flag.encode()).digest()
+
+    @staticmethod
+    def _flag_format(flag: str):
+        flag_format_match = re.match(r"(.*)\{.*\}", flag)
+
+        if flag_format_match is not None:
+            return f"{flag_format_match.group(1)}{{}}"
+        else:
+            return None
+
+    def verify(self, submitted: str) -> bool:
+        if self.mode == REGEX:
+            return any(pattern.fullmatch(submitted) for pattern in self._patterns)
+
+        digest = self._digest(submitted)
+        correct = False
+        for expected in self._digests:  # no short circuit, every flag takes as long to check
+            correct |= hmac.compare_digest(digest, expected)
+        return correct
+
+
+def pattern_error(pattern: str) -> Optional[str]:
+    """Why ``pattern`` cannot be used as a regex flag, or None if it can."""
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return str(e)
+    return None
+
+
+_lock = threading.Lock()
+_verifiers: dict[int, tuple[tuple, FlagVerifier]] = {}
+
+
+def get_verifier(problem) -> FlagVerifier:
+    """
+    Returns the cached verifier of ``problem``, building it if needed.
+
+    Verifiers are dropped when their problem is saved (see signals.py); the flags they were
+    built from are also compared so a problem changed by another process is never checked
+    against its old flags.
+    """
+    signature = (problem.flag, tuple(problem.extra_flags or ()), problem.flag_mode)
+    with _lock:
+        cached = _verifiers.get(problem.pk)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    verifier = FlagVerifier([problem.flag, *signature[1]], problem.flag_mode)
+    with _lock:
+        _verifiers[problem.pk] = (signature, verifier)
+    return verifier
+
+
+def invalidate(problem_id: int):
+    with _lock:
+        _verifiers.pop(problem_id, None)
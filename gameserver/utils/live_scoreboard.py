@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+
+from . import cache as shared_cache
+from . import scoreboard
+
+# How often (in seconds) a publisher checks whether its contest's scores changed
+POLL_INTERVAL = 1
+# How often (in seconds) an idle stream sends a comment so proxies keep it open
+HEARTBEAT_INTERVAL = 15
+# Events a slow client may fall behind before it is sent a fresh snapshot instead
+MAX_PENDING_EVENTS = 50
+
+
+def scoreboard_rows(contest_id: int) -> dict[int, dict]:
+    """The whole scoreboard of a contest keyed by participation id, as sent to clients."""
+    return {
+        row.participation_id: {
+            "id": row.participation_id,
+            "rank": row.rank,
+            "name": row.name,
+            "url": row.get_absolute_url(),
+            "is_team": row.is_team,
+            "points": row.points,
+            "flags": row.flags,
+            "time": row.time_taken,
+        }
+        for row in scoreboard.contest_rows(contest_id)
+    }
+
+
+def _event(name: str, data) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class ScoreboardPublisher:
+    """
+    Loads the scoreboard of one contest whenever its generation changes and fans out the
+    rows that changed to every subscribed stream.
+
+    There is one publisher per contest and process, so the database sees one scoreboard query
+    per score change regardless of the number of spectators.
+    """
+
+    def __init__(self, contest_id: int):
+        self.contest_id = contest_id
+        self.rows = None
+        self.subscribers: set[asyncio.Queue] = set()
+        self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        if self.rows is not None:
+            queue.put_nowait(self._snapshot())
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def _snapshot(self):
+        return _event("snapshot", sorted(self.rows.values(), key=lambda row: row["rank"]))
+
+    def _publish(self, event: str):
+        for queue in self.subscribers:
+            if queue.qsize() >= MAX_PENDING_EVENTS:
+                # the client stopped reading, resync it once it catches up
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot())
+            else:
+                queue.put_nowait(event)
+
+    async def _run(self):
+        generation = None
+        while self.subscribers:
+            current = await sync_to_async(shared_cache.contest_generation)(self.contest_id)
+            if current != generation:
+                generation = current
+                rows = await sync_to_async(scoreboard_rows)(self.contest_id)
+                if self.rows is None:
+                    self.rows = rows
+                    self._publish(self._snapshot())
+                else:
+                    changed = [row for pk, row in rows.items() if self.rows.get(pk) != row]
+                    removed = [pk for pk in self.rows if pk not in rows]
+                    self.rows = rows
+                    if changed or removed:
+                        self._publish(_event("delta", {"changed": changed, "removed": removed}))
+            await asyncio.sleep(POLL_INTERVAL)
+        _publishers.pop(self.contest_id, None)
+
+
+_publishers: dict[int, ScoreboardPublisher] = {}
+
+
+async def stream(contest_id: int):
+    """Yields the server-sent events of the live scoreboard of a contest."""
+    publisher = _publishers.get(contest_id)
+    if publisher is None:
+        publisher = _publishers[contest_id] = ScoreboardPublisher(contest_id)
+    queue = publisher.subscribe()
+    try:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+    finally:
+        publisher.unsubscribe(queue)
@@ -0,0 +1,269 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Per-view totals, as integers so they can be added up in the shared cache with incr
+STATS = (
+    "requests",
+    "queries",
+    "db_us",
+    "cache_hits",
+    "cache_misses",
+    "render_us",
+    "duration_us",
+    "over_budget",
+)
+VIEWS_KEY = "metrics:views"
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when settings.METRICS["enforce_budgets"] is set and a view exceeds its budget."""
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    render_time: float = 0.0
+    duration: float = 0.0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+# Set during a counted cache lookup, so lookups the backend makes through its own get are not
+# counted again (BaseCache.get_many calls get for every key)
+_in_lookup: ContextVar[bool] = ContextVar("in_cache_lookup", default=False)
+_missing = object()
+
+
+def current() -> Optional[RequestMetrics]:
+    """The metrics of the request being handled, if it is being recorded."""
+    return _current.get()
+
+
+def _count_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorded = _current.get()
+        if recorded is not None:
+            recorded.queries += 1
+            recorded.db_time += time.perf_counter() - start
+
+
+def count_cache(hits: int, misses: int):
+    recorded = _current.get()
+    if recorded is not None:
+        recorded.cache_hits += hits
+        recorded.cache_misses += misses
+
+
+def _instrument(backend):
+    """
+    Wraps the get and get_many of a cache backend instance to count hits and misses.
+
+    This works the same for every backend class; the wrappers stay in place and only count
+    while a request is being recorded.
+    """
+    if getattr(backend, "_metrics_instrumented", False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    def counted_get(key, default=None, version=None):
+        if _in_lookup.get():
+            return get(key, default, version)
+        token = _in_lookup.set(True)
+        try:
+            value = get(key, _missing, version)
+        finally:
+            _in_lookup.reset(token)
+        count_cache(value is not _missing, value is _missing)
+        return default if value is _missing else value
+
+    def counted_get_many(keys, version=None):
+        if _in_lookup.get():
+            return get_many(keys, version)
+        keys = list(keys)
+        token = _in_lookup.set(True)
+        try:
+            values = get_many(keys, version)
+        finally:
+            _in_lookup.reset(token)
+        count_cache(len(values), len(keys) - len(values))
+        return values
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+    backend._metrics_instrumented = True
+
+
+@contextlib.contextmanager
+def record():
+    """Records the queries and cache lookups made by the calling context."""
+    recorded = RequestMetrics()
+    token = _current.set(recorded)
+    start = time.perf_counter()
+    # backends are created per thread, so the ones this context uses are instrumented here
+    for backend in caches.all():
+        _instrument(backend)
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_count_query))
+            yield recorded
+    finally:
+        recorded.duration = time.perf_counter() - start
+        _current.reset(token)
+
+
+def time_render(response):
+    """Times the rendering of a TemplateResponse, which happens after the view returns."""
+    recorded = _current.get()
+    if recorded is not None:
+        start = time.perf_counter()
+
+        def rendered(response):
+            recorded.render_time += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+    return response
+
+
+def query_budget(queries: int):
+    """Declares the most queries a function view may run; class-based views set query_budget."""
+
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def budget_of(view_func) -> Optional[int]:
+    view_class = getattr(view_func, "view_class", None)
+    return getattr(view_class or view_func, "query_budget", None)
+
+
+_lock = threading.Lock()
+_totals: dict[str, dict[str, int]] = {}
+_unflushed: dict[str, dict[str, int]] = {}
+_unflushed_requests = 0
+
+
+def _add(totals, view, figures):
+    view_totals = totals.setdefault(view, dict.fromkeys(STATS, 0))
+    for name, value in figures.items():
+        view_totals[name] += value
+
+
+def _flush(unflushed):
+    for view, figures in unflushed.items():
+        for name, value in figures.items():
+            if value:
+                key = f"metrics:{view}:{name}"
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+    known = cache.get(VIEWS_KEY) or set()
+    if not unflushed.keys() <= known:
+        cache.set(VIEWS_KEY, known | unflushed.keys(), None)
+
+
+def finish(
+    request, recorded: RequestMetrics, budget: Optional[int] = None, streaming: bool = False
+):
+    """
+    Adds a request's figures to its view's totals, logs them and checks the view's budget.
+
+    Streaming responses are only recorded until the response is returned, not while their
+    content is sent, so they are totalled apart as "<view> (streamed)".
+
+    The totals are flushed to the shared cache every settings.METRICS["flush_interval"]
+    requests, from where prometheus() reports them for every process.
+    """
+    global _unflushed, _unflushed_requests
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match is not None else "unresolved"
+    if streaming:
+        view += " (streamed)"
+    over_budget = budget is not None and recorded.queries > budget
+    figures = {
+        "requests": 1,
+        "queries": recorded.queries,
+        "db_us": round(recorded.db_time * 1e6),
+        "cache_hits": recorded.cache_hits,
+        "cache_misses": recorded.cache_misses,
+        "render_us": round(recorded.render_time * 1e6),
+        "duration_us": round(recorded.duration * 1e6),
+        "over_budget": int(over_budget),
+    }
+
+    unflushed = None
+    with _lock:
+        _add(_totals, view, figures)
+        _add(_unflushed, view, figures)
+        _unflushed_requests += 1
+        if _unflushed_requests >= settings.METRICS["flush_interval"]:
+            unflushed, _unflushed, _unflushed_requests = _unflushed, {}, 0
+    if unflushed is not None:
+        _flush(unflushed)
+
+    if settings.METRICS["log"]:
+        logger.info(json.dumps({"view": view, "path": request.path} | asdict(recorded)))
+    if over_budget:
+        message = f"{view} ran {recorded.queries} queries, over its budget of {budget}"
+        if settings.METRICS["enforce_budgets"]:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def process_totals() -> dict[str, dict[str, int]]:
+    """The totals of this process, flushed or not."""
+    with _lock:
+        return {view: dict(figures) for view, figures in _totals.items()}
+
+
+def shared_totals() -> dict[str, dict[str, int]]:
+    """The flushed totals of every process."""
+    views = sorted(cache.get(VIEWS_KEY) or ())
+    values = cache.get_many([f"metrics:{view}:{name}" for view in views for name in STATS])
+    return {
+        view: {name: values.get(f"metrics:{view}:{name}", 0) for name in STATS} for view in views
+    }
+
+
+# (metric, stat, scale, help) of every exported counter
+PROMETHEUS_METRICS = (
+    ("mctf_view_requests_total", "requests", 1, "Requests handled."),
+    ("mctf_view_queries_total", "queries", 1, "Database queries run."),
+    ("mctf_view_db_seconds_total", "db_us", 1e-6, "Time spent in database queries."),
+    ("mctf_view_cache_hits_total", "cache_hits", 1, "Shared cache lookups that hit."),
+    ("mctf_view_cache_misses_total", "cache_misses", 1, "Shared cache lookups that missed."),
+    ("mctf_view_render_seconds_total", "render_us", 1e-6, "Time spent rendering templates."),
+    ("mctf_view_seconds_total", "duration_us", 1e-6, "Time spent handling requests."),
+    ("mctf_view_over_budget_total", "over_budget", 1, "Requests over the view's query budget."),
+)
+
+
+def prometheus(totals: dict[str, dict[str, int]]) -> str:
+    """The totals in the Prometheus text exposition format, labelled by view."""
+    lines = []
+    for metric, stat, scale, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for view, figures in sorted(totals.items()):
+            label = view.replace("\\", "\\\\").replace('"', '\\"')
+            value = figures[stat] if scale == 1 else figures[stat] * scale
+            lines.append(f'{metric}{{view="{label}"}} {value}')
+    return "\n".join(lines) + "\n"
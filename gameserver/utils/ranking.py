@@ -0,0 +1,105 @@
+import bisect
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+RankRow = tuple[int, int, datetime]
+
+
+class RankIndex:
+    """
+    A scoreboard sorted by (points, last correct submission).
+
+    Entries are kept in a list sorted by ``(-points, -last_correct_submission, pk)``, the same
+    order as the ``ranks()`` querysets, so the rank of an entry (tied entries share a rank,
+    like ``Rank()``) and any page of the scoreboard are found by bisection.
+
+    An index only sees the score changes made by its own process, so it remembers the shared
+    generation of the scores it was built at (see utils/cache.py) and is rebuilt from the cache
+    tables once another process bumped it.
+    """
+
+    def __init__(self, rows: Iterable[RankRow] = (), generation: Optional[int] = None):
+        self._entries = {pk: self._key(pk, points, last) for pk, points, last in rows}
+        self._keys = sorted(self._entries.values())
+        self.generation = generation
+
+    @staticmethod
+    def _key(pk: int, points: int, last_correct_submission: datetime):
+        return (-points, -last_correct_submission.timestamp(), pk)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, pk):
+        return pk in self._entries
+
+    def update(self, pk: int, points: int, last_correct_submission: datetime):
+        self.remove(pk)
+        key = self._key(pk, points, last_correct_submission)
+        bisect.insort(self._keys, key)
+        self._entries[pk] = key
+
+    def remove(self, pk: int):
+        key = self._entries.pop(pk, None)
+        if key is not None:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def _rank_of_key(self, key):
+        # (points, time) sorts before every (points, time, pk) so this counts strictly better keys
+        return bisect.bisect_left(self._keys, key[:2]) + 1
+
+    def rank(self, pk: int) -> Optional[int]:
+        key = self._entries.get(pk)
+        if key is None:
+            return None
+        return self._rank_of_key(key)
+
+    def page(self, number: int, per_page: int) -> list[tuple[int, int]]:
+        """Returns the (rank, pk) pairs on the 1-indexed page ``number``."""
+        start = (number - 1) * per_page
+        return [(self._rank_of_key(key), key[2]) for key in self._keys[start : start + per_page]]
+
+
+_lock = threading.Lock()
+_indexes: dict[str, RankIndex] = {}
+
+
+def get_index(name: str, load: Callable[[], Iterable[RankRow]], generation: int) -> RankIndex:
+    """Returns the index ``name``, (re)building it from ``load()`` unless it is at ``generation``."""
+    with _lock:
+        index = _indexes.get(name)
+        if index is None or index.generation != generation:
+            index = _indexes[name] = RankIndex(load(), generation)
+        return index
+
+
+def update(name: str, pk: int, points: int, last_correct_submission: datetime):
+    """Updates an entry of the index ``name`` if this process has loaded it."""
+    with _lock:
+        index = _indexes.get(name)
+        if index is not None:
+            index.update(pk, points, last_correct_submission)
+
+
+def advance(name: str, generation: int):
+    """
+    Moves the index ``name`` to ``generation`` after this process updated it and bumped the
+    generation, if it was at the previous one. Otherwise another process changed the scores in
+    between and the index is rebuilt when it is next used.
+    """
+    with _lock:
+        index = _indexes.get(name)
+        if index is not None and index.generation == generation - 1:
+            index.generation = generation
+
+
+def discard(name: str):
+    with _lock:
+        _indexes.pop(name, None)
+
+
+def discard_prefix(prefix: str):
+    with _lock:
+        for name in [name for name in _indexes if name.startswith(prefix)]:
+            del _indexes[name]
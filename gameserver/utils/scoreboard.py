@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from ..models import Contest, ContestParticipation, ContestProblem, ContestScore, ProblemType
+from ..models.cache import UNTYPED
+from ..templatetags.common_tags import strfdelta
+from . import cache as shared_cache
+from .ranking import RankIndex
+
+# Namespace of the generation bumped (see signals.py) whenever the problems of a contest or
+# their types change, so the cached problem type totals of every contest are reloaded
+PROBLEM_TYPES_GENERATION = "contest-problem-types"
+PROBLEM_TYPES_TIMEOUT = 60 * 60
+
+
+class ScoreboardRow(NamedTuple):
+    """What the scoreboard shows of a participation, without any lazy relations."""
+
+    participation_id: int
+    rank: int
+    name: str
+    is_team: bool
+    points: int
+    flags: int
+    time_taken: str
+
+    def get_absolute_url(self):
+        return reverse("contest_participation_detail", args=[self.participation_id])
+
+
+def time_taken(start_time: datetime, flags: int, last_correct_submission: datetime) -> str:
+    """Like ContestParticipation.time_taken, from the score cache."""
+    solve_time = max(last_correct_submission, start_time) if flags else start_time
+    return strfdelta(timedelta(seconds=round((solve_time - start_time).total_seconds())))
+
+
+def _solo_names(participation_ids: Iterable[int]) -> dict[int, str]:
+    return dict(
+        ContestParticipation.objects.filter(pk__in=participation_ids, team=None).values_list(
+            "pk", "participants__username"
+        )
+    )
+
+
+def rows_for(contest: Contest, scores: Iterable[ContestScore]) -> list[ScoreboardRow]:
+    """
+    The rows of ranked scores (ContestScore.ranks() or ranks_page()) in one query.
+
+    The scores must have their participation and team loaded (select_related), as the
+    scoreboard views do.
+    """
+    scores = list(scores)
+    solo_names = _solo_names(
+        [score.participation_id for score in scores if score.participation.team_id is None]
+    )
+    return [
+        ScoreboardRow(
+            participation_id=score.participation_id,
+            rank=score.rank,
+            name=(
+                score.participation.team.name
+                if score.participation.team_id is not None
+                else solo_names.get(score.participation_id, "")
+            ),
+            is_team=score.participation.team_id is not None,
+            points=score.points,
+            flags=score.flag_count,
+            time_taken=time_taken(
+                contest.start_time, score.flag_count, score.last_correct_submission
+            ),
+        )
+        for score in scores
+    ]
+
+
+def contest_rows(contest_id: int) -> list[ScoreboardRow]:
+    """The whole scoreboard of a contest in rank order, in three queries."""
+    start_time = Contest.objects.values_list("start_time", flat=True).get(pk=contest_id)
+    scores = {
+        pk: (points, flags, last, team)
+        for pk, points, flags, last, team in ContestScore.objects.filter(
+            participation__contest_id=contest_id
+        ).values_list(
+            "participation_id",
+            "points",
+            "flag_count",
+            "last_correct_submission",
+            "participation__team__name",
+        )
+    }
+    solo_names = _solo_names(pk for pk, (*_, team) in scores.items() if team is None)
+    index = RankIndex((pk, points, last) for pk, (points, _, last, _) in scores.items())
+
+    rows = []
+    for rank, pk in index.page(1, len(index)):
+        points, flags, last, team = scores[pk]
+        rows.append(
+            ScoreboardRow(
+                participation_id=pk,
+                rank=rank,
+                name=team if team is not None else solo_names.get(pk, ""),
+                is_team=team is not None,
+                points=points,
+                flags=flags,
+                time_taken=time_taken(start_time, flags, last),
+            )
+        )
+    return rows
+
+
+class ProblemTypeTotals(NamedTuple):
+    """How many problems of each type a contest has, as (solved_by_type key, name, count)."""
+
+    types: list[tuple[str, str, int]]
+    total: int
+
+
+def problem_type_totals(contest_id: int) -> ProblemTypeTotals:
+    """The problem type totals of a contest, cached until its problems or their types change."""
+    generation = shared_cache.get_generation(PROBLEM_TYPES_GENERATION)
+    key = f"contest-problem-types:{contest_id}:{generation}"
+    totals = cache.get(key)
+    if totals is None:
+        problem_ids = ContestProblem.objects.filter(contest_id=contest_id).values_list(
+            "problem_id", flat=True
+        )
+        counts = {}
+        for problem_type_keys in ContestScore.problem_type_keys(problem_ids).values():
+            for problem_type_key in problem_type_keys:
+                counts[problem_type_key] = counts.get(problem_type_key, 0) + 1
+        types = [
+            (str(pk), name, counts[str(pk)])
+            for pk, name in ProblemType.objects.values_list("pk", "name")
+            if str(pk) in counts
+        ]
+        if UNTYPED in counts:
+            types.append((UNTYPED, "Other", counts[UNTYPED]))
+        totals = ProblemTypeTotals(types, len(problem_ids))
+        cache.set(key, totals, PROBLEM_TYPES_TIMEOUT)
+    return totals
+
+
+def bump_problem_types_generation():
+    shared_cache.bump_generation(PROBLEM_TYPES_GENERATION)
+
+
+class ParticipationStats(NamedTuple):
+    """What the participation page shows of a participation's progress."""
+
+    rank: Optional[int]
+    points: int
+    flags: int
+    time_taken: str
+    last_solve: Optional[datetime]
+    # (name, solved, total) of every problem type in the contest
+    problem_types: list[tuple[str, int, int]]
+    total: int
+
+
+def participation_stats(participation: ContestParticipation) -> ParticipationStats:
+    """
+    The stats of a participation from its score cache row.
+
+    The participation must have its contest and score_cache loaded (select_related), which
+    makes this free of queries except for the rank index and problem type totals, which are
+    loaded once per contest and process or cache generation respectively.
+    """
+    contest = participation.contest
+    try:
+        score = participation.score_cache
+    except ContestScore.DoesNotExist:
+        score = ContestScore(participation=participation)
+    totals = problem_type_totals(contest.pk)
+    return ParticipationStats(
+        rank=ContestScore.rank_index(contest.pk).rank(participation.pk),
+        points=score.points,
+        flags=score.flag_count,
+        time_taken=time_taken(contest.start_time, score.flag_count, score.last_correct_submission),
+        last_solve=score.last_correct_submission if score.flag_count else None,
+        problem_types=[
+            (name, score.solved_by_type.get(key, 0), total) for key, name, total in totals.types
+        ],
+        total=totals.total,
+    )
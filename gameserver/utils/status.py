@@ -0,0 +1,43 @@
+class ProblemStatusMap:
+    """
+    The attempted, solved and first blood problems of a user or contest participation.
+
+    Each status is a set of problem ids, so a whole problem list can be loaded with one query
+    and looked up without any. ``contest_problems`` holds the problems of the user's current
+    contest, which are shown with the contest's statuses even when private.
+    """
+
+    def __init__(self):
+        self.attempted: set[int] = set()
+        self.solved: set[int] = set()
+        self.firstblood: set[int] = set()
+        self.contest_problems: set[int] = set()
+
+    def add(self, problem_id: int, solved: bool = False, firstblood: bool = False):
+        self.attempted.add(problem_id)
+        if solved:
+            self.solved.add(problem_id)
+        if firstblood:
+            self.firstblood.add(problem_id)
+
+    def has_attempted(self, problem_id: int) -> bool:
+        return problem_id in self.attempted
+
+    def has_solved(self, problem_id: int) -> bool:
+        return problem_id in self.solved
+
+    def has_firstblooded(self, problem_id: int) -> bool:
+        return problem_id in self.firstblood
+
+    def in_contest(self, problem_id: int) -> bool:
+        return problem_id in self.contest_problems
+
+    def status(self, problem_id: int) -> str:
+        if self.has_firstblooded(problem_id):
+            return "firstblood"
+        elif self.has_solved(problem_id):
+            return "solved"
+        elif self.has_attempted(problem_id):
+            return "attempted"
+        else:
+            return "unsolved"
@@ -0,0 +1,275 @@
+import atexit
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ..models import (
+    ContestProblem,
+    ContestScore,
+    ContestSubmission,
+    Problem,
+    QueuedSubmission,
+    Submission,
+    SubmissionFeed,
+    UserScore,
+)
+from . import catalogue, webhooks
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingSubmission:
+    """A flag submission whose verdict is known but which has not been written yet."""
+
+    user_id: int
+    problem_id: int
+    problem_points: int
+    problem_is_public: bool
+    is_correct: bool
+    content: Optional[str] = None
+    participation_id: Optional[int] = None
+    contest_id: Optional[int] = None
+    contest_problem_id: Optional[int] = None
+    contest_problem_points: Optional[int] = None
+    # when the flag was submitted, which ranks ties rather than when the batch was written
+    date_created: datetime = field(default_factory=timezone.now)
+
+
+def write_submissions(pending: list[PendingSubmission]):
+    """
+    Writes a batch of submissions and applies their score changes.
+
+    Submissions and contest submissions are inserted with bulk_create, and the score deltas
+    are aggregated per user/participation so every cache row is updated once per batch.
+    Correct submissions for problems that were already solved (before or earlier in the
+    batch) are still recorded, but do not change any score.
+
+    Everything is dated by when it was submitted, so submissions are applied in that order.
+    """
+    pending = sorted(pending, key=lambda p: p.date_created)
+    solved = set(
+        Submission.objects.filter(
+            is_correct=True,
+            user_id__in={p.user_id for p in pending if p.is_correct},
+            problem_id__in={p.problem_id for p in pending if p.is_correct},
+        ).values_list("user_id", "problem_id")
+    )
+    contest_solved = set(
+        ContestSubmission.objects.filter(
+            submission__is_correct=True,
+            participation_id__in={p.participation_id for p in pending if p.is_correct},
+            problem_id__in={p.contest_problem_id for p in pending if p.is_correct},
+        ).values_list("participation_id", "problem_id")
+    )
+
+    submissions = []
+    user_deltas = {}
+    contest_deltas = {}
+    contest_solves = []
+    for p in pending:
+        if p.is_correct:
+            new_solve = (p.user_id, p.problem_id) not in solved
+            new_contest_solve = (
+                p.participation_id is not None
+                and (p.participation_id, p.contest_problem_id) not in contest_solved
+            )
+            if new_solve:
+                solved.add((p.user_id, p.problem_id))
+                if p.problem_is_public:
+                    points, flags, _ = user_deltas.get(p.user_id, (0, 0, None))
+                    user_deltas[p.user_id] = (points + p.problem_points, flags + 1, p.date_created)
+            if new_contest_solve:
+                contest_solved.add((p.participation_id, p.contest_problem_id))
+                points, flags, _ = contest_deltas.get(p.participation_id, (0, 0, None))
+                contest_deltas[p.participation_id] = (
+                    points + p.contest_problem_points,
+                    flags + 1,
+                    p.date_created,
+                )
+                contest_solves.append((p.participation_id, p.problem_id))
+        submissions.append(
+            (
+                p,
+                Submission(
+                    user_id=p.user_id,
+                    problem_id=p.problem_id,
+                    is_correct=p.is_correct,
+                    content=p.content,
+                    date_created=p.date_created,
+                ),
+            )
+        )
+
+    with transaction.atomic():
+        Submission.objects.bulk_create([submission for _, submission in submissions])
+        SubmissionFeed.objects.bulk_create(
+            [
+                SubmissionFeed.entry_for(submission, p.problem_is_public, p.contest_id)
+                for p, submission in submissions
+            ]
+        )
+        contest_submissions = ContestSubmission.objects.bulk_create(
+            [
+                ContestSubmission(
+                    participation_id=p.participation_id,
+                    problem_id=p.contest_problem_id,
+                    submission=submission,
+                )
+                for p, submission in submissions
+                if p.participation_id is not None
+            ]
+        )
+        UserScore.add_scores(user_deltas)
+        ContestScore.add_scores(contest_deltas)
+        ContestScore.add_solved_types(contest_solves)
+
+        firstbloods = {}
+        for _, submission in submissions:
+            if submission.is_correct and submission.problem_id not in firstbloods:
+                firstbloods[submission.problem_id] = submission
+        for problem_id, submission in firstbloods.items():
+            Problem.objects.filter(pk=problem_id, firstblood=None).update(firstblood=submission)
+
+        contest_firstbloods = {}
+        for contest_submission in contest_submissions:
+            if (
+                contest_submission.submission.is_correct
+                and contest_submission.problem_id not in contest_firstbloods
+            ):
+                contest_firstbloods[contest_submission.problem_id] = contest_submission.pk
+        webhooks.enqueue_first_bloods(
+            [
+                contest_submission_id
+                for problem_id, contest_submission_id in contest_firstbloods.items()
+                if ContestProblem.claim_first_blood(problem_id, contest_submission_id)
+            ]
+        )
+
+        transaction.on_commit(lambda: _submissions_written(pending))
+
+
+def _submissions_written(pending):
+    # the contest generations are bumped along with the scores (see ContestScore.add_scores)
+    catalogue.invalidate_solved({p.user_id for p in pending if p.is_correct})
+
+
+def _queued(pending: PendingSubmission) -> QueuedSubmission:
+    fields = asdict(pending)
+    return QueuedSubmission(date_created=fields.pop("date_created"), submission=fields)
+
+
+def _pending(queued: QueuedSubmission) -> PendingSubmission:
+    return PendingSubmission(**queued.submission, date_created=queued.date_created)
+
+
+class SubmissionQueue:
+    """
+    Writes queued submissions in batches from a background thread.
+
+    Requests store every submission as a QueuedSubmission row before answering, so no accepted
+    solve is lost with the worker that accepted it. The thread writes up to ``batch_size`` rows
+    at a time, deleting them in the same transaction, once ``batch_size`` submissions were
+    queued here or ``flush_interval`` seconds after the first one, whichever comes first. Rows
+    are locked while they are written, so the threads of all workers share one queue. Rows left
+    behind by a worker that died are written by the next flush of any other, by the first flush
+    of a new worker, or by the ``flush_submissions`` command.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def put(self, pending: PendingSubmission):
+        _queued(pending).save()
+        with self._condition:
+            if self._worker is None:
+                # only drain the queue at exit in processes that wrote to it
+                atexit.register(self.flush)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="submission-queue", daemon=True
+                )
+                self._worker.start()
+            self._queued += 1
+            self._condition.notify()
+
+    def _wait(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._queued)
+            deadline = time.monotonic() + self.flush_interval
+            while self._queued < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._condition.wait(timeout)
+            self._queued = 0
+
+    def _run(self):
+        while True:
+            self._wait()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                # the rows stay queued for the next flush
+                logger.exception("Failed to flush the submission queue")
+            close_old_connections()
+
+    def _write(self, batch: list[PendingSubmission]):
+        try:
+            with transaction.atomic():
+                write_submissions(batch)
+        except Exception:
+            logger.exception(f"Failed to write a batch of {len(batch)} submissions, retrying each")
+            # one bad submission should not lose the rest of the batch
+            for pending in batch:
+                try:
+                    with transaction.atomic():
+                        write_submissions([pending])
+                except Exception:
+                    logger.exception(f"Dropped submission {pending}")
+
+    def _write_batch(self) -> int:
+        with transaction.atomic():
+            queued = list(
+                QueuedSubmission.objects.select_for_update(skip_locked=True).order_by("pk")[
+                    : self.batch_size
+                ]
+            )
+            if queued:
+                self._write([_pending(row) for row in queued])
+                QueuedSubmission.objects.filter(pk__in=[row.pk for row in queued]).delete()
+        return len(queued)
+
+    def flush(self):
+        """Writes every queued submission, including those of other workers, from this thread."""
+        while self._write_batch() == self.batch_size:
+            pass
+
+
+submission_queue = SubmissionQueue(
+    batch_size=settings.SUBMISSION_QUEUE["batch_size"],
+    flush_interval=settings.SUBMISSION_QUEUE["flush_interval"],
+)
+
+
+def submit(pending: PendingSubmission):
+    # without skip_locked (SQLite) the workers could not share the queue
+    if (
+        settings.SUBMISSION_QUEUE["enabled"]
+        and connection.features.has_select_for_update_skip_locked
+    ):
+        submission_queue.put(pending)
+    else:
+        write_submissions([pending])
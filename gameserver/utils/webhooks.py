@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Iterable, Optional
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import ContestParticipation, ContestSubmission, WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+# Discord rejects messages longer than this
+DISCORD_MAX_CONTENT = 2000
+
+
+def is_discord(webhook: str):
+    return webhook.startswith("https://discord.com/api")
+
+
+def first_blood_payloads(contest_submission_ids: Iterable[int]) -> list[tuple[str, object]]:
+    """The (webhook, payload) pairs announcing the given first bloods, in two queries."""
+    contest_submissions = list(
+        ContestSubmission.objects.filter(pk__in=contest_submission_ids)
+        .exclude(participation__contest__first_blood_webhook="")
+        .select_related("participation__contest", "participation__team", "problem__problem")
+        .order_by("pk")
+    )
+    if not contest_submissions:
+        return []
+    solo_participants = {
+        participation.pk: participation.participants.all()[0]
+        for participation in ContestParticipation.objects.filter(
+            pk__in=[
+                contest_submission.participation_id
+                for contest_submission in contest_submissions
+                if contest_submission.participation.team_id is None
+            ]
+        ).prefetch_related("participants")
+        if participation.participants.all()
+    }
+    base_url = "https://" + Site.objects.get_current().domain
+
+    payloads = []
+    for contest_submission in contest_submissions:
+        try:
+            payloads.append(_first_blood_payload(contest_submission, solo_participants, base_url))
+        except Exception:
+            logger.exception(f"Failed to build the first blood webhook of {contest_submission.pk}")
+    return payloads
+
+
+def _first_blood_payload(contest_submission, solo_participants, base_url) -> tuple[str, object]:
+    participation = contest_submission.participation
+    participant = participation.team or solo_participants[participation.pk]
+    problem = contest_submission.problem
+    content = (
+        f"First blood on [{problem.problem}]({base_url + problem.get_absolute_url()})"
+        f" by [{participant}]({base_url + participant.get_absolute_url()})!"
+    )
+    webhook = participation.contest.first_blood_webhook
+    if is_discord(webhook):
+        payload = {
+            "username": f"{participation.contest.name} First Blood Notifier",
+            "avatar_url": base_url + "/static/favicon.png",
+            "content": content,
+        }
+    else:
+        payload = content  # only send the content to non-discord webhooks
+    return webhook, payload
+
+
+def enqueue_first_bloods(contest_submission_ids: Iterable[int]):
+    """
+    Adds deliveries for the given first bloods; call it in the transaction writing them.
+
+    Deliveries are added in a savepoint and failures are only logged, so a notification that
+    cannot be sent never rolls back the submissions it reports.
+    """
+    try:
+        with transaction.atomic():
+            WebhookDelivery.objects.bulk_create(
+                [
+                    WebhookDelivery(url=webhook, payload=payload)
+                    for webhook, payload in first_blood_payloads(contest_submission_ids)
+                ]
+            )
+    except Exception:
+        logger.exception("Failed to enqueue first blood webhooks")
+
+
+def _mergeable(last, payload) -> bool:
+    if isinstance(last, str) and isinstance(payload, str):
+        return len(last) + 1 + len(payload) <= DISCORD_MAX_CONTENT
+    if isinstance(last, dict) and isinstance(payload, dict):
+        return (
+            last.keys() == payload.keys()
+            and all(last[key] == payload[key] for key in last if key != "content")
+            and len(last["content"]) + 1 + len(payload["content"]) <= DISCORD_MAX_CONTENT
+        )
+    return False
+
+
+def merge(deliveries: list[WebhookDelivery]) -> list[tuple[object, list[WebhookDelivery]]]:
+    """
+    Merges a burst of deliveries to one endpoint into as few messages as possible.
+
+    Text payloads are joined line by line, as are the contents of Discord messages sent by the
+    same notifier, keeping each message under Discord's length limit. Returns each message
+    with the deliveries it carries.
+    """
+    messages = []
+    for delivery in deliveries:
+        payload = delivery.payload
+        if messages and _mergeable(messages[-1][0], payload):
+            last, merged = messages[-1]
+            if isinstance(payload, str):
+                messages[-1] = (f"{last}\n{payload}", merged + [delivery])
+            else:
+                content = f"{last['content']}\n{payload['content']}"
+                messages[-1] = (last | {"content": content}, merged + [delivery])
+        else:
+            messages.append((payload, [delivery]))
+    return messages
+
+
+class Dispatcher:
+    """
+    Sends due webhook deliveries through one pooled HTTP session.
+
+    Deliveries are grouped by endpoint and bursts are merged (see merge). An endpoint that
+    answers 429 is left alone until its Retry-After has passed, without using up attempts;
+    other failures are retried with exponential backoff until max_attempts.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = settings.WEBHOOKS | (config or {})
+        # endpoint -> monotonic time until which it is rate limited
+        self.blocked_until = {}
+
+    def _due(self, blocked: list[str]) -> list[WebhookDelivery]:
+        """
+        Claims the due deliveries to endpoints that are not rate limited.
+
+        The rows are locked while they are claimed and then leased out for ``lease`` seconds,
+        so concurrent dispatchers skip them; _finish sets when they are due next.
+        """
+        close_old_connections()
+        now = timezone.now()
+        with transaction.atomic():
+            due = list(
+                WebhookDelivery.objects.filter(next_attempt__lte=now)
+                .exclude(url__in=blocked)
+                .select_for_update(skip_locked=True)
+                .order_by("pk")[: self.config["batch_size"]]
+            )
+            WebhookDelivery.objects.filter(pk__in=[delivery.pk for delivery in due]).update(
+                next_attempt=now + timedelta(seconds=self.config["lease"])
+            )
+        return due
+
+    def _finish(self, deliveries, status: Optional[int], error: str, retry_after=None):
+        now = timezone.now()
+        for delivery in deliveries:
+            if status is not None and 200 <= status < 300:
+                delivery.date_delivered = now
+                delivery.next_attempt = None
+            elif retry_after is not None:
+                delivery.next_attempt = now + timedelta(seconds=retry_after)
+            else:
+                delivery.attempts += 1
+                if delivery.attempts >= self.config["max_attempts"]:
+                    logger.error(f"Giving up on {delivery} after {delivery.attempts} attempts")
+                    delivery.next_attempt = None
+                else:
+                    backoff = self.config["backoff"] * 2 ** (delivery.attempts - 1)
+                    delivery.next_attempt = now + timedelta(seconds=backoff)
+            delivery.last_error = error
+        WebhookDelivery.objects.bulk_update(
+            deliveries, ["date_delivered", "next_attempt", "attempts", "last_error"]
+        )
+
+    async def _send(self, session: aiohttp.ClientSession, url: str, deliveries: list):
+        messages = merge(deliveries)
+        for i, (payload, merged) in enumerate(messages):
+            status, error, retry_after = None, "", None
+            try:
+                async with session.post(url, json=payload) as resp:
+                    status = resp.status
+                    if status == 429:
+                        retry_after = float(resp.headers.get("Retry-After", 1))
+                        if resp.content_type == "application/json":
+                            retry_after = float((await resp.json()).get("retry_after", retry_after))
+                        self.blocked_until[url] = time.monotonic() + retry_after
+                    if not 200 <= status < 300:
+                        error = f"{status}: {await resp.text()}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+
+            if retry_after is not None:
+                # postpone the rest of the burst too, without using up their attempts
+                merged = [delivery for _, rest in messages[i:] for delivery in rest]
+                await sync_to_async(self._finish)(merged, status, error, retry_after)
+                return
+            if error:
+                logger.warning(f"Failed to send webhook to {url}: {error}")
+            await sync_to_async(self._finish)(merged, status, error)
+
+    async def run(self, once: bool = False):
+        timeout = aiohttp.ClientTimeout(total=self.config["timeout"])
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                blocked = [
+                    url for url, until in self.blocked_until.items() if until > time.monotonic()
+                ]
+                due = await sync_to_async(self._due)(blocked)
+                by_url = {}
+                for delivery in due:
+                    by_url.setdefault(delivery.url, []).append(delivery)
+                await asyncio.gather(
+                    *(self._send(session, url, deliveries) for url, deliveries in by_url.items())
+                )
+                if once:
+                    return
+                if len(due) < self.config["batch_size"]:
+                    await asyncio.sleep(self.config["poll_interval"])
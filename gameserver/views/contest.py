@@ -1,17 +1,22 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Count, Q
-from django.http import HttpResponseForbidden
-from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, ListView
-from django.views.generic.base import RedirectView
+from django.views.generic.base import RedirectView, View
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormMixin
 
 from .. import forms, models
 from ..models import ContestScore
+from ..utils import export, live_scoreboard, scoreboard
+from ..utils.status import ProblemStatusMap
 from . import mixin
 
 
@@ -27,12 +32,14 @@ class ContestList(ListView, mixin.MetaMixin):
 class ContestDetail(
     UserPassesTestMixin,
     FormMixin,
+    mixin.SingleObjectCacheMixin,
     DetailView,
     mixin.MetaMixin,
     mixin.CommentMixin,
 ):
     model = models.Contest
     template_name = "contest/detail.html"
+    query_budget = 25
     context_object_name = "contest"
     form_class = forms.ContestJoinForm
 
@@ -133,9 +140,7 @@ class ContestDetail(
             else:
                 context["team_participant_count"] = data
 
-        top_participations = self.object.ranks()  # .prefetch_related("team", "participants"),
-        # print(top_participations.first().participation.contest)
-        context["top_participations"] = top_participations[:10]
+        context["top_participations"] = ContestScore.ranks_page(self.object, per_page=10)
 
         return context
 
@@ -170,12 +175,28 @@ class ContestProblemList(ContestDetailsMixin, ListView, mixin.MetaMixin):
         return "Problems for " + self.object.name
 
     def get_queryset(self):
-        return self.object.problems.only(
-            "problem", "problem__problem_type", "points"
-        ).select_related("problem")
+        return self.object.problems.select_related("problem").prefetch_related(
+            "problem__problem_type"
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.user.is_authenticated:
+            if self.request.in_contest and self.request.participation.contest == self.object:
+                participation = self.request.participation
+            else:
+                participation = self.request.user.participation_for_contest(self.object)
+            context["problem_statuses"] = (
+                participation.problem_status_map()
+                if participation is not None
+                else ProblemStatusMap()
+            )
+        return context
 
 
-class ContestSubmissionList(ContestDetailsMixin, ListView, mixin.MetaMixin):
+class ContestSubmissionList(
+    ContestDetailsMixin, mixin.CursorPaginationMixin, ListView, mixin.MetaMixin
+):
     template_name = "contest/submission_list.html"
     paginate_by = 50
 
@@ -191,6 +212,7 @@ class ContestSubmissionList(ContestDetailsMixin, ListView, mixin.MetaMixin):
 class ContestScoreboard(SingleObjectMixin, ListView, mixin.MetaMixin):
     model = models.ContestParticipation
     template_name = "contest/scoreboard.html"
+    query_budget = 20
     paginate_by = 50
 
     def get_title(self):
@@ -200,9 +222,7 @@ class ContestScoreboard(SingleObjectMixin, ListView, mixin.MetaMixin):
         if self.model.cache.should_reset(self.request):
             ContestScore.reset_data(contest=self.object)
 
-        ranks = ContestScore.ranks(contest=self.object).select_related(
-            "participation__team"
-        )  # select related reduces queries from around 54 to 17ish so 8ms to 5ms
+        ranks = ContestScore.ranks(contest=self.object).select_related("participation__team")
 
         query = self.request.GET.get("q")
 
@@ -224,6 +244,7 @@ class ContestScoreboard(SingleObjectMixin, ListView, mixin.MetaMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["contest"] = self.object
+        context["scoreboard_rows"] = scoreboard.rows_for(self.object, context["object_list"])
 
         # Calculate time taken for each participation
         # for contest_score in context["object_list"]:
@@ -234,6 +255,51 @@ class ContestScoreboard(SingleObjectMixin, ListView, mixin.MetaMixin):
         return context
 
 
+class ContestScoreboardStream(View):
+    """
+    Server-sent events with the scoreboard of a contest and then its changes.
+
+    Only served when settings.LIVE_SCOREBOARD is on and the request came through ASGI: under
+    WSGI the endless stream would be buffered whole and hold a sync worker until it times out.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not settings.LIVE_SCOREBOARD or not isinstance(request, ASGIRequest):
+            raise Http404()
+        contest = await aget_object_or_404(models.Contest, slug=self.kwargs["slug"])
+        if not await sync_to_async(contest.is_visible_by)(request.user):
+            raise Http404()
+        return StreamingHttpResponse(
+            live_scoreboard.stream(contest.pk),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+class ContestExport(UserPassesTestMixin, SingleObjectMixin, View):
+    """Streams every submission or score of a contest as NDJSON (default) or CSV."""
+
+    model = models.Contest
+
+    def test_func(self):
+        self.object = self.get_object()
+        return self.object.is_editable_by(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        table = self.kwargs["table"]
+        format = request.GET.get("format", "ndjson")
+        if table not in export.TABLES or format not in export.FORMATS:
+            raise Http404("No such export.")
+        _, content_type = export.FORMATS[format]
+        return StreamingHttpResponse(
+            export.export(self.object, table, format),
+            content_type=content_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="{self.object.slug}-{table}.{format}"'
+            },
+        )
+
+
 class ContestOrganizationScoreboard(ListView, mixin.MetaMixin):
     model = models.ContestParticipation
     template_name = "contest/scoreboard.html"
@@ -258,14 +324,19 @@ class ContestOrganizationScoreboard(ListView, mixin.MetaMixin):
         context = super().get_context_data(**kwargs)
         context["contest"] = self.contest
         context["org"] = self.org
+        context["scoreboard_rows"] = scoreboard.rows_for(self.contest, context["object_list"])
         return context
 
 
 class ContestParticipationDetail(DetailView, mixin.MetaMixin, mixin.CommentMixin):
     model = models.ContestParticipation
     template_name = "contest/participation.html"
+    query_budget = 20
     context_object_name = "participation"
 
+    def get_queryset(self):
+        return super().get_queryset().select_related("contest", "score_cache")
+
     def get_title(self):
         return self.object.__str__()
 
@@ -276,46 +347,16 @@ class ContestParticipationDetail(DetailView, mixin.MetaMixin, mixin.CommentMixin
         context = super().get_context_data(**kwargs)
 
         context["recent_contest_submissions"] = self.object.submissions.order_by("-pk")[:10]
-
-        contest_problems = self.object.contest.problems
-        participant_submissions = self.object._get_unique_correct_submissions()
-
-        context["problem_types"] = {
-            ptype: {
-                "total": ptype.pc,
-                "solved": ptype.pcc,
-            }
-            for ptype in models.ProblemType.objects.annotate(
-                pc=Count("problems", filter=Q(problems__in=contest_problems.values("problem"))),
-                pcc=Count(
-                    "problems",
-                    filter=Q(
-                        problems__in=contest_problems.filter(
-                            submission__in=participant_submissions.values("pk")
-                        ).values("problem")
-                    ),
-                ),
-            )
-        }
-
-        if pus := contest_problems.filter(problem__problem_type=None):
-            context["problem_types"]["Other"] = {
-                "total": pus.count(),
-                "solved": participant_submissions.filter(
-                    problem__problem__problem_type=None
-                ).count(),
-            }
-
-        # new queries instead of summation in case a problem has multiple problem_types
-        context["problem_types_total"] = {
-            "total": contest_problems.count(),
-            "solved": self.object.flags,
-        }
+        context["stats"] = scoreboard.participation_stats(self.object)
         return context
 
 
 class ContestParticipationSubmissionList(
-    UserPassesTestMixin, SingleObjectMixin, ListView, mixin.MetaMixin
+    UserPassesTestMixin,
+    SingleObjectMixin,
+    mixin.CursorPaginationMixin,
+    ListView,
+    mixin.MetaMixin,
 ):
     template_name = "contest/submission_list.html"
     paginate_by = 50
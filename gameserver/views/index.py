@@ -1,8 +1,14 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.utils import timezone
+from django.views import View
 from django.views.generic import DetailView, ListView
 
 import gameserver.models as models
 
+from ..utils import metrics
 from . import mixin
 
 
@@ -55,3 +61,17 @@ class Writeup(DetailView, mixin.MetaMixin, mixin.CommentMixin):
 
     def get_description(self):
         return self.object.summary
+
+
+class Metrics(View):
+    """The request metrics of every process in the Prometheus format, for a bearer of the token."""
+
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS["token"]
+        authorization = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+            raise Http404()
+        return HttpResponse(
+            metrics.prometheus(metrics.shared_totals()),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
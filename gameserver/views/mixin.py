@@ -1,7 +1,11 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.db import connections
+from django.http import Http404
 from django.views.generic.base import ContextMixin
 
 from .. import models
@@ -9,6 +13,96 @@ from .. import models
 User = get_user_model()
 
 
+class SingleObjectCacheMixin:
+    """Fetches the object of a SingleObjectMixin view once, however often get_object is called."""
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+
+class CursorPage:
+    """A page of a cursor paginated list, with the pks to continue from in either direction."""
+
+    cursor = True
+
+    def __init__(self, object_list, has_previous, has_next, count=None):
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+        # approximate total number of objects, if requested and available
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    @property
+    def previous_cursor(self):
+        return self.object_list[0].pk if self.object_list else None
+
+    @property
+    def next_cursor(self):
+        return self.object_list[-1].pk if self.object_list else None
+
+
+def estimate_count(queryset):
+    """The planner's row estimate for ``queryset`` on PostgreSQL, or None elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class CursorPaginationMixin:
+    """
+    Paginates a ListView ordered by descending pk with ``?before=<pk>``/``?after=<pk>`` cursors.
+
+    Each page is one indexed range query on pk, however deep it is, and no total count is
+    made. Set ``approximate_count`` to show the planner's estimate of the total instead.
+    """
+
+    approximate_count = False
+
+    def _cursor(self, name):
+        value = self.request.GET.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise Http404("Invalid cursor")
+
+    def paginate_queryset(self, queryset, page_size):
+        before, after = self._cursor("before"), self._cursor("after")
+        count = estimate_count(queryset) if self.approximate_count else None
+        if after is not None:
+            rows = list(queryset.filter(pk__gt=after).order_by("pk")[: page_size + 1])
+            has_previous = len(rows) > page_size
+            object_list = rows[:page_size][::-1]
+            page = CursorPage(object_list, has_previous, True, count)
+        else:
+            if before is not None:
+                queryset = queryset.filter(pk__lt=before)
+            rows = list(queryset.order_by("-pk")[: page_size + 1])
+            page = CursorPage(rows[:page_size], before is not None, len(rows) > page_size, count)
+        return None, page, page.object_list, page.has_other_pages()
+
+
 class MetaMixin(ContextMixin):
     og_type = "website"
     title = ""
@@ -1,10 +1,10 @@
 import logging
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Q
-from django.http import HttpResponseForbidden, JsonResponse
-from django.shortcuts import redirect
+from django.http import FileResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.views import View
 from django.views.generic import DetailView, ListView
@@ -12,8 +12,14 @@ from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormMixin
 
 from .. import forms, models
+from ..utils import catalogue, submissions
 from . import mixin
 
+try:
+    from storages.backends.s3boto3 import S3Boto3Storage
+except ImportError:  # only installed for S3 storage
+    S3Boto3Storage = None
+
 logger = logging.getLogger("django")
 
 
@@ -25,24 +31,32 @@ def int_list(l):
 
 class ProblemList(ListView, mixin.MetaMixin):
     template_name = "problem/list.html"
+    query_budget = 20
     context_object_name = "problems"
     paginate_by = 35
     title = "Practice Problems"
 
     def get_queryset(self):
+        groups = self.selected_groups if not self.request.in_contest else None
+        if catalogue.covers(self.request.user):
+            exclude = ()
+            if self.hide_solved and self.request.user.is_authenticated:
+                exclude = catalogue.solved_problem_ids(self.request.user)
+            return self.catalogue.search(
+                types=self.selected_types, groups=groups, text=self.nfts, exclude=exclude
+            )
+
+        # the user can see private problems, which are not in the catalogue
         base = models.Problem.get_visible_problems(self.request.user).prefetch_related(
             "problem_type", "problem_group"
         )
-        
+
         if self.selected_types is not None:
             base = base.filter(problem_type__in=self.selected_types)
-        if self.selected_groups is not None and not self.request.in_contest:
-            base = base.filter(problem_group__in=self.selected_groups)
-            
-        q = (
-            base.distinct()
-            .order_by("points", "name")
-        )
+        if groups is not None:
+            base = base.filter(problem_group__in=groups)
+
+        q = base.distinct().order_by("points", "name")
         if self.hide_solved and self.request.user.is_authenticated:
             q = q.exclude(
                 submission__in=self.request.user.submissions.filter(is_correct=True).all()
@@ -57,6 +71,7 @@ class ProblemList(ListView, mixin.MetaMixin):
         self.show_groups = request.GET.get("show_groups", False) == "1"
         self.hide_solved = request.GET.get("hide_solved", False) == "1"
         self.nfts = request.GET.get("nfts", None)
+        self.catalogue = catalogue.get_catalogue()
 
         if request.in_contest:
             return redirect("contest_problem_list", slug=request.participation.contest.slug)
@@ -67,25 +82,30 @@ class ProblemList(ListView, mixin.MetaMixin):
         context = super().get_context_data(**kwargs)
         context["problem_filters"] = {
             "type": {
-                "options": list(models.ProblemType.objects.all()),
+                "options": self.catalogue.types,
                 "selected": self.selected_types,
-                "size": min(len(models.ProblemType.objects.all()), 6),
+                "size": min(len(self.catalogue.types), 6),
             },
             "group": {
-                "options": list(models.ProblemGroup.objects.all()),
+                "options": self.catalogue.groups,
                 "selected": self.selected_groups,
-                "size": min(len(models.ProblemGroup.objects.all()), 4),
+                "size": min(len(self.catalogue.groups), 4),
             },
         }
 
         context["show_filter"] = True
         context["show_groups"] = self.show_groups
         context["hide_solved"] = self.hide_solved
+        if self.request.user.is_authenticated:
+            context["problem_statuses"] = self.request.user.problem_status_map(
+                [problem.pk for problem in context["problems"]]
+            )
         return context
 
 
 class ProblemDetail(
     UserPassesTestMixin,
+    mixin.SingleObjectCacheMixin,
     DetailView,
     FormMixin,
     mixin.MetaMixin,
@@ -93,6 +113,7 @@ class ProblemDetail(
 ):
     model = models.Problem
     template_name = "problem/detail.html"
+    query_budget = 25
     form_class = forms.FlagSubmissionForm
 
     def get_title(self):
@@ -114,7 +135,7 @@ class ProblemDetail(
             return None
 
     def test_func(self):
-        return self.get_object().is_accessible_by(self.request.user)
+        return self.object.is_accessible_by(self.request.user)
 
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -133,31 +154,21 @@ class ProblemDetail(
     def _create_submission_object(self, form, is_correct=None):
         if is_correct is None:
             raise TypeError("is_correct must be supplied")
-        kwargs = {}
-        if self.object.log_submission_content:
-            kwargs["content"] = form.data["flag"]
-        submission = models.Submission.objects.create(
-            user=self.request.user,
-            problem=self.object,
+        pending = submissions.PendingSubmission(
+            user_id=self.request.user.pk,
+            problem_id=self.object.pk,
+            problem_points=self.object.points,
+            problem_is_public=self.object.is_public,
             is_correct=is_correct,
-            **kwargs,
+            content=form.data["flag"] if self.object.log_submission_content else None,
         )
-        if is_correct and self.object.firstblood is None:
-            self.object.firstblood = submission
         if self.contest_object is not None:
-            models.ContestSubmission.objects.create(
-                problem=self.contest_object,
-                submission=submission,
-                participation=self.request.participation,
-            )
-            models.ContestScore.update_or_create(
-                participant=self.request.participation,
-                change_in_score=self.object.points,
-                update_flags=True,
-            )
-            if is_correct:
-                pass
-        return submission
+            pending.participation_id = self.request.participation.pk
+            pending.contest_id = self.contest_object.contest_id
+            pending.contest_problem_id = self.contest_object.pk
+            pending.contest_problem_points = self.contest_object.points
+        # possibly written in batches by a background worker, the verdict does not depend on it
+        submissions.submit(pending)
 
     def get_form_kwargs(self, *args, **kwargs):
         cur_kwargs = super().get_form_kwargs(*args, **kwargs)
@@ -232,7 +243,40 @@ class ProblemChallenge(LoginRequiredMixin, SingleObjectMixin, View):
             return HttpResponseForbidden()
 
 
-class ProblemSubmissionList(SingleObjectMixin, ListView, mixin.MetaMixin):
+class ProblemFileDownload(UserPassesTestMixin, View):
+    """
+    Serves a problem file once the user may access the problem.
+
+    With S3 this redirects to a short-lived presigned URL naming the file for the download, so
+    files (and range requests for them) never go through Django.
+    """
+
+    def test_func(self):
+        self.object = get_object_or_404(
+            models.ProblemFile.objects.select_related("problem"),
+            pk=self.kwargs["pk"],
+            problem__slug=self.kwargs["slug"],
+        )
+        return self.object.problem.is_accessible_by(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        artifact = self.object.artifact
+        if S3Boto3Storage is not None and isinstance(artifact.storage, S3Boto3Storage):
+            url = artifact.storage.url(
+                artifact.name,
+                parameters={
+                    "ResponseContentDisposition": f'attachment; filename="{self.object.file_name}"'
+                },
+                expire=settings.PROBLEM_FILE_URL_EXPIRY,
+            )
+            return redirect(url)
+        # stored under their checksum, so other storages are served with the name set here
+        return FileResponse(artifact.open("rb"), as_attachment=True, filename=self.object.file_name)
+
+
+class ProblemSubmissionList(
+    SingleObjectMixin, mixin.CursorPaginationMixin, ListView, mixin.MetaMixin
+):
     template_name = "submission/list.html"
     paginate_by = 50
 
@@ -240,18 +284,19 @@ class ProblemSubmissionList(SingleObjectMixin, ListView, mixin.MetaMixin):
         return "Submissions for " + self.object.name
 
     def get_queryset(self):
-        qs = (
-            models.Submission.get_visible_submissions(self.request.user)
-            .filter(problem=self.object)
-            .select_related("user")
-            .order_by("-pk")
-        )
         if self.request.in_contest and self.request.participation.contest.has_problem(self.object):
-            return qs.filter(
-                contest_submission__participation__contest=self.request.participation.contest
+            return (
+                models.Submission.get_visible_submissions(self.request.user)
+                .filter(
+                    problem=self.object,
+                    contest_submission__participation__contest=self.request.participation.contest,
+                )
+                .select_related("user")
+                .order_by("-pk")
             )
-        else:
-            return qs
+        return models.SubmissionFeed.listing(
+            models.SubmissionFeed.get_visible_entries(self.request.user).filter(problem=self.object)
+        ).order_by("-pk")
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object(queryset=models.Problem.objects.all())
@@ -5,18 +5,17 @@ from .. import models
 from . import mixin
 
 
-class SubmissionList(ListView, mixin.MetaMixin):
+class SubmissionList(mixin.CursorPaginationMixin, ListView, mixin.MetaMixin):
     template_name = "submission/list.html"
+    query_budget = 20
     paginate_by = 50
+    approximate_count = True
     title = "Submissions"
 
     def get_queryset(self):
-        return (
-            models.Submission.get_visible_submissions(self.request.user)
-            .only("pk", "is_correct", "problem", "user", "date_created")
-            .select_related("user", "problem")
-            .order_by("-pk")
-        )
+        return models.SubmissionFeed.listing(
+            models.SubmissionFeed.get_visible_entries(self.request.user)
+        ).order_by("-pk")
 
     def get(self, request, *args, **kwargs):
         if request.in_contest:
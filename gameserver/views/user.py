@@ -64,7 +64,7 @@ class UserDetail(DetailView, mixin.MetaMixin, mixin.CommentMixin):
         return [self.object]
 
 
-class UserSubmissionList(SingleObjectMixin, ListView, mixin.MetaMixin):
+class UserSubmissionList(SingleObjectMixin, mixin.CursorPaginationMixin, ListView, mixin.MetaMixin):
     slug_field = "username"
     template_name = "submission/list.html"
     paginate_by = 50
@@ -73,13 +73,9 @@ class UserSubmissionList(SingleObjectMixin, ListView, mixin.MetaMixin):
         return "Submissions by User " + self.object.username
 
     def get_queryset(self):
-        return (
-            models.Submission.get_visible_submissions(self.request.user)
-            .filter(user=self.object)
-            .only("pk", "is_correct", "problem", "user", "date_created")
-            .select_related("user", "problem")
-            .order_by("-pk")
-        )
+        return models.SubmissionFeed.listing(
+            models.SubmissionFeed.get_visible_entries(self.request.user).filter(user=self.object)
+        ).order_by("-pk")
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object(queryset=models.User.objects.all())
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "gameserver.middleware.MetricsMiddleware",
+    # ↑ keep first to count the queries of every other middleware
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -67,10 +69,12 @@ MIDDLEWARE = [
     # ↑ keep last to log errors from middlewares
 ]
 
+# Shared by every worker process; see gameserver/utils/cache.py for the versioned keys
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "CTFx",
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379",
+        "KEY_PREFIX": "CTFx",
     }
 }
 
@@ -200,6 +204,14 @@ AWS_SECRET_ACCESS_KEY = ""
 AWS_STORAGE_BUCKET_NAME = ""
 AWS_S3_FILE_OVERWRITE = False
 
+# Uploads are hashed as they are received, so problem files are never read again to checksum them
+FILE_UPLOAD_HANDLERS = [
+    "gameserver.uploadhandlers.HashingMemoryFileUploadHandler",
+    "gameserver.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+# How long (in seconds) the presigned URLs problem files are downloaded from stay valid
+PROBLEM_FILE_URL_EXPIRY = 5 * 60
+
 # NavBar settings
 
 NAVBAR = {
@@ -285,6 +297,38 @@ CHALLENGE_CLUSTER = {
 }
 
 
+# Access settings
+# Keep the ids behind each user's access checks in the cache between requests
+ACCESS_CACHE = {"enabled": True, "timeout": 5 * 60}
+
+# Webhook settings
+# Used by the deliver_webhooks worker: deliveries are polled every poll_interval seconds in
+# batches of batch_size, and failures retried after backoff * 2^(attempt - 1) seconds. Claimed
+# deliveries are skipped by other workers for lease seconds, after which a crashed worker's are
+# sent again
+WEBHOOKS = {
+    "poll_interval": 1,
+    "batch_size": 100,
+    "max_attempts": 8,
+    "backoff": 5,
+    "timeout": 10,
+    "lease": 5 * 60,
+}
+
+# Submission settings
+
+# When enabled, flag submissions are stored in a queue table during the request and written by
+# a background worker in batches of up to batch_size, at most flush_interval seconds after they
+# were made. Solves then show up (and are checked for duplicates) only once written, and the
+# database must support SELECT ... FOR UPDATE SKIP LOCKED; otherwise they are written during
+# the request.
+SUBMISSION_QUEUE = {
+    "enabled": False,
+    "batch_size": 100,
+    "flush_interval": 0.5,
+}
+
+
 # Other settings
 
 SITE_ID = 1
@@ -297,6 +341,27 @@ DEFAULT_TIMEZONE = "UTC"
 
 MISTUNE_PLUGINS = ("strikethrough",)
 
+# Push scoreboard changes to spectators over server-sent events. The stream is endless, so only
+# turn this on when serving through ASGI (mCTF.asgi:application); the stream 404s under WSGI
+LIVE_SCOREBOARD = False
+
+# Figures recorded for every request by MetricsMiddleware, totalled per URL name. The totals are
+# added to the shared cache every flush_interval requests and served to Prometheus from /metrics
+# to requests bearing token (disabled while it is blank). log writes one JSON line per request to
+# the gameserver.utils.metrics logger. Views over their query_budget are logged, or fail with
+# QueryBudgetExceeded if enforce_budgets is set (gameserver/tests.py sets it).
+METRICS = {
+    "enabled": True,
+    "flush_interval": 100,
+    "token": "",
+    "log": False,
+    "enforce_budgets": False,
+}
+
+# Rendered markdown is kept in an in-process LRU of up to size entries, and in the shared cache
+# for timeout seconds, keyed by a hash of the source and the render configuration
+MARKDOWN_CACHE = {"size": 1024, "timeout": 24 * 60 * 60}
+
 try:
     from mCTF.config import *
 except ImportError:
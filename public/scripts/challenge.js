@@ -22,11 +22,11 @@ function getCookie(name) {
 
 async function getChallenge() {
     updateInterimStatus("Refreshing", " Status...", "chall__refresh");
-    updateChallenge("GET", setLiveStatus, setNoneStatus);
+    updateChallenge("GET", setStatus, setNoneStatus);
 }
 async function createChallenge() {
     updateInterimStatus("Launching");
-    updateChallenge("POST", setLiveStatus, getChallenge);
+    updateChallenge("POST", setStatus, getChallenge);
 }
 async function deleteChallenge() {
     updateInterimStatus("Deleting");
@@ -81,6 +81,32 @@ function setNoneStatus() {
     displayTemplate("chall__action__refresh", "chall__actions");
 }
 
+function setStatus(json) {
+    if (json.status === "ready") {
+        setLiveStatus(json);
+    } else if (["queued", "creating", "pending"].includes(json.status)) {
+        setLaunchingStatus(json);
+    } else {
+        // expired or failed
+        setNoneStatus();
+        if (json.status === "failed") toggleError();
+    }
+}
+
+function setLaunchingStatus(json) {
+    clearTimer();
+    clearStatus();
+
+    displayTemplate("chall-launching", "chall__status");
+    document.getElementById("chall__state").textContent = json.status;
+
+    // Poll until the instance is ready
+    challengeTimerSetInterval = setInterval(() => {
+        clearTimer();
+        getChallenge();
+    }, 2000);
+}
+
 function setLiveStatus(json) {
     clearTimer();
     clearStatus();
@@ -0,0 +1,62 @@
+const streamUrl = JSON.parse(document.getElementById('scoreboard-stream-url').textContent);
+const page = JSON.parse(document.getElementById('scoreboard-page').textContent);
+const perPage = JSON.parse(document.getElementById('scoreboard-per-page').textContent);
+const scoreboardBody = document.querySelector('.table-list tbody');
+
+// participation id -> row, as sent by the stream
+const rows = new Map();
+
+function cell(tag, text) {
+    const element = document.createElement(tag);
+    element.textContent = text;
+    return element;
+}
+
+function renderRow(row) {
+    const tr = document.createElement('tr');
+    tr.dataset.participation = row.id;
+
+    const rank = cell('th', row.rank);
+    rank.scope = 'row';
+    const link = cell('a', row.name);
+    link.href = row.url;
+    const name = document.createElement('td');
+    name.appendChild(link);
+
+    tr.append(
+        rank,
+        name,
+        cell('td', row.is_team ? 'Team' : 'Individual'),
+        cell('td', row.points),
+        cell('td', row.flags),
+        cell('td', row.time),
+    );
+    return tr;
+}
+
+function render() {
+    const sorted = [...rows.values()].sort((a, b) => a.rank - b.rank || a.id - b.id);
+    const start = (page - 1) * perPage;
+    scoreboardBody.replaceChildren(...sorted.slice(start, start + perPage).map(renderRow));
+}
+
+const source = new EventSource(streamUrl);
+
+source.addEventListener('snapshot', (event) => {
+    rows.clear();
+    for (const row of JSON.parse(event.data)) {
+        rows.set(row.id, row);
+    }
+    render();
+});
+
+source.addEventListener('delta', (event) => {
+    const delta = JSON.parse(event.data);
+    for (const row of delta.changed) {
+        rows.set(row.id, row);
+    }
+    for (const id of delta.removed) {
+        rows.delete(id);
+    }
+    render();
+});